@@ -232,6 +232,14 @@ from .manager import Manager
 watchdog = AppWatchdog()
 man = Manager(args=args)
 watchdog.setupParentPoller(man)
+
+# Settings of the garbage collector from the global section of the config. Freezing moves
+# everything created during the startup out of the objects scanned by each collection.
+man.garbage_collector = gc
+gc.configure(pause_budget=man.tree['global'].get('gc_pause_budget', 0.05),
+             adaptive=man.tree['global'].get('gc_adaptive', True))
+if man.tree['global'].get('gc_freeze_after_startup', False):
+    gc.freeze()
 man.sigManagerQuit.connect(watchdog.quitApplication)
 
 ## for debugging with pdb
@@ -32,11 +32,12 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 from collections import OrderedDict
+import hashlib
 import numpy
 import re
 import os
 import ruamel.yaml as yaml
-from io import BytesIO
+from io import BytesIO, StringIO
 
 
 def ordered_load(stream, Loader=yaml.Loader):
@@ -80,6 +81,21 @@ def ordered_load(stream, Loader=yaml.Loader):
         arrays = numpy.load(filename)
         return arrays['array']
 
+    def construct_npy_ndarray(loader, node):
+        """
+        The constructor for a numpy array that is saved in an uncompressed .npy file next to
+        the config file. The file is memory mapped (copy on write), so the data is only read
+        from disk when it is accessed and changes of the array do not touch the file.
+        """
+        filename = loader.construct_yaml_str(node)
+        if not os.path.isabs(filename):
+            filename = os.path.join(os.path.dirname(os.path.abspath(stream.name)), filename)
+        try:
+            return numpy.load(filename, mmap_mode='c').view(numpy.ndarray)
+        except ValueError:
+            # empty arrays can not be memory mapped
+            return numpy.load(filename)
+
     def construct_frozenset(loader, node):
         """
         The frozenset constructor.
@@ -120,6 +136,9 @@ def ordered_load(stream, Loader=yaml.Loader):
     OrderedLoader.add_constructor(
             '!extndarray',
             construct_external_ndarray)
+    OrderedLoader.add_constructor(
+            '!npyarray',
+            construct_npy_ndarray)
     OrderedLoader.add_constructor(
         '!frozenset',
         construct_frozenset)
@@ -136,13 +155,18 @@ def ordered_load(stream, Loader=yaml.Loader):
         return OrderedDict()
 
 
-def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
+def ordered_dump(data, stream=None, Dumper=yaml.Dumper, array_directory=None, array_files=None,
+                 **kwds):
     """
     dumps (OrderedDict) data in YAML format
 
     @param OrderedDict data: the data
     @param Stream stream: where the data in YAML is dumped
     @param Dumper Dumper: The dumper that is used as a base class
+    @param str array_directory: optional, directory to store numpy arrays in uncompressed .npy
+                                files named by the hash of their content
+    @param set array_files: optional, the names of the .npy files referenced by the data are
+                            added to this set
     """
     class OrderedDumper(Dumper):
         """
@@ -188,6 +212,14 @@ def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
         """
         Representer for numpy ndarrays
         """
+        if array_directory is not None and not array_data.dtype.hasobject:
+            filename = save_array_file(array_directory, array_data)
+            if array_files is not None:
+                array_files.add(filename)
+            node = dumper.represent_str(
+                os.path.join(os.path.basename(os.path.normpath(array_directory)), filename))
+            node.tag = '!npyarray'
+            return node
         try:
             filename = os.path.splitext(os.path.basename(stream.name))[0]
             configdir = os.path.dirname(stream.name)
@@ -239,12 +271,82 @@ def load(filename):
         return ordered_load(f, yaml.SafeLoader)
 
 
-def save(filename, data):
+def save(filename, data, array_directory=None):
     """
     saves data to filename in yaml format.
 
     @param str filename: filename of config file
     @param OrderedDict data: config values
+    @param str array_directory: optional, subdirectory of the directory of filename for numpy
+                                arrays. If given, the arrays are stored in uncompressed .npy
+                                files there, which are only written if their content changed.
+                                The config file is only written if it changed as well.
     """
-    with open(filename, 'w') as f:
-        ordered_dump(data, stream=f, Dumper=yaml.SafeDumper, default_flow_style=False)
+    if array_directory is None:
+        with open(filename, 'w') as f:
+            ordered_dump(data, stream=f, Dumper=yaml.SafeDumper, default_flow_style=False)
+        return
+
+    array_files = set()
+    with StringIO() as f:
+        ordered_dump(data, stream=f, Dumper=yaml.SafeDumper, default_flow_style=False,
+                     array_directory=array_directory, array_files=array_files)
+        text = f.getvalue()
+    try:
+        with open(filename, 'r') as f:
+            unchanged = f.read() == text
+    except OSError:
+        unchanged = False
+    if not unchanged:
+        with open(filename, 'w') as f:
+            f.write(text)
+    remove_array_files(array_directory, keep=array_files)
+
+
+def save_array_file(directory, array):
+    """
+    Save a numpy array to an uncompressed .npy file named by the hash of its content, unless
+    such a file exists already.
+
+    @param str directory: directory of the file
+    @param numpy.ndarray array: the array to save, must not have the object dtype
+
+    @return str: file name of the array file in directory
+    """
+    if not array.flags.c_contiguous:
+        array = array.copy(order='C')
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update('{0}{1}'.format(array.dtype.descr, array.shape).encode())
+    digest.update(array.reshape(-1).view(numpy.uint8))
+    filename = '{0}.npy'.format(digest.hexdigest())
+    path = os.path.join(directory, filename)
+    if not os.path.isfile(path):
+        os.makedirs(directory, exist_ok=True)
+        temp_path = '{0}.{1:d}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            numpy.save(f, array, allow_pickle=False)
+        os.replace(temp_path, path)
+    return filename
+
+
+def remove_array_files(directory, keep=()):
+    """
+    Remove the .npy files in directory which are no longer referenced.
+
+    @param str directory: the array directory
+    @param keep: names of the files which are still in use
+    """
+    if not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        if filename.endswith('.npy') and filename not in keep:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError:
+                # still memory mapped on Windows, removed with the next save
+                pass
+    if not keep:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
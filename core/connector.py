@@ -45,6 +45,7 @@ class Connector:
         self.name = name
         self.optional = optional
         self.obj = None
+        self._invalidate_proxy()
 
     def __call__(self):
         """ Return reference to the module that this connector is connected to. """
@@ -53,37 +54,71 @@ class Connector:
                 return None
             raise Exception(
                 'Connector {0} (interface {1}) is not connected.'.format(self.name, self.interface))
+        if self._proxy_target is None or self._proxy_target[0] is not self.obj:
+            self._create_proxy()
+        return self._proxy
+
+    def _create_proxy(self):
+        """ Create the proxy object which gives access to the connected module.
+
+        The proxy is created once per connection. Interface methods which are overloaded for
+        several interfaces (see core.interface.InterfaceMethod) are resolved only on first access
+        and the resolved bound method is cached, all other attributes are looked up on the
+        connected module on every access. Proxies of a previous connection are invalidated.
+        """
+        # mutable cells shared with the proxy, emptied on disconnect
+        target = [self.obj]
+        method_cache = dict()
+        self._invalidate_proxy()
+        self._proxy_target = target
+        self._proxy_method_cache = method_cache
+        interface = self.interface
 
         class ConnectedInterfaceProxy:
             """
 
             """
             def __getattribute__(*args):
-                attr = getattr(self.obj, args[1])
-                if isinstance(attr, InterfaceMethod):
-                    return attr[self.interface]
-                else:
+                attr = method_cache.get(args[1])
+                if attr is not None:
                     return attr
+                attr = getattr(target[0], args[1])
+                if isinstance(attr, InterfaceMethod):
+                    attr = attr[interface]
+                    method_cache[args[1]] = attr
+                return attr
 
             def __setattr__(*args):
-                return setattr(self.obj, args[1], args[2])
+                method_cache.pop(args[1], None)
+                return setattr(target[0], args[1], args[2])
 
             def __delattr__(*args):
-                return delattr(self.obj, args[1])
+                method_cache.pop(args[1], None)
+                return delattr(target[0], args[1])
 
             def __repr__(*args):
-                return repr(self.obj)
+                return repr(target[0])
 
             def __str__(*args):
-                return str(self.obj)
+                return str(target[0])
 
             def __dir__(*args):
-                return dir(self.obj)
+                return dir(target[0])
 
             def __sizeof__(*args):
-                return self.obj.__sizeof__()
+                return target[0].__sizeof__()
+
+        self._proxy = ConnectedInterfaceProxy()
 
-        return ConnectedInterfaceProxy()
+    def _invalidate_proxy(self):
+        """ Make a previously created proxy unusable, e.g. after disconnecting. """
+        target = getattr(self, '_proxy_target', None)
+        if target is not None:
+            target[0] = None
+            self._proxy_method_cache.clear()
+        self._proxy_target = None
+        self._proxy_method_cache = None
+        self._proxy = None
 
     @property
     def is_connected(self):
@@ -108,10 +143,12 @@ class Connector:
         else:
             raise Exception(
                 'Unknown type for <Connector>.interface: "{0}"'.format(type(self.interface)))
+        self._create_proxy()
         return
 
     def disconnect(self):
         """ Disconnect connector. """
+        self._invalidate_proxy()
         self.obj = None
 
     # def __repr__(self):
@@ -1,12 +1,53 @@
 import gc
+import time
+from collections import OrderedDict
 
 from qtpy.QtCore import QObject
 from qtpy.QtCore import QTimer
 from qtpy.QtCore import Slot
+from core.util.instrumentation import instrumentation
 import logging
 logger = logging.getLogger('gc')
 
 
+class CollectionStatistics:
+    """ Pause durations of the garbage collections of one generation. """
+
+    def __init__(self, history=100):
+        """
+        @param history int: number of pause durations kept for the mean of the recent pauses
+        """
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.last = 0.
+        self.collected = 0
+        self.over_budget = 0
+        self.recent = [0.] * history
+        self._history = history
+
+    def add(self, duration, collected, budget):
+        self.recent[self.count % self._history] = duration
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        self.max = max(self.max, duration)
+        self.collected += collected
+        if duration > budget:
+            self.over_budget += 1
+
+    def as_dict(self):
+        recent = self.recent[:min(self.count, self._history)]
+        return OrderedDict([('count', self.count),
+                            ('total', self.total),
+                            ('mean', self.total / self.count if self.count else 0.),
+                            ('recent_mean', sum(recent) / len(recent) if recent else 0.),
+                            ('max', self.max),
+                            ('last', self.last),
+                            ('collected', self.collected),
+                            ('over_budget', self.over_budget)])
+
+
 class GarbageCollector(QObject):
     """
     Disable automatic garbage collection and instead collect manually
@@ -15,10 +56,18 @@ class GarbageCollector(QObject):
     This is done to ensure that garbage collection only happens in the GUI
     thread, as otherwise Qt can crash.
 
+    The pause of every collection is measured per generation (see statistics). The collector
+    adapts to keep the pauses below pause_budget: if collecting the young generations takes too
+    long, the timer interval is shortened so less objects accumulate between two collections.
+    If a full (generation 2) collection takes too long, its threshold is raised so full
+    collections run less often. Both are relaxed back to the configured values once the pauses
+    are well below the budget.
+
     Parameters
     ==========
     @param interval float: timeout interval in seconds. Default: 1s
     @param debug bool: debug output. Default: False
+    @param pause_budget float: desired maximum pause of a collection in seconds. Default: 50 ms
 
     Version history:
     - Original:
@@ -28,24 +77,74 @@ class GarbageCollector(QObject):
     - Modified: qudi
     """
 
-    def __init__(self, interval=1.0, debug=False):
+    # limits of the adaptation relative to the configured interval and generation 2 threshold
+    min_interval_factor = 0.1
+    max_threshold_factor = 16
+
+    def __init__(self, interval=1.0, debug=False, pause_budget=0.05):
         """
         Initializes garbage collector
 
         @param interval float: timeout interval in seconds. Default: 1s
         @param debug bool: debug output. Default: False
+        @param pause_budget float: desired maximum pause of a collection in seconds.
+                                   Default: 50 ms
         """
         super().__init__()
         self.debug = debug
         if debug:
             gc.set_debug(gc.DEBUG_LEAK)
 
+        self.pause_budget = pause_budget
+        self.adaptive = True
+        self.interval = interval
+        self.current_interval = interval
+        self.generations = [CollectionStatistics() for _ in range(3)]
+        self._collection_start = None
+
         self.timer = QTimer()
         self.timer.timeout.connect(self.check)
 
         self.threshold = gc.get_threshold()
+        self.current_threshold = list(self.threshold)
         gc.disable()
-        self.timer.start(interval * 1000)
+        # measure all collections, including the ones triggered outside of this class
+        gc.callbacks.append(self._gc_callback)
+        self.timer.start(int(interval * 1000))
+
+    def _gc_callback(self, phase, info):
+        """ Called by the python garbage collector at the start and stop of each collection. """
+        if phase == 'start':
+            self._collection_start = time.perf_counter()
+        elif self._collection_start is not None:
+            duration = time.perf_counter() - self._collection_start
+            self._collection_start = None
+            generation = info['generation']
+            self.generations[generation].add(duration, info['collected'], self.pause_budget)
+            if instrumentation.enabled:
+                instrumentation.add_duration('gc.generation{0:d}'.format(generation), duration)
+
+    def configure(self, pause_budget=None, adaptive=None, interval=None):
+        """ Change the settings of the collector.
+
+        @param pause_budget float: desired maximum pause of a collection in seconds
+        @param adaptive bool: adapt interval and thresholds to the pause budget
+        @param interval float: timeout interval in seconds
+        """
+        if pause_budget is not None:
+            self.pause_budget = float(pause_budget)
+        if adaptive is not None:
+            self.adaptive = bool(adaptive)
+        if interval is not None:
+            self.interval = float(interval)
+        if not self.adaptive or interval is not None:
+            self.current_threshold = list(self.threshold)
+            self._set_interval(self.interval)
+
+    def _set_interval(self, interval):
+        if interval != self.current_interval:
+            self.current_interval = interval
+            self.timer.setInterval(int(interval * 1000))
 
     @Slot()
     def check(self):
@@ -57,21 +156,91 @@ class GarbageCollector(QObject):
         l0, l1, l2 = gc.get_count()
         if self.debug:
             logger.debug('gc_check called: {0} {1} {2}'.format(l0, l1, l2))
-        if l0 > self.threshold[0]:
+        collected = None
+        if l0 > self.current_threshold[0]:
+            collected = 0
             num = gc.collect(0)
             if self.debug:
                 logger.debug('collecting gen 0, found: {0:d} unreachable'
                              ''.format(num))
-            if l1 > self.threshold[1]:
+            if l1 > self.current_threshold[1]:
+                collected = 1
                 num = gc.collect(1)
                 if self.debug:
                     logger.debug('collecting gen 1, found: {0:d} unreachable'
                                  ''.format(num))
-                if l2 > self.threshold[2]:
+                if l2 > self.current_threshold[2]:
+                    collected = 2
                     num = gc.collect(2)
                     if self.debug:
                         logger.debug('collecting gen 2, found: {0:d} '
                                      'unreachable'.format(num))
+        if self.adaptive and collected is not None:
+            self._adapt(collected)
+
+    def _adapt(self, generation):
+        """ Adapt the interval and the generation 2 threshold to the last pauses.
+
+        @param generation int: highest generation collected in the last check
+        """
+        budget = self.pause_budget
+        young_pause = max(self.generations[0].last,
+                          self.generations[1].last if generation >= 1 else 0.)
+        if young_pause > budget:
+            interval = max(self.current_interval / 2, self.interval * self.min_interval_factor)
+        elif young_pause < budget / 4:
+            interval = min(self.current_interval * 2, self.interval)
+        else:
+            interval = self.current_interval
+        if interval != self.current_interval:
+            if self.debug:
+                logger.debug('gc pause of {0:.1f} ms, changing interval to {1:.3f} s'
+                             ''.format(young_pause * 1e3, interval))
+            self._set_interval(interval)
+
+        if generation == 2:
+            pause = self.generations[2].last
+            threshold = self.current_threshold[2]
+            if pause > budget:
+                threshold = min(threshold * 2, self.threshold[2] * self.max_threshold_factor)
+            elif pause < budget / 2:
+                threshold = max(threshold // 2, self.threshold[2])
+            if threshold != self.current_threshold[2]:
+                if self.debug:
+                    logger.debug('gc generation 2 pause of {0:.1f} ms, changing threshold to '
+                                 '{1:d}'.format(pause * 1e3, threshold))
+                self.current_threshold[2] = threshold
+
+    def freeze(self):
+        """ Move all objects tracked by the garbage collector into a permanent generation which
+        is ignored by future collections. Used after the startup, so the long-lived objects
+        (modules, classes, configuration) are not scanned again by every full collection.
+
+        @return int: number of frozen objects, -1 if not supported by this python version
+        """
+        if not hasattr(gc, 'freeze'):
+            logger.warning('Freezing the garbage collector requires python 3.7 or newer.')
+            return -1
+        gc.collect()
+        gc.freeze()
+        frozen = gc.get_freeze_count()
+        logger.debug('Froze {0:d} objects in the garbage collector.'.format(frozen))
+        return frozen
+
+    def statistics(self):
+        """ Get the pause durations per generation and the current settings of the collector.
+
+        @return dict: {'generation0'...'generation2': {'count', 'total', 'mean', 'recent_mean',
+                       'max', 'last', 'collected', 'over_budget'}, 'interval', 'threshold',
+                       'pause_budget', 'frozen'} with all durations in s
+        """
+        stats = OrderedDict(('generation{0:d}'.format(generation), statistics.as_dict())
+                            for generation, statistics in enumerate(self.generations))
+        stats['interval'] = self.current_interval
+        stats['threshold'] = tuple(self.current_threshold)
+        stats['pause_budget'] = self.pause_budget
+        stats['frozen'] = gc.get_freeze_count() if hasattr(gc, 'get_freeze_count') else 0
+        return stats
 
     def debug_cycles(self):
         """
@@ -31,6 +31,8 @@ import os
 import sys
 import traceback
 import functools
+import time
+from collections import OrderedDict
 from qtpy import QtCore
 
 
@@ -65,11 +67,10 @@ class QtLogFormatter(logging.Formatter):
             entry['message'] = super().format(record)
         # add exception information if available
         if record.exc_info is not None:
+            lines = traceback.format_exception(*record.exc_info)
             entry['exception'] = {
-                    'message': traceback.format_exception(
-                        *record.exc_info)[-1][:-1],
-                    'traceback': traceback.format_exception(
-                        *record.exc_info)[:-1]
+                    'message': lines[-1][:-1],
+                    'traceback': lines[:-1]
                     }
 
         return entry
@@ -78,39 +79,166 @@ class QtLogFormatter(logging.Formatter):
 class QtLogHandler(QtCore.QObject, logging.Handler):
     """Log handler for displaying log records in a QT gui.
 
-      For each log record the Qt signal sigLoggedMessage is emitted
-      with a dictionary as parameter. The keys of this dictionary are:
+      The records are buffered and delivered in batches every flush_interval
+      seconds by the Qt signal sigLoggedMessages with a list of dictionaries
+      as parameter. For each delivered record sigLoggedMessage is emitted as
+      well. The keys of the dictionaries are:
         - name: logger name
         - message: the message
         - timestamp: the creation time of the log record
         - level: log level
+        - count: number of identical records collapsed into this entry
       Optional if an exception is logged:
         - exception: dictionary with keys:
           - message: the message
           - traceback: a traceback
 
+      Records with the same logger, level and message (and no exception)
+      arriving within one flush interval are collapsed into a single entry.
+      At most max_rate entries per second are delivered, records of level
+      error and above are preferred, also over buffered records when too many
+      distinct records arrive. Suppressed records are summarized in a
+      warning entry. Other handlers (e.g. the log file) are not affected.
+
       @param object parent: parent of QObject, defaults to None
       @param int level: log level, defaults to NOTSET
+      @param float flush_interval: time between two batches in s
+      @param int max_rate: maximum number of entries delivered per second
     """
 
     sigLoggedMessage = QtCore.Signal(object)
-    """signal emitted for each log record"""
+    """signal emitted for each delivered log record"""
+    sigLoggedMessages = QtCore.Signal(list)
+    """signal emitted with a list of log records for each batch"""
+    _sigScheduleFlush = QtCore.Signal()
 
-    def __init__(self, parent=None, level=0):
+    def __init__(self, parent=None, level=0, flush_interval=0.1, max_rate=200):
         QtCore.QObject.__init__(self, parent)
         logging.Handler.__init__(self, level)
         self.setFormatter(QtLogFormatter())
+        self.flush_interval = flush_interval
+        self.max_rate = max_rate
+        # buffered records by (name, level, message), exceptions get a unique key
+        self._buffer = OrderedDict()
+        # keys of the buffered records below error level, oldest first
+        self._low_level_keys = OrderedDict()
+        self._buffer_size = max(10 * max_rate, 100)
+        self._overflow = 0
+        self._flush_scheduled = False
+        self._last_flush = time.monotonic()
+        self._allowance = float(max_rate)
+        self._timer = None
+        self._sigScheduleFlush.connect(self._start_flush_timer, QtCore.Qt.QueuedConnection)
 
     def emit(self, record):
         """Emit function of handler.
 
-          Formats the log record and emits :sigLoggedMessage:
+          Buffers the log record, which is formatted and delivered by flush.
 
           @param object record: :logging.LogRecord:
         """
-        record = self.format(record)
-        if record:
-            self.sigLoggedMessage.emit(record)
+        try:
+            message = record.getMessage()
+        except Exception:
+            self.handleError(record)
+            return
+        if record.exc_info is None:
+            key = (record.name, record.levelno, message)
+        else:
+            key = id(record)
+        entry = self._buffer.get(key)
+        if entry is not None:
+            entry[1] += 1
+        elif len(self._buffer) < self._buffer_size:
+            self._add_to_buffer(key, record)
+        elif record.levelno >= logging.ERROR and self._low_level_keys:
+            # make room for the error by dropping the oldest record below error level
+            low_key, _ = self._low_level_keys.popitem(last=False)
+            self._overflow += self._buffer.pop(low_key)[1]
+            self._add_to_buffer(key, record)
+        else:
+            self._overflow += 1
+        # the flush timer can only be started once the Qt application is running
+        if not self._flush_scheduled and QtCore.QCoreApplication.instance() is not None:
+            self._flush_scheduled = True
+            self._sigScheduleFlush.emit()
+
+    def _add_to_buffer(self, key, record):
+        self._buffer[key] = [record, 1]
+        if record.levelno < logging.ERROR:
+            self._low_level_keys[key] = None
+
+    @QtCore.Slot()
+    def _start_flush_timer(self):
+        if self._timer is None:
+            self._timer = QtCore.QTimer(self)
+            self._timer.setSingleShot(True)
+            self._timer.timeout.connect(self.flush)
+        if not self._timer.isActive():
+            self._timer.start(int(self.flush_interval * 1000))
+
+    @QtCore.Slot()
+    def flush(self):
+        """Format the buffered log records and emit them.
+
+          Has to be called in the thread of the handler.
+        """
+        self.acquire()
+        try:
+            buffered = list(self._buffer.values())
+            self._buffer = OrderedDict()
+            self._low_level_keys = OrderedDict()
+            overflow, self._overflow = self._overflow, 0
+            self._flush_scheduled = False
+        finally:
+            self.release()
+        if not buffered:
+            return
+
+        # rate limit, the allowance is refilled with max_rate entries per second
+        now = time.monotonic()
+        self._allowance = min(self._allowance + (now - self._last_flush) * self.max_rate,
+                              float(self.max_rate))
+        self._last_flush = now
+        allowed = max(int(self._allowance), 0)
+        suppressed = overflow
+        if len(buffered) > allowed:
+            important = [index for index, (record, _) in enumerate(buffered)
+                         if record.levelno >= logging.ERROR]
+            keep = set(important[:allowed])
+            for index in range(len(buffered)):
+                if len(keep) >= allowed:
+                    break
+                keep.add(index)
+            suppressed += sum(count for index, (_, count) in enumerate(buffered)
+                              if index not in keep)
+            buffered = [item for index, item in enumerate(buffered) if index in keep]
+        self._allowance -= len(buffered)
+
+        entries = list()
+        for record, count in buffered:
+            try:
+                entry = self.format(record)
+            except Exception:
+                self.handleError(record)
+                continue
+            entry['count'] = count
+            if count > 1:
+                entry['message'] = '{0} (repeated {1:d} times)'.format(entry['message'], count)
+            entries.append(entry)
+        if suppressed:
+            record = logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                '{0:d} log messages were not displayed because more than {1:d} messages per '
+                'second were logged. See the log file for all messages.'.format(
+                    suppressed, self.max_rate), None, None)
+            entry = self.format(record)
+            entry['count'] = 1
+            entries.append(entry)
+
+        self.sigLoggedMessages.emit(entries)
+        for entry in entries:
+            self.sigLoggedMessage.emit(entry)
 
 
 def initialize_logger(path=''):
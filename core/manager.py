@@ -31,12 +31,15 @@ import sys
 import re
 import time
 import importlib
+from concurrent.futures import ThreadPoolExecutor
 
 from qtpy import QtCore
 from . import config
 
 from .util.mutex import Mutex   # Mutex provides access serialization between threads
 from .util.modules import toposort, is_base
+from .util.import_profile import ImportProfiler
+from .util.instrumentation import instrumentation
 from collections import OrderedDict
 from .logger import register_exception_handler
 from .threadmanager import ThreadManager
@@ -104,6 +107,14 @@ class Manager(QtCore.QObject):
         self.baseDir = None
         self.alreadyQuit = False
         self.remote_server = False
+        # start and end of the module activations during the last startup, see startModule
+        self.startup_timeline = OrderedDict()
+        # duration of the startup phases of the manager in s, e.g. reading the configuration
+        self.startup_phases = OrderedDict()
+        # import times of the python modules of the loaded Qudi modules, see getImportProfile
+        self.import_profile = OrderedDict()
+        # core.garbage_collector.GarbageCollector running in the main thread, set on startup
+        self.garbage_collector = None
 
         try:
             # Initialize parent class QObject
@@ -132,7 +143,13 @@ class Manager(QtCore.QObject):
             else:
                 config_file = args.config
             self.configDir = os.path.dirname(config_file)
+            phase_start = time.perf_counter()
             self.readConfig(config_file)
+            self.startup_phases['config'] = time.perf_counter() - phase_start
+
+            # Timing of the instrumented measurement loops, see getInstrumentation
+            if self.tree['global'].get('instrumentation', False):
+                instrumentation.enable(True)
 
             # check first if remote support is enabled and if so create RemoteObjectManager
             if RemoteObjectManager is None:
@@ -191,6 +208,7 @@ class Manager(QtCore.QObject):
             logger.info('Qudi started.')
 
             # Load startup things from config here
+            phase_start = time.perf_counter()
             if 'startup' in self.tree['global']:
                 # walk throug the list of loadable modules to be loaded on
                 # startup and load them if appropriate
@@ -204,9 +222,14 @@ class Manager(QtCore.QObject):
                     elif self.hasGui and key in self.tree['defined']['gui']:
                         self.startModule('gui', key)
                         self.sigModulesChanged.emit()
+                    elif not self.hasGui:
+                        # the gui modules are not read without GUI, so this is expected
+                        logger.warning('Startup module {} is not a hardware or logic module '
+                                       'and is skipped without GUI.'.format(key))
                     else:
                         logger.error('Loading startup module {} failed, not '
                                      'defined anywhere.'.format(key))
+            self.startup_phases['startup_modules'] = time.perf_counter() - phase_start
         except:
             logger.exception('Error while configuring Manager:')
         finally:
@@ -545,12 +568,95 @@ class Manager(QtCore.QObject):
             raise Exception('You are trying to cheat the '
                             'system with some category {0}'.format(baseName))
 
-        # load the python module
-        mod = importlib.__import__('{0}.{1}'.format(
-            baseName, module), fromlist=['*'])
+        # load the python module and measure the import time of its dependencies
+        start = time.perf_counter()
+        with ImportProfiler() as profiler:
+            mod = importlib.__import__('{0}.{1}'.format(
+                baseName, module), fromlist=['*'])
+        elapsed = time.perf_counter() - start
+        self.import_profile['{0}.{1}'.format(baseName, module)] = {
+            'total': elapsed,
+            'imports': profiler.direct_imports()}
+        logger.debug('Import of {0}.{1} took {2:.3f} s.'.format(baseName, module, elapsed))
         # print('refcnt:', sys.getrefcount(mod))
         return mod
 
+    def getImportProfile(self):
+        """ Get the import times of the python modules of all loaded Qudi modules.
+
+          @return dict: {'base.module': {'total': import time in s,
+                                         'imports': [(dependency, cumulative time, self time)]}}
+
+          Only the dependencies which were imported for the first time by a module are listed,
+          i.e. a dependency shared by several modules is attributed to the first one.
+        """
+        return OrderedDict(self.import_profile)
+
+    def importProfileReport(self, dependencies=5):
+        """ Create a human readable report of the import times, slowest modules first.
+
+          @param int dependencies: number of the slowest dependencies listed per module
+
+          @return str: the report
+        """
+        lines = list()
+        profile = sorted(self.import_profile.items(), key=lambda item: item[1]['total'],
+                         reverse=True)
+        for module, entry in profile:
+            lines.append('{0:>40}: {1:8.3f} s'.format(module, entry['total']))
+            for name, cumulative, self_time in entry['imports'][:dependencies]:
+                lines.append('{0:>44} {1:8.3f} s (self {2:.3f} s)'.format(
+                    name, cumulative, self_time))
+        return '\n'.join(lines)
+
+    def setInstrumentationEnabled(self, enabled=True):
+        """ Enable or disable the timing of the instrumented hot paths (e.g. measurement loops).
+
+          @param bool enabled: True to record timings
+        """
+        instrumentation.enable(enabled)
+
+    def getInstrumentation(self, prefix=''):
+        """ Get the timing and counter statistics of the instrumented hot paths.
+
+          @param str prefix: only report names starting with this prefix, e.g. 'odmr_logic'
+
+          @return dict: {name: {'kind': 'timer' or 'counter', 'count': ..., 'total': ...,
+                                'mean': ..., ...}} with all durations in s
+        """
+        return instrumentation.report(prefix)
+
+    def instrumentationReport(self, prefix=''):
+        """ Create a human readable table of the instrumented hot paths.
+
+          @param str prefix: only report names starting with this prefix
+
+          @return str: the report
+        """
+        return instrumentation.format_report(prefix)
+
+    def exportInstrumentation(self, filename, prefix=''):
+        """ Write the statistics of the instrumented hot paths to a CSV file.
+
+          @param str filename: path of the CSV file
+          @param str prefix: only export names starting with this prefix
+        """
+        instrumentation.to_csv(filename, prefix)
+
+    def resetInstrumentation(self):
+        """ Remove the recorded statistics of the instrumented hot paths. """
+        instrumentation.reset()
+
+    def getGarbageCollectionStatistics(self):
+        """ Get the pause durations of the garbage collections per generation.
+
+          @return dict: statistics of the garbage collector, see
+                        GarbageCollector.statistics. Empty if qudi runs without it.
+        """
+        if self.garbage_collector is None:
+            return OrderedDict()
+        return self.garbage_collector.statistics()
+
     def configureModule(self, moduleObject, baseName, className, instanceName,
                         configuration=None):
         """Instantiate an object from the class that makes up a Qudi module
@@ -793,6 +899,7 @@ class Manager(QtCore.QObject):
                         '',
                         defined_module['module.Class'])
 
+                    already_imported = '{0}.{1}'.format(base, module_name) in sys.modules
                     modObj = self.importModule(base, module_name)
 
                     # Ensure that the namespace of a module is reloaded before 
@@ -802,8 +909,9 @@ class Manager(QtCore.QObject):
                     # methods might be missing in a derived interface file.
                     # Reloading the namespace will prevent the need to restart 
                     # Qudi, if a module instantiation was not successful upon 
-                    # load.
-                    importlib.reload(modObj)  # keep the namespace of module up to date
+                    # load. A module imported just now is up to date already.
+                    if already_imported:
+                        importlib.reload(modObj)  # keep the namespace of module up to date
 
                     self.configureModule(modObj, base, class_name, key, defined_module)
                     if 'remoteaccess' in defined_module and defined_module['remoteaccess']:
@@ -946,31 +1054,15 @@ class Manager(QtCore.QObject):
           @param string name: module which is going to be activated.
 
         """
-        if not self.isModuleLoaded(base, name):
-            logger.error('{0} module {1} not loaded.'.format(base, name))
-            return
-        module = self.tree['loaded'][base][name]
-        if module.module_state() != 'deactivated' and (
-                self.isModuleDefined(base, name)
-                and 'remote' in self.tree['defined'][base][name]):
-            logger.debug('No need to activate remote module {0}.{1}.'.format(base, name))
-            return
-        if module.module_state() != 'deactivated':
-            logger.error('{0} module {1} not deactivated'.format(base, name))
+        module = self._getActivatableModule(base, name)
+        if module is None:
             return
         try:
-            module.setStatusVariables(self.loadStatusVariables(base, name))
+            self._setModuleStatusVariables(base, name, module)
             # start main loop for qt objects
             if module.is_module_threaded:
-                modthread = self.tm.newThread('mod-{0}-{1}'.format(base, name))
-                module.moveToThread(modthread)
-                modthread.start()
-                success = QtCore.QMetaObject.invokeMethod(
-                    module.module_state,
-                    'trigger',
-                    QtCore.Qt.BlockingQueuedConnection,
-                    QtCore.Q_RETURN_ARG(bool),
-                    QtCore.Q_ARG(str, 'activate'))
+                self._startModuleThread(base, name, module)
+                success = self._triggerThreadedActivation(module)
             else:
                 success = module.module_state.activate() # runs on_activate in main thread
             logger.debug('Activation success: {}'.format(success))
@@ -979,6 +1071,151 @@ class Manager(QtCore.QObject):
                 '{0} module {1}: error during activation:'.format(base, name))
         QtCore.QCoreApplication.instance().processEvents()
 
+    def _getActivatableModule(self, base, name):
+        """ Check whether a module can be activated.
+
+          @param string base: module base package (hardware, logic or gui)
+          @param string name: module which is going to be activated.
+
+          @return object: the module instance, None if it can not or need not be activated
+        """
+        if not self.isModuleLoaded(base, name):
+            logger.error('{0} module {1} not loaded.'.format(base, name))
+            return None
+        module = self.tree['loaded'][base][name]
+        if module.module_state() != 'deactivated' and (
+                self.isModuleDefined(base, name)
+                and 'remote' in self.tree['defined'][base][name]):
+            logger.debug('No need to activate remote module {0}.{1}.'.format(base, name))
+            return None
+        if module.module_state() != 'deactivated':
+            logger.error('{0} module {1} not deactivated'.format(base, name))
+            return None
+        return module
+
+    def _setModuleStatusVariables(self, base, name, module):
+        """ Load the status variables of a module from disk and hand them to the module.
+        """
+        start = time.perf_counter()
+        module.setStatusVariables(self.loadStatusVariables(base, name))
+        self.startup_timeline.setdefault(name, {'base': base})['status_variables'] = (
+            time.perf_counter() - start)
+
+    def _startModuleThread(self, base, name, module):
+        """ Move a threaded module to its own thread. Has to be called from the main thread.
+        """
+        modthread = self.tm.newThread('mod-{0}-{1}'.format(base, name))
+        module.moveToThread(modthread)
+        modthread.start()
+
+    @staticmethod
+    def _triggerThreadedActivation(module):
+        """ Run the activation of a threaded module in its thread and wait for it.
+
+          @return bool: activation success
+        """
+        return QtCore.QMetaObject.invokeMethod(
+            module.module_state,
+            'trigger',
+            QtCore.Qt.BlockingQueuedConnection,
+            QtCore.Q_RETURN_ARG(bool),
+            QtCore.Q_ARG(str, 'activate'))
+
+    def _activateModulesConcurrently(self, modules, deps):
+        """ Activate modules as soon as all of their dependencies are activated.
+
+          @param list modules: list of (base, name) tuples in topological order
+          @param dict deps: module dependencies as returned by getRecursiveModuleDependencies
+
+          Hardware modules with 'activate_in_thread: True' in their configuration are activated
+          in a worker thread, so independent ones are activated concurrently. With the global
+          config option 'parallel_activation: True' threaded modules are activated concurrently
+          in their own thread as well. All other modules are activated one by one in the main
+          thread. The start and end of each activation is logged and kept in
+          self.startup_timeline.
+        """
+        parallel = self.tree['global'].get('parallel_activation', False)
+        workers = max(int(self.tree['global'].get('activation_workers', 8)), 1)
+        scheduled = {name for base, name in modules}
+        pending = list(modules)
+        running = dict()
+        finished = set()
+        start_time = time.perf_counter()
+
+        def run_in_worker(base, name, module):
+            if module.is_module_threaded:
+                return self._triggerThreadedActivation(module)
+            return module.module_state.activate()
+
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix='qudi-activation') as executor:
+            while pending or running:
+                progressed = False
+                for name in list(running):
+                    future, base = running[name]
+                    if future.done():
+                        del running[name]
+                        try:
+                            success = future.result()
+                            logger.debug('Activation success: {}'.format(success))
+                        except:
+                            logger.exception(
+                                '{0} module {1}: error during activation:'.format(base, name))
+                        self.startup_timeline[name]['end'] = time.perf_counter() - start_time
+                        finished.add(name)
+                        progressed = True
+
+                for base, name in list(pending):
+                    if any(dep in scheduled and dep not in finished
+                           for dep in deps.get(name, ())):
+                        continue
+                    pending.remove((base, name))
+                    progressed = True
+                    timeline = self.startup_timeline.setdefault(name, dict())
+                    timeline.update({'base': base,
+                                     'start': time.perf_counter() - start_time,
+                                     'thread': 'main'})
+                    module = self._getActivatableModule(base, name)
+                    in_worker = module is not None and (
+                        (parallel and module.is_module_threaded)
+                        or (base == 'hardware'
+                            and self.tree['defined'][base].get(name, {}).get(
+                                'activate_in_thread', False)))
+                    if in_worker:
+                        try:
+                            self._setModuleStatusVariables(base, name, module)
+                            if module.is_module_threaded:
+                                self._startModuleThread(base, name, module)
+                                timeline['thread'] = 'module thread'
+                            else:
+                                timeline['thread'] = 'worker'
+                            running[name] = (
+                                executor.submit(run_in_worker, base, name, module), base)
+                            continue
+                        except:
+                            logger.exception(
+                                '{0} module {1}: error during activation:'.format(base, name))
+                    elif module is not None:
+                        if module.is_module_threaded:
+                            timeline['thread'] = 'module thread'
+                        self.activateModule(base, name)
+                    timeline['end'] = time.perf_counter() - start_time
+                    finished.add(name)
+
+                if not progressed:
+                    # keep the main thread responsive, e.g. for modules which call into it
+                    QtCore.QCoreApplication.instance().processEvents()
+                    time.sleep(0.001)
+
+        QtCore.QCoreApplication.instance().processEvents()
+        if modules:
+            lines = ['{0:>30}.{1:<10} {2:8.3f} s - {3:8.3f} s ({4:6.3f} s, {5})'.format(
+                name, entry['base'], entry['start'], entry['end'],
+                entry['end'] - entry['start'], entry['thread'])
+                for name, entry in self.startup_timeline.items()
+                if name in scheduled]
+            logger.info('Module activation timeline:\n' + '\n'.join(lines))
+
     @QtCore.Slot(str, str)
     def deactivateModule(self, base, name):
         """Activated the module given in key with the help of base class.
@@ -1158,30 +1395,57 @@ class Manager(QtCore.QObject):
         sorteddeps = toposort(deps)
         if len(sorteddeps) == 0:
             sorteddeps.append(key)
+        return self._startModules(sorteddeps, deps)
 
+    def _startModules(self, sorteddeps, deps):
+        """ Load and connect the given modules one by one and activate them concurrently.
+
+          @param list sorteddeps: unique module names in topological order
+          @param dict deps: module dependencies in the format of the toposort function
+
+          @return int: 0 on success, -1 on error
+        """
+        to_activate = list()
+        result = 0
+        bases = ('hardware', 'logic', 'gui') if self.hasGui else ('hardware', 'logic')
         for mkey in sorteddeps:
-            for mbase in ('hardware', 'logic', 'gui'):
+            for mbase in bases:
                 if mkey in self.tree['defined'][mbase] and mkey not in self.tree['loaded'][mbase]:
+                    load_start = time.perf_counter()
                     success = self.loadConfigureModule(mbase, mkey)
+                    connect_start = time.perf_counter()
                     if success < 0:
                         logger.warning('Stopping module loading after loading failure.')
-                        return -1
+                        result = -1
+                        break
                     elif success > 0:
                         logger.warning('Nonfatal loading error, going on.')
                     success = self.connectModule(mbase, mkey)
                     if success < 0:
                         logger.warning('Stopping loading module {0}.{1} after '
                                        'connection failure.'.format(mbase, mkey))
-                        return -1
+                        result = -1
+                        break
+                    connect_end = time.perf_counter()
+                    self.startup_timeline[mkey] = {'base': mbase,
+                                                   'load': connect_start - load_start,
+                                                   'connect': connect_end - connect_start}
+                    logger.debug('Loading of {0}.{1} took {2:.3f} s.'.format(
+                        mbase, mkey, connect_end - load_start))
                     if mkey in self.tree['loaded'][mbase]:
-                        self.activateModule(mbase, mkey)
+                        to_activate.append((mbase, mkey))
                 elif mkey in self.tree['defined'][mbase] and mkey in self.tree['loaded'][mbase]:
                     if self.tree['loaded'][mbase][mkey].module_state() == 'deactivated':
-                        self.activateModule(mbase, mkey)
+                        to_activate.append((mbase, mkey))
                     elif (self.tree['loaded'][mbase][mkey].module_state() != 'deactivated' and
                           mbase == 'gui'):
                         self.tree['loaded'][mbase][mkey].show()
-        return 0
+            if result < 0:
+                break
+
+        # the modules loaded before a failure are activated anyway
+        self._activateModulesConcurrently(to_activate, deps)
+        return result
 
     @QtCore.Slot(str, str)
     def stopModule(self, base, key):
@@ -1263,11 +1527,10 @@ class Manager(QtCore.QObject):
         deps = self.getAllRecursiveModuleDependencies(self.tree['defined'])
         sorteddeps = toposort(deps)
 
-        for module in sorteddeps:
-            base = self.findBase(module)
-            if self.startModule(base, module) < 0:
-                break
+        self._startModules(sorteddeps, deps)
 
+        if self.import_profile:
+            logger.info('Import times of the module files:\n' + self.importProfileReport(3))
         logger.info('Start all modules finished.')
 
     def getStatusDir(self):
@@ -1294,7 +1557,9 @@ class Manager(QtCore.QObject):
                 classname = self.tree['loaded'][base][module].__class__.__name__
                 filename = os.path.join(statusdir,
                     'status-{0}_{1}_{2}.cfg'.format(classname, base, module))
-                config.save(filename, variables)
+                # arrays are kept in memory mappable files, which are only written if changed
+                config.save(filename, variables,
+                            array_directory=self._statusArrayDir(filename))
             except:
                 print(variables)
                 logger.exception('Failed to save status variables of module '
@@ -1332,9 +1597,20 @@ class Manager(QtCore.QObject):
                 statusdir, 'status-{0}_{1}_{2}.cfg'.format(classname, base, module))
             if os.path.isfile(filename):
                 os.remove(filename)
+            config.remove_array_files(self._statusArrayDir(filename))
         except:
             logger.exception('Failed to remove module status file.')
 
+    @staticmethod
+    def _statusArrayDir(filename):
+        """ Get the directory of the array files belonging to a status variable file.
+
+          @param str filename: path of the status variable file
+
+          @return str: path of the array directory
+        """
+        return '{0}-arrays'.format(os.path.splitext(filename)[0])
+
     @QtCore.Slot()
     def quit(self):
         """Nicely request that all modules shut down."""
@@ -25,14 +25,191 @@ logger = logging.getLogger(__name__)
 
 from qtpy.QtCore import QObject
 from urllib.parse import urlparse
+import os
+import queue
+import socket
 import ssl
+import threading
 from .util.models import DictTableModel, ListTableModel
+from .util.network import (encode_array, configure_array_transport, ARRAY_CHANNEL_MIN_BYTES,
+                           ARRAY_CHANNEL_TIMEOUT)
 import rpyc
 from rpyc.utils.server import ThreadedServer
 from rpyc.utils.authenticators import SSLAuthenticator
 rpyc.core.protocol.DEFAULT_CONFIG['allow_pickle'] = True
 
 
+class ArraySender(threading.Thread):
+    """ Thread writing the buffers of transferred arrays to the array channel socket.
+
+    The socket is accepted from a listening socket, the client has to send the token first.
+    Buffers are written in the order they are queued.
+    """
+
+    def __init__(self, listener, token):
+        """
+          @param socket.socket listener: listening socket the client connects to
+          @param bytes token: token the client has to send after connecting
+        """
+        super().__init__(name='array-sender', daemon=True)
+        self._listener = listener
+        self._token = token
+        self._socket = None
+        self._buffers = queue.Queue()
+        # set once the client is connected, or the connection failed
+        self.ready = threading.Event()
+
+    @property
+    def connected(self):
+        return self._socket is not None
+
+    def run(self):
+        try:
+            self._accept()
+        finally:
+            self.ready.set()
+        while True:
+            data = self._buffers.get()
+            if data is None:
+                break
+            if self._socket is None:
+                continue
+            try:
+                self._socket.sendall(memoryview(data))
+            except OSError:
+                self._close_socket()
+        self._close_socket()
+
+    def _accept(self):
+        try:
+            self._listener.settimeout(ARRAY_CHANNEL_TIMEOUT)
+            channel, _ = self._listener.accept()
+        except OSError:
+            return
+        finally:
+            self._listener.close()
+        try:
+            channel.settimeout(ARRAY_CHANNEL_TIMEOUT)
+            token = b''
+            while len(token) < len(self._token):
+                data = channel.recv(len(self._token) - len(token))
+                if not data:
+                    break
+                token += data
+            if token != self._token:
+                channel.close()
+                return
+            channel.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            channel.close()
+            return
+        self._socket = channel
+
+    def _close_socket(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def send(self, data):
+        """ Queue a buffer for sending.
+
+          @param bytes data: the buffer
+        """
+        self._buffers.put(data)
+
+    def stop(self):
+        self._buffers.put(None)
+
+
+class ArrayTransferService(rpyc.Service):
+    """ RPyC service with a channel for numpy arrays, used by netobtain on the other side.
+
+    Arrays are sent as raw buffer with dtype and shape instead of being pickled. Large buffers
+    are written to a separate socket, so rpyc does not compress them again. Large arrays are
+    passed through shared memory if both sides run on the same host.
+    """
+
+    def on_connect(self, conn):
+        # shared memory blocks by name, waiting for the client to copy them
+        self._shared_arrays = dict()
+        self._array_sender = None
+        self._conn = conn
+        # Large replies are written in several parts. Without TCP_NODELAY the last part waits
+        # for the delayed acknowledgement of the previous one (up to 40 ms per reply).
+        try:
+            conn._channel.stream.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (AttributeError, OSError):
+            pass
+
+    def on_disconnect(self, conn):
+        for name in list(self._shared_arrays):
+            self.exposed_releaseArray(name)
+        if self._array_sender is not None:
+            self._array_sender.stop()
+
+    def exposed_openArrayChannel(self):
+        """ Open a socket for the buffers of the transferred arrays of this connection.
+
+          @return tuple: (port, token), the client connects to the port on the host of this
+                         connection and sends the token. None if there is no array channel for
+                         this connection, e.g. because it is encrypted.
+        """
+        if self._array_sender is not None:
+            return None
+        try:
+            connection_socket = self._conn._channel.stream.sock
+        except AttributeError:
+            return None
+        # the buffers would not be encrypted
+        if isinstance(connection_socket, ssl.SSLSocket):
+            return None
+        listener = socket.socket(connection_socket.family, socket.SOCK_STREAM)
+        try:
+            listener.bind((connection_socket.getsockname()[0], 0))
+            listener.listen(1)
+        except OSError:
+            listener.close()
+            return None
+        token = os.urandom(16)
+        port = listener.getsockname()[1]
+        self._array_sender = ArraySender(listener, token)
+        self._array_sender.start()
+        return port, token
+
+    def exposed_getArray(self, array, shared_memory=False, compression=0, channel=False):
+        """ Frame a numpy array of this process for the transfer, see network.encode_array.
+
+          @param numpy.ndarray array: the array (a netref on the client side)
+          @param bool shared_memory: use shared memory for large arrays
+          @param int compression: zlib compression level, 0 for no compression
+          @param bool channel: send large buffers through the array channel socket
+
+          @return tuple: frame of the array or None if the array has to be pickled. If the
+                         buffer is sent through the array channel, the payload of the frame is
+                         its length.
+        """
+        frame, block = encode_array(array, bool(shared_memory), int(compression))
+        if block is not None:
+            self._shared_arrays[block.name] = block
+        elif (frame is not None and channel and self._array_sender is not None
+                and len(frame[3]) >= ARRAY_CHANNEL_MIN_BYTES):
+            self._array_sender.ready.wait(ARRAY_CHANNEL_TIMEOUT)
+            if self._array_sender.connected:
+                self._array_sender.send(frame[3])
+                frame = frame[:3] + (len(frame[3]), )
+        return frame
+
+    def exposed_releaseArray(self, name):
+        """ Free the shared memory block of a transferred array.
+
+          @param str name: name of the shared memory block
+        """
+        block = self._shared_arrays.pop(str(name), None)
+        if block is not None:
+            block.close()
+            block.unlink()
+
+
 class RemoteObjectManager(QObject):
     """ This shares modules with other computers and is responsible
         for obtaining modules shared by other computer.
@@ -47,11 +224,13 @@ class RemoteObjectManager(QObject):
         self.remoteModules.headers[0] = 'Remote Modules'
         self.sharedModules = DictTableModel()
         self.sharedModules.headers[0] = 'Shared Modules'
+        # zlib compression level of the numpy arrays obtained from remote modules
+        self.array_compression = manager.tree['global'].get('remote_array_compression', 0)
 
     def makeRemoteService(self):
         """ A function that returns a class containing a module list hat can be manipulated from the host.
         """
-        class RemoteModuleService(rpyc.Service):
+        class RemoteModuleService(ArrayTransferService):
             """ An RPyC service that has a module list.
             """
             modules = self.sharedModules
@@ -65,12 +244,14 @@ class RemoteObjectManager(QObject):
                 """ code that runs when a connection is created
                     (to init the service, if needed)
                 """
+                super().on_connect(conn)
                 logger.info('Client connected!')
 
             def on_disconnect(self, conn):
                 """ code that runs when the connection has already closed
                     (to finalize the service, if needed)
                 """
+                super().on_disconnect(conn)
                 logger.info('Client disconnected!')
 
             def exposed_getModule(self, name):
@@ -95,6 +276,16 @@ class RemoteObjectManager(QObject):
                         logger.error('Client requested a module that is not '
                                 'shared.')
                         return None
+
+            def exposed_getInstrumentation(self, prefix=''):
+                """ Return the statistics of the instrumented hot paths of this qudi.
+
+                  @param str prefix: only report names starting with this prefix
+
+                  @return dict: statistics by name, see Manager.getInstrumentation
+                """
+                return self._manager.getInstrumentation(str(prefix))
+
         return RemoteModuleService
 
     def createServer(self, hostname, port, certfile=None, keyfile=None):
@@ -171,6 +362,7 @@ class RemoteObjectManager(QObject):
           @return object: remote module
         """
         module = RemoteModule(host, port, name, certfile=certfile, keyfile=keyfile)
+        configure_array_transport(module.connection, compression=self.array_compression)
         self.remoteModules.append(module)
         return module.module
 
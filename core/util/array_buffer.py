@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains growable numpy array containers for data that is acquired point by point.
+
+Appending to a python list of small arrays (or stacking numpy arrays with np.vstack on every new
+point) creates many python objects or copies the complete data on every append. The containers
+in here preallocate a numpy buffer and double its capacity whenever it is full, so appending is
+amortized O(1) and the stored data is always available as a single contiguous numpy array.
+For continuous streams (e.g. camera frames) a fixed size ring buffer keeps only the last frames.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+import os
+import tempfile
+
+
+class ResultStore:
+    """ Append-only store of result rows in a preallocated numpy buffer.
+
+    Each row is an array of shape row_shape with an arbitrary numpy dtype, including structured
+    dtypes (e.g. one field per magnet axis) and object. The buffer capacity is doubled
+    whenever it is full. Optionally the buffer is moved to a temporary memory mapped file once it
+    exceeds spill_size bytes, so very long measurements do not have to be kept in RAM.
+
+    A single thread may append while other threads read: the row is written before the length
+    is increased, so readers always see completely written rows.
+
+    Usage:
+        store = ResultStore(row_shape=(len(x_axis),))
+        row = store.append_row()  # new row filled with zeros
+        store.data[row, index] = value
+        store.data  # view of shape (len(store), len(x_axis))
+    """
+
+    def __init__(self, row_shape=(), dtype=float, initial_capacity=64, spill_directory=None,
+                 spill_size=256 * 2**20):
+        """
+        @param tuple row_shape: shape of a single row, () for scalar rows
+        @param dtype: numpy data type of the rows, may be a structured dtype
+        @param int initial_capacity: number of rows allocated initially
+        @param str spill_directory: optional, directory for the memory mapped file. Spilling is
+                                    not possible for the object dtype.
+        @param int spill_size: buffer size in bytes above which the buffer is memory mapped
+        """
+        self._row_shape = tuple(row_shape)
+        self._initial_capacity = max(int(initial_capacity), 1)
+        self._spill_directory = spill_directory
+        self._spill_size = spill_size
+        self._spill_file = None
+        self._buffer = np.zeros((self._initial_capacity,) + self._row_shape, dtype=dtype)
+        self._length = 0
+
+    def __del__(self):
+        self._close_spill_file()
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, item):
+        return self.data[item]
+
+    def __setitem__(self, item, value):
+        self.data[item] = value
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None and not copy:
+            return self.data
+        return np.array(self.data, dtype=dtype)
+
+    @property
+    def data(self):
+        """ View of the stored rows as numpy array of shape (len(self),) + row_shape.
+        The view is invalidated (but stays readable) if the buffer is reallocated.
+        """
+        length = self._length
+        return self._buffer[:length]
+
+    @property
+    def dtype(self):
+        return self._buffer.dtype
+
+    @property
+    def capacity(self):
+        """ Number of rows that can be stored without reallocation. """
+        return self._buffer.shape[0]
+
+    @property
+    def is_spilled(self):
+        """ True if the buffer is a memory mapped file. """
+        return self._spill_file is not None
+
+    def _reserve(self, n_rows):
+        """ Make sure that the buffer can hold n_rows rows, doubling the capacity if needed. """
+        capacity = self._buffer.shape[0]
+        if n_rows <= capacity:
+            return
+        while capacity < n_rows:
+            capacity *= 2
+        old_spill_file = self._spill_file
+        buffer = self._allocate(capacity)
+        buffer[:self._length] = self._buffer[:self._length]
+        self._buffer = buffer
+        if old_spill_file is not None and old_spill_file != self._spill_file:
+            self._remove_file(old_spill_file)
+
+    def _allocate(self, capacity):
+        """ Allocate a zero initialized buffer, memory mapped if it is too large for RAM. """
+        shape = (capacity,) + self._row_shape
+        dtype = self._buffer.dtype
+        n_bytes = dtype.itemsize * int(np.prod(shape))
+        if self._spill_directory is None or n_bytes <= self._spill_size or dtype.hasobject:
+            return np.zeros(shape, dtype=dtype)
+        handle, path = tempfile.mkstemp(suffix='.dat', prefix='qudi_results_',
+                                        dir=self._spill_directory)
+        os.close(handle)
+        self._spill_file = path
+        return np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+
+    def _close_spill_file(self):
+        spill_file, self._spill_file = self._spill_file, None
+        if spill_file is not None:
+            self._buffer = np.zeros((0,) + self._row_shape, dtype=self._buffer.dtype)
+            self._remove_file(spill_file)
+
+    @staticmethod
+    def _remove_file(path):
+        # On Windows a file can not be removed while a view of the map is still alive. It is
+        # left in the temporary directory in that case.
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def append(self, row):
+        """ Append a single row.
+
+        @param row: value(s) of the row, has to be broadcastable to row_shape
+        """
+        self._reserve(self._length + 1)
+        self._buffer[self._length] = row
+        self._length += 1
+
+    def append_row(self):
+        """ Append a zero initialized row.
+
+        @return int: index of the new row
+        """
+        self._reserve(self._length + 1)
+        self._length += 1
+        return self._length - 1
+
+    def extend(self, rows):
+        """ Append several rows at once.
+
+        @param rows: array like of shape (n_rows,) + row_shape
+        """
+        rows = np.asarray(rows, dtype=self._buffer.dtype)
+        if rows.size == 0:
+            return
+        rows = rows.reshape((-1,) + self._row_shape)
+        self._reserve(self._length + rows.shape[0])
+        self._buffer[self._length:self._length + rows.shape[0]] = rows
+        self._length += rows.shape[0]
+
+    def clear(self):
+        """ Remove all rows and release the memory of a grown buffer. """
+        self._length = 0
+        self._close_spill_file()
+        self._buffer = np.zeros((self._initial_capacity,) + self._row_shape,
+                                dtype=self._buffer.dtype)
+
+
+class GrowingArray(ResultStore):
+    """ Append-only 2D array with a fixed number of columns.
+
+    Usage:
+        wavelengths = GrowingArray(n_columns=2)
+        wavelengths.append((time_stamp, wavelength))
+        wavelengths.data[:, 1]  # view of all wavelengths
+    """
+
+    def __init__(self, n_columns, dtype=float, initial_capacity=1024, **kwargs):
+        """
+        @param int n_columns: number of columns of each row
+        @param dtype: numpy data type of the array
+        @param int initial_capacity: number of rows allocated initially
+        @param kwargs: optional spill settings, see ResultStore
+        """
+        super().__init__(row_shape=(int(n_columns),), dtype=dtype,
+                         initial_capacity=initial_capacity, **kwargs)
+
+
+class RingBuffer:
+    """ Preallocated ring buffer holding the last frames (arrays of equal shape) of a stream.
+
+    A running sum of the stored frames is kept, so the average of the buffered frames is
+    available without summing up the whole buffer. The sum is recalculated exactly whenever the
+    buffer wraps around, so rounding errors of float frames do not accumulate.
+
+    Usage:
+        frames = RingBuffer(capacity=8, frame_shape=(720, 1280))
+        frames.push(image)
+        frames.latest()  # view of the last pushed frame
+        frames.mean()  # average of the buffered frames
+    """
+
+    def __init__(self, capacity, frame_shape, dtype=float):
+        """
+        @param int capacity: number of frames kept in the buffer
+        @param tuple frame_shape: shape of a single frame
+        @param dtype: numpy data type of the frames
+        """
+        self._frames = np.zeros((max(int(capacity), 1),) + tuple(frame_shape), dtype=dtype)
+        self._sum = np.zeros(tuple(frame_shape), dtype=float)
+        self._total = 0
+
+    def __len__(self):
+        return min(self._total, self.capacity)
+
+    @property
+    def capacity(self):
+        return self._frames.shape[0]
+
+    @property
+    def frame_shape(self):
+        return self._frames.shape[1:]
+
+    @property
+    def dtype(self):
+        return self._frames.dtype
+
+    @property
+    def total(self):
+        """ Number of frames pushed since the buffer was created or cleared. """
+        return self._total
+
+    def push(self, frame):
+        """ Copy a frame into the buffer, overwriting the oldest frame if the buffer is full.
+
+        @param numpy.ndarray frame: the new frame of shape frame_shape
+
+        @return numpy.ndarray: view of the stored frame in the buffer
+        """
+        slot = self._total % self.capacity
+        stored = self._frames[slot]
+        if self._total >= self.capacity:
+            self._sum -= stored
+        stored[...] = frame
+        self._total += 1
+        if slot == self.capacity - 1:
+            self._sum = self._frames.sum(axis=0, dtype=float)
+        else:
+            self._sum += stored
+        return stored
+
+    def latest(self):
+        """ View of the last pushed frame, None if the buffer is empty. """
+        if self._total == 0:
+            return None
+        return self._frames[(self._total - 1) % self.capacity]
+
+    def mean(self):
+        """ Average of the buffered frames, None if the buffer is empty. """
+        if self._total == 0:
+            return None
+        return self._sum / len(self)
+
+    @property
+    def data(self):
+        """ Copy of the buffered frames in chronological order. """
+        if self._total <= self.capacity:
+            return self._frames[:self._total].copy()
+        slot = self._total % self.capacity
+        return np.concatenate((self._frames[slot:], self._frames[:slot]))
+
+    def clear(self):
+        """ Remove all frames from the buffer. """
+        self._total = 0
+        self._sum[...] = 0
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a specialised and fast fitter for axis-aligned 2D gaussian spots on a regular
+grid, as they are acquired during a refocus (optimizer) xy scan.
+
+In contrast to the generic lmfit based fit methods of the FitLogic this fitter does not build any
+model or parameter objects. The initial values are estimated from the image moments and the fit
+is performed by a Levenberg-Marquardt solver using the analytic Jacobian of the (separable)
+gaussian. Typical refocus images (e.g. 30x30 pixels) are fitted in well below 1 ms.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Order of the parameters in the internal parameter vector
+PARAMETER_NAMES = ('amplitude', 'center_x', 'center_y', 'sigma_x', 'sigma_y', 'offset')
+
+
+class GaussianFitResult:
+    """ Lightweight result container of fit_twoDgaussian_grid.
+
+    The attributes success, message, best_values and params mimic the relevant subset of an
+    lmfit ModelResult so the result can be handled like the one of FitLogic.make_twoDgaussian_fit.
+    """
+
+    def __init__(self, best_values, errors, success, message, nfev, chisqr):
+        self.best_values = best_values
+        self.errors = errors
+        self.success = success
+        self.message = message
+        self.nfev = nfev
+        self.chisqr = chisqr
+
+    @property
+    def params(self):
+        """ Dictionary of the fit parameters with value and error, i.e.
+            {'center_x': {'value': ..., 'error': ...}, ...}
+        """
+        return {name: {'value': value, 'error': self.errors.get(name, np.nan)}
+                for name, value in self.best_values.items()}
+
+
+def estimate_twoDgaussian_moments(x_axis, y_axis, image):
+    """ Estimate the parameters of a 2D gaussian from the image moments.
+
+    @param numpy.ndarray x_axis: 1D array of the x positions (columns of image)
+    @param numpy.ndarray y_axis: 1D array of the y positions (rows of image)
+    @param numpy.ndarray image: 2D array of shape (len(y_axis), len(x_axis))
+
+    @return numpy.ndarray: parameter vector, see PARAMETER_NAMES for the order
+    """
+    offset = float(image.min())
+    weights = image - offset
+    norm = weights.sum()
+    if norm <= 0:
+        return np.array([0., x_axis.mean(), y_axis.mean(),
+                         np.ptp(x_axis) / 3, np.ptp(y_axis) / 3, offset])
+
+    # the projections onto both axes are sufficient for the first and second moments
+    proj_x = weights.sum(axis=0) / norm
+    proj_y = weights.sum(axis=1) / norm
+    center_x = np.dot(proj_x, x_axis)
+    center_y = np.dot(proj_y, y_axis)
+    sigma_x = np.sqrt(np.dot(proj_x, (x_axis - center_x) ** 2))
+    sigma_y = np.sqrt(np.dot(proj_y, (y_axis - center_y) ** 2))
+    amplitude = float(image.max()) - offset
+    return np.array([amplitude, center_x, center_y, sigma_x, sigma_y, offset])
+
+
+def fit_twoDgaussian_grid(x_axis, y_axis, image, max_iterations=50, tolerance=1e-6):
+    """ Fit an axis-aligned 2D gaussian with constant offset to an image on a regular grid.
+
+    @param numpy.ndarray x_axis: 1D array of the x positions (columns of image), equally spaced
+    @param numpy.ndarray y_axis: 1D array of the y positions (rows of image), equally spaced
+    @param numpy.ndarray image: 2D array of shape (len(y_axis), len(x_axis))
+    @param int max_iterations: maximum number of Levenberg-Marquardt iterations
+    @param float tolerance: relative parameter change below which the fit is converged
+
+    @return GaussianFitResult: result object with best_values, errors and success flag
+
+    The fitted function is
+        offset + amplitude * exp(-(x-center_x)**2/(2*sigma_x**2) - (y-center_y)**2/(2*sigma_y**2))
+    The best_values additionally contain theta=0 to be compatible with the lmfit 2D gaussian.
+    """
+    x_axis = np.asarray(x_axis, dtype=float)
+    y_axis = np.asarray(y_axis, dtype=float)
+    image = np.asarray(image, dtype=float)
+    if image.shape != (y_axis.size, x_axis.size) or x_axis.size < 3 or y_axis.size < 3:
+        logger.error('Image of shape {0} does not match axes of length ({1}, {2}) or is too '
+                     'small for a 2D gaussian fit.'.format(image.shape, y_axis.size, x_axis.size))
+        return GaussianFitResult(dict(), dict(), False, 'Invalid input data', 0, np.inf)
+
+    # Work in pixel units to keep the normal equations well conditioned.
+    x_step = (x_axis[-1] - x_axis[0]) / (x_axis.size - 1)
+    y_step = (y_axis[-1] - y_axis[0]) / (y_axis.size - 1)
+    if x_step == 0 or y_step == 0:
+        logger.error('Axes for 2D gaussian fit must not have zero extent.')
+        return GaussianFitResult(dict(), dict(), False, 'Invalid input data', 0, np.inf)
+    u = np.arange(x_axis.size, dtype=float)
+    v = np.arange(y_axis.size, dtype=float)
+    # scale the data to order unity as well
+    data_scale = max(float(np.abs(image).max()), 1e-300)
+    data = image / data_scale
+
+    # The moments are close enough to the minimum for a convergence in a few iterations. Start
+    # values of a previous fit do not save any iterations, even for the same spot.
+    p = estimate_twoDgaussian_moments(u, v, data)
+    p[3] = np.clip(p[3], 0.5, 3 * u.size)
+    p[4] = np.clip(p[4], 0.5, 3 * v.size)
+
+    def evaluate(params):
+        amp, cx, cy, sx, sy, off = params
+        du = (u - cx) / sx
+        dv = (v - cy) / sy
+        gx = np.exp(-0.5 * du * du)
+        gy = np.exp(-0.5 * dv * dv)
+        return amp * np.outer(gy, gx) + off, du, dv, gx, gy
+
+    def jacobian(params, du, dv, gx, gy):
+        amp, cx, cy, sx, sy, off = params
+        jac = np.empty((6, v.size, u.size))
+        np.outer(gy, gx, out=jac[0])
+        jac[1] = amp * np.outer(gy, gx * du / sx)
+        jac[2] = amp * np.outer(gy * dv / sy, gx)
+        jac[3] = jac[1] * du
+        jac[4] = jac[2] * dv[:, np.newaxis]
+        jac[5] = 1.
+        return jac.reshape(6, -1)
+
+    model, du, dv, gx, gy = evaluate(p)
+    residual = (data - model).ravel()
+    chisqr = np.dot(residual, residual)
+    damping = 1e-3
+    nfev = 1
+    converged = False
+    message = 'Maximum number of iterations reached'
+    for _ in range(max_iterations):
+        jac = jacobian(p, du, dv, gx, gy)
+        alpha = jac @ jac.T
+        beta = jac @ residual
+        diag = np.diag(alpha).copy()
+        diag[diag == 0] = 1.
+        accepted = False
+        while damping < 1e10:
+            try:
+                step = np.linalg.solve(alpha + damping * np.diag(diag), beta)
+            except np.linalg.LinAlgError:
+                damping *= 10
+                continue
+            # A step too small to change any parameter means we sit in the minimum
+            if np.max(np.abs(step) / (np.abs(p) + 1e-12)) < tolerance:
+                converged = True
+                break
+            p_new = p + step
+            p_new[3:5] = np.abs(p_new[3:5])
+            new_model, n_du, n_dv, n_gx, n_gy = evaluate(p_new)
+            nfev += 1
+            new_residual = (data - new_model).ravel()
+            new_chisqr = np.dot(new_residual, new_residual)
+            if np.isfinite(new_chisqr) and new_chisqr <= chisqr:
+                accepted = True
+                break
+            damping *= 10
+        if converged:
+            message = 'Fit converged'
+            break
+        if not accepted:
+            message = 'Levenberg-Marquardt damping diverged'
+            break
+        improvement = chisqr - new_chisqr
+        p, chisqr = p_new, new_chisqr
+        du, dv, gx, gy, residual = n_du, n_dv, n_gx, n_gy, new_residual
+        damping = max(damping / 10, 1e-12)
+        if improvement <= tolerance * chisqr:
+            converged = True
+            message = 'Fit converged'
+            break
+
+    # Standard errors from the covariance matrix of the final Jacobian
+    jac = jacobian(p, du, dv, gx, gy)
+    dof = max(residual.size - p.size, 1)
+    try:
+        errors = np.sqrt(np.abs(np.diag(np.linalg.inv(jac @ jac.T)) * chisqr / dof))
+    except np.linalg.LinAlgError:
+        errors = np.full(p.size, np.nan)
+
+    scale = np.array([data_scale, x_step, y_step, abs(x_step), abs(y_step), data_scale])
+    offset = np.array([0., x_axis[0], y_axis[0], 0., 0., 0.])
+    values = p * scale + offset
+    errors = errors * np.abs(scale)
+
+    success = bool(converged and np.all(np.isfinite(values)) and values[0] > 0
+                   and p[3] < 3 * u.size and p[4] < 3 * v.size)
+    best_values = dict(zip(PARAMETER_NAMES, values.tolist()))
+    best_values['theta'] = 0.
+    return GaussianFitResult(best_values=best_values,
+                             errors=dict(zip(PARAMETER_NAMES, errors.tolist())),
+                             success=success,
+                             message=message,
+                             nfev=nfev,
+                             chisqr=chisqr * data_scale ** 2)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a profiler for the import time of python modules.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import builtins
+import importlib.util
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+# builtins.__import__ is replaced by _profiled_import while at least one ImportProfiler is active
+_patch_lock = threading.Lock()
+_patch_count = 0
+_original_import = builtins.__import__
+# innermost active ImportProfiler of each thread
+_active = threading.local()
+
+
+def _profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+    profilers = getattr(_active, 'profilers', None)
+    if not profilers:
+        return _original_import(name, globals, locals, fromlist, level)
+    return profilers[-1]._import(name, globals, locals, fromlist, level)
+
+
+class ImportProfiler:
+    """ Context manager measuring the import time of every python module which is imported for
+    the first time while it is active.
+
+    Only imports of the thread which entered the context are measured. Modules which are already
+    imported are not recorded, so the timings show which dependencies a module pulls in.
+
+    builtins.__import__ is patched once for all active profilers and restored when the last one
+    exits, also if the profiled import raises or profilers of several threads overlap.
+
+    Usage:
+        with ImportProfiler() as profiler:
+            importlib.import_module('logic.odmr_logic')
+        profiler.timings  # {module name: (cumulative time, self time, importing module)}
+    """
+
+    def __init__(self):
+        self.timings = OrderedDict()
+        self._stack = list()
+
+    def __enter__(self):
+        global _patch_count, _original_import
+        with _patch_lock:
+            if _patch_count == 0:
+                _original_import = builtins.__import__
+                builtins.__import__ = _profiled_import
+            _patch_count += 1
+        if not hasattr(_active, 'profilers'):
+            _active.profilers = list()
+        _active.profilers.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _patch_count
+        try:
+            _active.profilers.remove(self)
+        finally:
+            with _patch_lock:
+                _patch_count -= 1
+                if _patch_count == 0:
+                    builtins.__import__ = _original_import
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        absolute_name = name
+        if level > 0:
+            try:
+                package = globals['__package__'] if globals else None
+                absolute_name = importlib.util.resolve_name('.' * level + name, package)
+            except (KeyError, ImportError, ValueError, TypeError):
+                pass
+        if absolute_name in sys.modules:
+            return _original_import(name, globals, locals, fromlist, level)
+
+        # time spent in nested imports is collected in the frame on the stack
+        self._stack.append([absolute_name, 0.])
+        start = time.perf_counter()
+        try:
+            return _original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            _, nested = self._stack.pop()
+            parent = self._stack[-1] if self._stack else None
+            if parent is not None:
+                parent[1] += elapsed
+            if absolute_name not in self.timings:
+                self.timings[absolute_name] = (elapsed,
+                                               elapsed - nested,
+                                               parent[0] if parent is not None else None)
+
+    def direct_imports(self, parent=None):
+        """ Timings of the modules imported directly by a module.
+
+        @param str parent: name of the importing module, None for the top level imports
+
+        @return list: (module name, cumulative time, self time) sorted by the cumulative time
+        """
+        entries = [(name, cumulative, self_time)
+                   for name, (cumulative, self_time, importer) in self.timings.items()
+                   if importer == parent]
+        return sorted(entries, key=lambda entry: entry[1], reverse=True)
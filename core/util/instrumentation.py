@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains timers and counters to instrument the hot paths of Qudi modules, e.g. the
+bodies of measurement loops.
+
+The instrumentation is disabled by default. A disabled timer is a shared object which does
+nothing, so instrumented code costs a function call and an attribute lookup per section.
+
+Usage:
+    from core.util.instrumentation import instrumentation
+
+    with instrumentation.timer('odmr_logic.scan_odmr_line.hardware'):
+        counts = counter.count_odmr(length=length)
+    instrumentation.count('counter_logic.count_loop_body.samples', len(counts))
+
+    @instrumentation.timed('optimizer_logic.fit')
+    def fit(self):
+        ...
+
+Enable it in the global section of the config ('instrumentation: True'), from the manager
+(manager.setInstrumentationEnabled(True)) or directly by instrumentation.enable(). The
+statistics are available via instrumentation.report() or as CSV via instrumentation.to_csv().
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import bisect
+import csv
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+# upper edges of the histogram bins in s, 8 bins per decade from 1 us to 100 s
+HISTOGRAM_EDGES = tuple(10 ** (exponent / 8) for exponent in range(-48, 17))
+
+CSV_COLUMNS = ('name', 'kind', 'count', 'total', 'mean', 'min', 'max', 'last',
+               'p50', 'p90', 'p99')
+
+
+class TimingStatistics:
+    """ Statistics of the durations of an instrumented section with a logarithmic histogram. """
+
+    kind = 'timer'
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.min = float('inf')
+        self.max = 0.
+        self.last = 0.
+        # the last bin collects all durations above the last edge
+        self.histogram = [0] * (len(HISTOGRAM_EDGES) + 1)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        if duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+        self.histogram[bisect.bisect_left(HISTOGRAM_EDGES, duration)] += 1
+
+    def percentile(self, fraction):
+        """ Estimate a percentile from the histogram.
+
+        @param float fraction: fraction of the durations below the percentile, 0 to 1
+
+        @return float: percentile interpolated linearly within its histogram bin
+        """
+        if self.count == 0:
+            return 0.
+        threshold = fraction * self.count
+        cumulative = 0
+        for index, entries in enumerate(self.histogram):
+            if entries > 0 and cumulative + entries >= threshold:
+                lower = max(HISTOGRAM_EDGES[index - 1] if index > 0 else 0., self.min)
+                upper = min(HISTOGRAM_EDGES[index] if index < len(HISTOGRAM_EDGES) else self.max,
+                            self.max)
+                return lower + (upper - lower) * (threshold - cumulative) / entries
+            cumulative += entries
+        return self.max
+
+    def as_dict(self):
+        return OrderedDict([('kind', self.kind),
+                            ('count', self.count),
+                            ('total', self.total),
+                            ('mean', self.total / self.count if self.count else 0.),
+                            ('min', self.min if self.count else 0.),
+                            ('max', self.max),
+                            ('last', self.last),
+                            ('p50', self.percentile(0.5)),
+                            ('p90', self.percentile(0.9)),
+                            ('p99', self.percentile(0.99)),
+                            ('histogram', list(self.histogram))])
+
+
+class CounterStatistics:
+    """ Statistics of an instrumented counter, e.g. the number of acquired samples. """
+
+    kind = 'counter'
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.last = 0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.last = value
+
+    def as_dict(self):
+        return OrderedDict([('kind', self.kind),
+                            ('count', self.count),
+                            ('total', self.total),
+                            ('mean', self.total / self.count if self.count else 0.),
+                            ('last', self.last)])
+
+
+class _NullTimer:
+    """ Timer returned while the instrumentation is disabled. """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+class _Timer:
+    """ Context manager adding the duration of a section to the statistics of a name. """
+
+    __slots__ = ('_instrumentation', '_name', '_start')
+
+    def __init__(self, instrumentation, name):
+        self._instrumentation = instrumentation
+        self._name = name
+        self._start = 0.
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._instrumentation.add_duration(self._name, time.perf_counter() - self._start)
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Instrumentation:
+    """ Thread safe registry of the timing and counter statistics by name. """
+
+    def __init__(self):
+        self.enabled = False
+        # reentrant, a garbage collection triggered while the lock is held may report its pause
+        self._lock = threading.RLock()
+        self._statistics = OrderedDict()
+
+    def enable(self, enabled=True):
+        """ Enable or disable the recording. The recorded statistics are kept.
+
+        @param bool enabled: True to record the instrumented sections
+        """
+        self.enabled = bool(enabled)
+
+    def timer(self, name):
+        """ Context manager measuring the duration of the enclosed section.
+
+        @param str name: name of the section, e.g. '<module>.<method>.<part>'
+
+        @return: context manager
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name=None):
+        """ Decorator measuring the duration of every call of a function.
+
+        @param str name: name of the section, defaults to the qualified name of the function
+        """
+        def decorator(function):
+            section = function.__qualname__ if name is None else name
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.add_duration(section, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def add_duration(self, name, duration):
+        """ Add a measured duration to the statistics of a timer.
+
+        @param str name: name of the section
+        @param float duration: duration in s
+        """
+        with self._lock:
+            statistics = self._statistics.get(name)
+            if statistics is None:
+                statistics = self._statistics[name] = TimingStatistics()
+            statistics.add(duration)
+
+    def count(self, name, value=1):
+        """ Add a value to a counter if the instrumentation is enabled.
+
+        @param str name: name of the counter
+        @param value: value to add, e.g. the number of samples acquired in a loop iteration
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            statistics = self._statistics.get(name)
+            if statistics is None:
+                statistics = self._statistics[name] = CounterStatistics()
+            statistics.add(value)
+
+    def reset(self):
+        """ Remove all recorded statistics. """
+        with self._lock:
+            self._statistics = OrderedDict()
+
+    def report(self, prefix=''):
+        """ Get the recorded statistics.
+
+        @param str prefix: only report names starting with this prefix
+
+        @return dict: {name: {'kind': 'timer' or 'counter', 'count': ..., 'total': ..., ...}}.
+                      Durations are in s, timers contain the histogram of the durations with
+                      the bin edges in HISTOGRAM_EDGES.
+        """
+        with self._lock:
+            return OrderedDict((name, statistics.as_dict())
+                               for name, statistics in sorted(self._statistics.items())
+                               if name.startswith(prefix))
+
+    def format_report(self, prefix=''):
+        """ Create a human readable table of the recorded statistics.
+
+        @param str prefix: only report names starting with this prefix
+
+        @return str: the table
+        """
+        lines = ['{0:<60} {1:>10} {2:>12} {3:>12} {4:>12} {5:>12}'.format(
+            'name', 'count', 'total', 'mean', 'p90', 'max')]
+        for name, entry in self.report(prefix).items():
+            if entry['kind'] == 'timer':
+                lines.append('{0:<60} {1:>10d} {2:>10.3f} s {3:>10.6f} s {4:>10.6f} s '
+                             '{5:>10.6f} s'.format(name, entry['count'], entry['total'],
+                                                   entry['mean'], entry['p90'], entry['max']))
+            else:
+                lines.append('{0:<60} {1:>10d} {2:>12} {3:>12.6g}'.format(
+                    name, entry['count'], entry['total'], entry['mean']))
+        return '\n'.join(lines)
+
+    def to_csv(self, filename, prefix=''):
+        """ Write the recorded statistics to a CSV file, one row per name.
+
+        @param str filename: path of the CSV file
+        @param str prefix: only export names starting with this prefix
+        """
+        with open(filename, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_COLUMNS)
+            for name, entry in self.report(prefix).items():
+                writer.writerow([name] + [entry.get(column, '') for column in CSV_COLUMNS[1:]])
+
+
+# the instrumentation shared by all modules of this process
+instrumentation = Instrumentation()
@@ -160,3 +160,26 @@ def compute_ft(x_val, y_val, zeropad_num=0, window='none', base_corr=True, psd=F
     fft_x = np.fft.fftfreq(len(zeropad_arr), d=x_spacing)
 
     return abs(fft_x[:middle]), fft_y[:middle]
+
+
+def run_length_encode(trace):
+    """ Run-length encoding of a 1D array, i.e. the decomposition into runs of equal values.
+
+    @param numpy.array trace: 1D array, e.g. a digitized (boolean) time trace
+
+    @return: tuple(values, lengths, starts):
+                numpy.array values: the value of each run
+                numpy.array lengths: the number of consecutive samples in each run
+                numpy.array starts: the index of the first sample of each run in trace
+
+    Example:
+        run_length_encode([1, 1, 0, 0, 0, 1]) = ([1, 0, 1], [2, 3, 1], [0, 2, 5])
+    """
+    trace = np.asarray(trace).ravel()
+    if trace.size == 0:
+        return trace.copy(), np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+    # A new run starts at every index, where the value differs from the previous one.
+    starts = np.concatenate(([0], np.flatnonzero(trace[1:] != trace[:-1]) + 1))
+    lengths = np.diff(np.append(starts, trace.size))
+    return trace[starts], lengths, starts
@@ -19,14 +19,289 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import socket
+import sys
+import threading
+import weakref
+import zlib
+
+import numpy as np
 import rpyc.core.netref
 import rpyc.utils.classic
 
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # python < 3.8
+    shared_memory = None
+try:
+    from multiprocessing import resource_tracker
+except ImportError:
+    resource_tracker = None
+
+# names of the remote types transferred by the array channel of the remote module service
+ARRAY_TYPES = ('numpy.ndarray', 'numpy.memmap')
+# smaller arrays are sent through the connection, a shared memory block does not pay off
+SHARED_MEMORY_MIN_BYTES = 2**20
+# Shared memory only beats the transfer through the rpyc connection. The array channel socket
+# is faster for all sizes (8 MB: 6 ms instead of 38 ms, 240 MB: 324 ms instead of 389 ms), so
+# by default shared memory is only used for loopback connections without array channel.
+# smaller buffers are sent in the reply of the connection instead of the array channel socket
+ARRAY_CHANNEL_MIN_BYTES = 2**16
+# timeout in s for connecting to and reading from the array channel socket
+ARRAY_CHANNEL_TIMEOUT = 10
+
+# array transfer settings by rpyc connection, see configure_array_transport
+_array_transport = weakref.WeakKeyDictionary()
+_array_transport_lock = threading.Lock()
+
 
 def netobtain(obj):
-    """
+    """ Get a local copy of an object if it is a rpyc remote object (netref).
+
+    Numpy arrays are transferred through the array channel of the remote module service (see
+    obtain_array) if the remote side provides it, everything else is pickled.
+
+    @param obj: local object or rpyc netref
+
+    @return: local object
     """
     if isinstance(obj, rpyc.core.netref.BaseNetref):
+        if _remote_type_name(obj) in ARRAY_TYPES:
+            array = obtain_array(obj)
+            if array is not None:
+                return array
         return rpyc.utils.classic.obtain(obj)
     else:
         return obj
+
+
+def _remote_type_name(proxy):
+    """ Full name of the type of the remote object of a netref, e.g. 'numpy.ndarray'. """
+    try:
+        # rpyc >= 4.1
+        return object.__getattribute__(proxy, '____id_pack__')[0]
+    except AttributeError:
+        # older versions create a netref class with the name and module of the remote type
+        netref_class = type(proxy)
+        return '{0}.{1}'.format(netref_class.__module__, netref_class.__name__)
+
+
+def configure_array_transport(connection, shared_memory=None, compression=None):
+    """ Set how numpy arrays are transferred over a rpyc connection.
+
+    @param connection: rpyc connection to a remote module service
+    @param bool shared_memory: transfer large arrays through shared memory, only possible if
+                               both sides run on the same host. Default: only for connections
+                               to the loopback interface without array channel socket (e.g.
+                               SSL connections).
+    @param int compression: zlib compression level (0 to 9) of the transferred buffers,
+                            0 disables compression. Default: 0
+    """
+    settings = _array_transport_settings(connection)
+    if shared_memory is not None:
+        settings['shared_memory'] = bool(shared_memory)
+    if compression is not None:
+        settings['compression'] = min(max(int(compression), 0), 9)
+
+
+def _array_transport_settings(connection):
+    with _array_transport_lock:
+        settings = _array_transport.get(connection)
+        if settings is None:
+            # channel: socket of the array channel, None if not opened yet, False if unavailable
+            # shared_memory: None to use it only for loopback connections without channel
+            settings = {'supported': None,
+                        'shared_memory': None,
+                        'loopback': _is_loopback_connection(connection),
+                        'compression': 0,
+                        'channel': None,
+                        'lock': threading.Lock()}
+            _array_transport[connection] = settings
+    if settings['supported'] is None:
+        try:
+            settings['supported'] = hasattr(connection.root, 'getArray')
+        except Exception:
+            settings['supported'] = False
+    return settings
+
+
+def _is_loopback_connection(connection):
+    try:
+        address = connection._channel.stream.sock.getpeername()[0]
+    except Exception:
+        return False
+    return address in ('127.0.0.1', '::1', 'localhost') or address.startswith('127.')
+
+
+def obtain_array(proxy):
+    """ Transfer a remote numpy array through the array channel of the remote module service.
+
+    The raw buffer is sent together with dtype and shape, optionally zlib compressed. Large
+    buffers are sent through a separate socket (the array channel), so rpyc neither compresses
+    nor copies them. If both sides run on the same host and there is no array channel socket,
+    large arrays are copied through a shared memory block instead.
+
+    @param proxy: rpyc netref of a numpy array
+
+    @return numpy.ndarray: local copy of the array, None if the array has to be obtained by
+                           pickling (remote side without array channel, object or structured
+                           dtype)
+    """
+    connection = object.__getattribute__(proxy, '____conn__')
+    settings = _array_transport_settings(connection)
+    if not settings['supported']:
+        return None
+    # the replies on the array channel socket have to be read in the order of the requests
+    with settings['lock']:
+        channel = _open_array_channel(connection, settings)
+        use_shared_memory = settings['shared_memory']
+        if use_shared_memory is None:
+            use_shared_memory = settings['loopback'] and channel is None
+        use_shared_memory = use_shared_memory and shared_memory is not None
+        frame = connection.root.getArray(proxy, use_shared_memory, settings['compression'],
+                                         channel is not None)
+        if frame is None:
+            return None
+        if frame[2] == 'shm':
+            try:
+                return decode_array(frame)
+            except OSError:
+                # the shared memory is not accessible, e.g. because the remote side is another
+                # host
+                settings['shared_memory'] = False
+            finally:
+                connection.root.releaseArray(frame[3])
+        else:
+            try:
+                return decode_array(frame, channel)
+            except OSError:
+                # the channel socket is broken or out of sync
+                _close_array_channel(settings)
+        return decode_array(connection.root.getArray(proxy, False, settings['compression']))
+
+
+def _open_array_channel(connection, settings):
+    """ Connect the array channel socket of a connection on first use.
+
+    @return socket.socket: the channel socket, None if the remote side does not provide one
+    """
+    if settings['channel'] is None:
+        settings['channel'] = False
+        try:
+            address = connection.root.openArrayChannel()
+            if address is None:
+                return None
+            port, token = address
+            # the channel listens on the interface the connection arrived at
+            host = connection._channel.stream.sock.getpeername()[0]
+            channel = socket.create_connection((host, int(port)), timeout=ARRAY_CHANNEL_TIMEOUT)
+        except Exception:
+            return None
+        try:
+            channel.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            channel.sendall(bytes(token))
+        except OSError:
+            channel.close()
+            return None
+        settings['channel'] = channel
+    return settings['channel'] or None
+
+
+def _close_array_channel(settings):
+    if settings['channel']:
+        settings['channel'].close()
+    settings['channel'] = False
+
+
+def encode_array(array, use_shared_memory=False, compression=0):
+    """ Frame a numpy array for the transfer to another process.
+
+    @param numpy.ndarray array: the array to transfer
+    @param bool use_shared_memory: copy arrays of at least SHARED_MEMORY_MIN_BYTES into a
+                                   shared memory block
+    @param int compression: zlib compression level of the buffer, 0 for no compression
+
+    @return tuple: (frame, shared memory block or None). The frame is a tuple (dtype string,
+                   shape, transport, payload) with transport 'raw' or 'zlib' and the bytes of
+                   the buffer as payload or transport 'shm' and the name of the shared memory
+                   block as payload. The frame is None for arrays of object or structured dtype.
+                   The caller has to close and unlink the shared memory block after the
+                   transfer.
+    """
+    array = np.asanyarray(array)
+    if array.dtype.hasobject or array.dtype.fields is not None:
+        return None, None
+    header = (array.dtype.str, tuple(int(length) for length in array.shape))
+    if (use_shared_memory and shared_memory is not None
+            and array.nbytes >= SHARED_MEMORY_MIN_BYTES):
+        block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        return header + ('shm', block.name), block
+    if compression > 0:
+        return header + ('zlib', zlib.compress(array.tobytes(), compression)), None
+    return header + ('raw', array.tobytes()), None
+
+
+def decode_array(frame, channel=None):
+    """ Create a numpy array from a frame created by encode_array.
+
+    @param tuple frame: (dtype string, shape, transport, payload). If the payload is the number
+                        of bytes instead of the bytes, they are read from the channel.
+    @param socket.socket channel: array channel socket the payload was sent through
+
+    @return numpy.ndarray: the array, owning its data
+    """
+    dtype, shape, transport, payload = frame
+    dtype = np.dtype(dtype)
+    shape = tuple(shape)
+    if transport == 'shm':
+        block = _attach_shared_memory(payload)
+        try:
+            return np.ndarray(shape, dtype=dtype, buffer=block.buf).copy()
+        finally:
+            block.close()
+    if isinstance(payload, int):
+        buffer = receive_buffer(channel, payload)
+        if transport == 'raw':
+            return buffer.view(dtype).reshape(shape)
+        payload = buffer.data
+    if transport == 'zlib':
+        payload = zlib.decompress(payload)
+    # frombuffer returns a read-only view of the bytes, the copy makes it writable
+    return np.frombuffer(payload, dtype=dtype).reshape(shape).copy()
+
+
+def receive_buffer(channel, size):
+    """ Read a number of bytes from a socket.
+
+    @param socket.socket channel: the socket
+    @param int size: number of bytes
+
+    @return numpy.ndarray: the bytes as writable uint8 array
+    """
+    if channel is None:
+        raise OSError('The payload was sent through an array channel which is not open.')
+    buffer = np.empty(size, dtype=np.uint8)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = channel.recv_into(view[received:])
+        if count == 0:
+            raise OSError('The array channel was closed by the remote side.')
+        received += count
+    return buffer
+
+
+def _attach_shared_memory(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    block = shared_memory.SharedMemory(name=name)
+    # Before python 3.13 attaching registers the block with the resource tracker of this
+    # process (on posix systems), which would unlink it again at exit. The remote side owns
+    # the block.
+    if resource_tracker is not None:
+        try:
+            resource_tracker.unregister(block._name, 'shared_memory')
+        except Exception:
+            pass
+    return block
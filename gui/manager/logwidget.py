@@ -380,18 +380,38 @@ class LogWidget(QtWidgets.QWidget):
         if not isGuiThread:
             self.sigAddEntry.emit(entry)
             return
-        if self.model.rowCount() > self.logLength:
-            self.model.removeRows(0, self.model.rowCount() - self.logLength)
-        text = entry['message']
-        if entry.get('exception') is not None:
-            if 'reasons' in entry['exception']:
-                text += '\n' + entry['exception']['reasons']
-            if 'message' in entry['exception']:
-                text += '\n' + entry['exception']['message']
-            for line in entry['exception']['traceback']:
-                text += '\n' + str(line)
-        logEntry = [entry['name'], entry['timestamp'], entry['level'], text]
-        self.model.addRow(self.model.rowCount(), logEntry)
+        self.addEntries([entry])
+
+    def addEntries(self, entries):
+        """Add several log entries to the log view at once.
+
+          @param list entries: log entries in dict format
+        """
+        isGuiThread = QtCore.QThread.currentThread(
+        ) == QtCore.QCoreApplication.instance().thread()
+        if not isGuiThread:
+            for entry in entries:
+                self.sigAddEntry.emit(entry)
+            return
+        # entries which would be removed right away are not added at all
+        entries = entries[-self.logLength:]
+        if not entries:
+            return
+        overflow = self.model.rowCount() + len(entries) - self.logLength
+        if overflow > 0:
+            self.model.removeRows(0, min(overflow, self.model.rowCount()))
+        rows = list()
+        for entry in entries:
+            text = entry['message']
+            if entry.get('exception') is not None:
+                if 'reasons' in entry['exception']:
+                    text += '\n' + entry['exception']['reasons']
+                if 'message' in entry['exception']:
+                    text += '\n' + entry['exception']['message']
+                for line in entry['exception']['traceback']:
+                    text += '\n' + str(line)
+            rows.append([entry['name'], entry['timestamp'], entry['level'], text])
+        self.model.addRows(self.model.rowCount(), rows)
         self.output.scrollToBottom()
 
     def displayEntry(self, entry):
@@ -145,7 +145,7 @@ class ManagerGui(GUIBase):
         self._mw.logwidget.setManager(self._manager)
         for loghandler in logging.getLogger().handlers:
             if isinstance(loghandler, core.logger.QtLogHandler):
-                loghandler.sigLoggedMessage.connect(self.handleLogEntry)
+                loghandler.sigLoggedMessages.connect(self.handleLogEntries)
         # Module widgets
         self.sigStartModule.connect(self._manager.startModule)
         self.sigReloadModule.connect(self._manager.restartModuleRecursive)
@@ -270,6 +270,17 @@ class ManagerGui(GUIBase):
         if entry['level'] == 'error' or entry['level'] == 'critical':
             self.errorDialog.show(entry)
 
+    def handleLogEntries(self, entries):
+        """ Forward a batch of log entries to the log widget and show an error
+            popup for the error messages.
+
+            @param list entries: Log entries
+        """
+        self._mw.logwidget.addEntries(entries)
+        for entry in entries:
+            if entry['level'] == 'error' or entry['level'] == 'critical':
+                self.errorDialog.show(entry)
+
     def startIPython(self):
         """ Create an IPython kernel manager and kernel.
             Add modules to its namespace.
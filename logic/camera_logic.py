@@ -24,6 +24,7 @@ import numpy as np
 
 from core.connector import Connector
 from core.configoption import ConfigOption
+from core.util.array_buffer import RingBuffer
 from core.util.mutex import Mutex
 from logic.generic_logic import GenericLogic
 from qtpy import QtCore
@@ -31,12 +32,65 @@ import matplotlib.pyplot as plt
 import matplotlib as mpl
 
 import datetime
+import os
+import struct
+import time
 from collections import OrderedDict
 
 
+class CameraAcquisitionWorker(QtCore.QObject):
+
+    """ Helper class for fetching the camera frames in a separate thread.
+
+    The worker fetches the frames with the frame rate of the camera logic and hands them to the
+    ring buffer of the logic, independent of how often the GUI preview is updated.
+    """
+
+    sigAcquisitionStopped = QtCore.Signal()
+
+    def __init__(self, parentclass):
+        super().__init__()
+
+        # remember the reference to the parent class to access the hardware and the settings
+        self._parentclass = parentclass
+
+    @QtCore.Slot()
+    def acquire_frame(self):
+        """ Fetch one frame from the camera and schedule the next one. """
+        logic = self._parentclass
+        hardware = logic._hardware
+        if not logic.enabled:
+            hardware.stop_acquisition()
+            self.sigAcquisitionStopped.emit()
+            return
+
+        start = time.perf_counter()
+        if not hardware.support_live_acquisition():
+            hardware.start_single_acquisition()  # the hardware has to check it's not busy
+        logic._add_frame(hardware.get_acquired_data())
+
+        delay = 1 / logic._fps - (time.perf_counter() - start)
+        QtCore.QTimer.singleShot(max(int(1000 * delay), 0), self.acquire_frame)
+
+
 class CameraLogic(GenericLogic):
     """
     Control a camera.
+
+    During the video the frames are fetched in a separate thread and stored in a ring buffer of
+    the last buffer_frames frames. The GUI preview is updated with at most preview_rate frames
+    per second and shows either the last frame or the average of the buffered frames, optionally
+    with a background image subtracted. The frames can be recorded to a binary .npy file.
+
+    Example config for copy-paste:
+
+    camera_logic:
+        module.Class: 'camera_logic.CameraLogic'
+        buffer_frames: 8
+        preview_rate: 20
+        connect:
+            hardware: 'camera_dummy'
+            savelogic: 'savelogic'
     """
 
     # declare connectors
@@ -44,11 +98,14 @@ class CameraLogic(GenericLogic):
     savelogic = Connector(interface='SaveLogic')
     _max_fps = ConfigOption('default_exposure', 20)
     _fps = _max_fps
+    _buffer_frames = ConfigOption('buffer_frames', 8)
+    _preview_rate = ConfigOption('preview_rate', 20)
 
     # signals
     sigUpdateDisplay = QtCore.Signal()
     sigAcquisitionFinished = QtCore.Signal()
     sigVideoFinished = QtCore.Signal()
+    _sigAcquireFrame = QtCore.Signal()
     timer = None
 
     enabled = False
@@ -57,6 +114,9 @@ class CameraLogic(GenericLogic):
     _gain = 1.
     _last_image = None
 
+    # size of the header reserved at the beginning of a recording file
+    _recording_header_size = 256
+
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
 
@@ -69,17 +129,45 @@ class CameraLogic(GenericLogic):
         self._save_logic = self.savelogic()
 
         self.enabled = False
+        self._acquiring = False
+
+        self._frame_buffer = None
+        self._previewed_frames = 0
+        self.running_average = False
+        self.background_subtraction = False
+        self._background = None
+        self._recording_file = None
+        self._recording_path = None
+        self._recorded_frames = 0
+        self._recording_shape = None
+        self._recording_dtype = None
 
         self.get_exposure()
         self.get_gain()
 
+        # the preview timer updates the displayed image during the video
         self.timer = QtCore.QTimer()
-        self.timer.setSingleShot(True)
-        self.timer.timeout.connect(self.loop)
+        self.timer.timeout.connect(self._update_preview)
+
+        # create an independent thread for fetching the frames
+        self._acquisition_thread = QtCore.QThread()
+        self._acquisition_worker = CameraAcquisitionWorker(self)
+        self._acquisition_worker.moveToThread(self._acquisition_thread)
+        self._sigAcquireFrame.connect(self._acquisition_worker.acquire_frame,
+                                      QtCore.Qt.QueuedConnection)
+        self._acquisition_worker.sigAcquisitionStopped.connect(self._acquisition_stopped,
+                                                               QtCore.Qt.QueuedConnection)
+        self._acquisition_thread.start()
 
     def on_deactivate(self):
         """ Perform required deactivation. """
-        pass
+        self.enabled = False
+        self.timer.stop()
+        self._sigAcquireFrame.disconnect()
+        self._acquisition_worker.sigAcquisitionStopped.disconnect()
+        self._acquisition_thread.quit()
+        self._acquisition_thread.wait()
+        self.stop_recording()
 
     def set_exposure(self, time):
         """ Set exposure of hardware """
@@ -105,44 +193,211 @@ class CameraLogic(GenericLogic):
 
         """
         self._hardware.start_single_acquisition()
-        self._last_image = self._hardware.get_acquired_data()
-        self.sigUpdateDisplay.emit()
+        self._add_frame(self._hardware.get_acquired_data())
+        self._update_preview()
         self.sigAcquisitionFinished.emit()
 
     def start_loop(self):
         """ Start the data recording loop.
         """
         self.enabled = True
-        self.timer.start(1000*1/self._fps)
+        self.timer.start(int(1000 / self._preview_rate))
 
         if self._hardware.support_live_acquisition():
             self._hardware.start_live_acquisition()
-        else:
-            self._hardware.start_single_acquisition()
+
+        # a worker which is still finishing the previous video continues
+        if not self._acquiring:
+            self._acquiring = True
+            self._sigAcquireFrame.emit()
 
     def stop_loop(self):
         """ Stop the data recording loop.
         """
-        self.timer.stop()
         self.enabled = False
-        self._hardware.stop_acquisition()
-        self.sigVideoFinished.emit()
 
+    def _acquisition_stopped(self):
+        """ Called when the worker thread has stopped fetching frames. """
+        self._acquiring = False
+        if self.enabled:
+            # the video was restarted while the worker was finishing
+            self.start_loop()
+            return
+        self.timer.stop()
+        self._update_preview()
+        self.stop_recording()
+        self.sigVideoFinished.emit()
 
     def loop(self):
-        """ Execute step in the data recording loop: save one of each control and process values
+        """ Execute step in the data recording loop: fetch a single frame and update the display
         """
-        self._last_image = self._hardware.get_acquired_data()
+        if not self._hardware.support_live_acquisition():
+            self._hardware.start_single_acquisition()
+        self._add_frame(self._hardware.get_acquired_data())
+        self._update_preview()
+
+    def _add_frame(self, frame):
+        """ Store a frame in the ring buffer and write it to an ongoing recording.
+
+        @param numpy.ndarray frame: image data of the camera
+
+        Called from the acquisition thread during the video.
+        """
+        frame = np.asarray(frame)
+        with self.threadlock:
+            if (self._frame_buffer is None or self._frame_buffer.frame_shape != frame.shape
+                    or self._frame_buffer.dtype != frame.dtype):
+                self._frame_buffer = RingBuffer(self._buffer_frames, frame.shape, frame.dtype)
+                self._previewed_frames = 0
+            stored = self._frame_buffer.push(frame)
+
+            if self._recording_file is not None:
+                if self._recording_shape is None:
+                    self._recording_shape = stored.shape
+                    self._recording_dtype = stored.dtype
+                if stored.shape != self._recording_shape or stored.dtype != self._recording_dtype:
+                    self.log.error('The image size of the camera changed. Recording stopped.')
+                    self._finish_recording_file()
+                else:
+                    # the buffer protocol writes the frame without copying it
+                    self._recording_file.write(stored.data)
+                    self._recorded_frames += 1
+
+    def _update_preview(self):
+        """ Update the displayed image if new frames arrived since the last update. """
+        with self.threadlock:
+            if self._frame_buffer is None or self._frame_buffer.total == self._previewed_frames:
+                return
+            self._previewed_frames = self._frame_buffer.total
+            if self.running_average:
+                image = self._frame_buffer.mean()
+            else:
+                image = np.array(self._frame_buffer.latest())
+
+        if self.background_subtraction and self._background is not None:
+            if self._background.shape == image.shape:
+                image = image - self._background
+            else:
+                self.log.warning('Background image has a different size than the camera image. '
+                                 'Take a new background image.')
+        self._last_image = image
         self.sigUpdateDisplay.emit()
-        if self.enabled:
-            self.timer.start(1000 * 1 / self._fps)
-            if not self._hardware.support_live_acquisition():
-                self._hardware.start_single_acquisition()  # the hardware has to check it's not busy
 
     def get_last_image(self):
         """ Return last acquired image """
         return self._last_image
 
+    def get_buffered_frames(self):
+        """ Return the frames in the ring buffer in chronological order.
+
+        @return numpy.ndarray: array of shape (number of frames, height, width)
+        """
+        with self.threadlock:
+            if self._frame_buffer is None:
+                return np.zeros((0, 0, 0))
+            return self._frame_buffer.data
+
+    def set_running_average(self, enabled):
+        """ Display the average of the buffered frames instead of the last frame.
+
+        @param bool enabled: True to average
+        """
+        self.running_average = bool(enabled)
+        self._previewed_frames = 0
+        self._update_preview()
+
+    def set_background_subtraction(self, enabled):
+        """ Subtract the background image from the displayed image.
+
+        @param bool enabled: True to subtract the background
+        """
+        self.background_subtraction = bool(enabled)
+        self._previewed_frames = 0
+        self._update_preview()
+
+    def take_background(self):
+        """ Use the average of the buffered frames as background image.
+
+        @return int: error code (0:OK, -1:error)
+        """
+        with self.threadlock:
+            if self._frame_buffer is None or self._frame_buffer.total == 0:
+                self.log.error('No camera image acquired yet. Cannot take a background image.')
+                return -1
+            self._background = self._frame_buffer.mean()
+        self._previewed_frames = 0
+        self._update_preview()
+        return 0
+
+    def set_background(self, background=None):
+        """ Set the background image which is subtracted from the displayed image.
+
+        @param numpy.ndarray background: background image, None to remove the background
+        """
+        self._background = None if background is None else np.array(background, dtype=float)
+        self._previewed_frames = 0
+        self._update_preview()
+
+    def start_recording(self, file_path=None):
+        """ Write all following frames to a binary file.
+
+        @param str file_path: optional, path of the .npy file. By default a file with a time
+                              stamp in the data directory of the camera is created.
+
+        @return str: path of the recording file
+
+        The file can be loaded with numpy.load (e.g. with mmap_mode='r') as array of shape
+        (number of frames, height, width) after the recording was stopped.
+        """
+        if file_path is None:
+            filepath = self._save_logic.get_path_for_module('Camera')
+            file_path = os.path.join(filepath, '{0}_camera_video.npy'.format(
+                datetime.datetime.now().strftime('%Y%m%d-%H%M-%S')))
+        with self.threadlock:
+            if self._recording_file is not None:
+                self._finish_recording_file()
+            self._recording_file = open(file_path, 'wb')
+            # the header is written when the recording is finished
+            self._recording_file.write(b' ' * self._recording_header_size)
+            self._recording_path = file_path
+            self._recorded_frames = 0
+            self._recording_shape = None
+            self._recording_dtype = None
+        return file_path
+
+    def stop_recording(self):
+        """ Stop writing frames to the recording file.
+
+        @return str: path of the recording file, None if no recording was running
+        """
+        with self.threadlock:
+            if self._recording_file is None:
+                return None
+            return self._finish_recording_file()
+
+    def _finish_recording_file(self):
+        """ Write the .npy header of the recording and close the file. Call with threadlock.
+
+        @return str: path of the recording file
+        """
+        recording_file, self._recording_file = self._recording_file, None
+        shape = (self._recorded_frames,)
+        if self._recording_shape is not None:
+            shape += tuple(self._recording_shape)
+        dtype = self._recording_dtype if self._recording_dtype is not None else np.dtype(float)
+        header = "{{'descr': {0!r}, 'fortran_order': False, 'shape': {1!r}, }}".format(
+            np.lib.format.dtype_to_descr(np.dtype(dtype)), shape)
+        header_length = self._recording_header_size - len(np.lib.format.magic(1, 0)) - 2
+        header = header.ljust(header_length - 1) + '\n'
+        recording_file.seek(0)
+        recording_file.write(np.lib.format.magic(1, 0))
+        recording_file.write(struct.pack('<H', header_length))
+        recording_file.write(header.encode('latin1'))
+        recording_file.close()
+        self.log.info('Recorded {0} camera frames to {1}'.format(self._recorded_frames,
+                                                                 self._recording_path))
+        return self._recording_path
+
     def save_xy_data(self, colorscale_range=None, percentile_range=None):
         """ Save the current confocal xy data to file.
 
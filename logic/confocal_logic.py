@@ -30,6 +30,7 @@ import matplotlib.pyplot as plt
 
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
+from core.util.instrumentation import instrumentation
 from core.connector import Connector
 from core.statusvariable import StatusVar
 
@@ -712,6 +713,7 @@ class ConfocalLogic(GenericLogic):
         """
         return self._scanning_device.get_scanner_count_channels()
 
+    @instrumentation.timed('confocal_logic.scan_line')
     def _scan_line(self):
         """scanning an image in either depth or xy
 
@@ -778,7 +780,8 @@ class ConfocalLogic(GenericLogic):
                     [lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
 
             # scan the line in the scan
-            line_counts = self._scanning_device.scan_line(line, pixel_clock=True)
+            with instrumentation.timer('confocal_logic.scan_line.hardware'):
+                line_counts = self._scanning_device.scan_line(line, pixel_clock=True)
             if np.any(line_counts == -1):
                 self.stopRequested = True
                 self.signal_scan_lines_next.emit()
@@ -815,22 +818,24 @@ class ConfocalLogic(GenericLogic):
                         ])
 
             # return the scanner to the start of next line, counts are thrown away
-            return_line_counts = self._scanning_device.scan_line(return_line)
+            with instrumentation.timer('confocal_logic.scan_line.return_line'):
+                return_line_counts = self._scanning_device.scan_line(return_line)
             if np.any(return_line_counts == -1):
                 self.stopRequested = True
                 self.signal_scan_lines_next.emit()
                 return
 
             # update image with counts from the line we just scanned
-            if self._zscan:
-                if self.depth_img_is_xz:
-                    self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
+            with instrumentation.timer('confocal_logic.scan_line.signals'):
+                if self._zscan:
+                    if self.depth_img_is_xz:
+                        self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
+                    else:
+                        self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
+                    self.signal_depth_image_updated.emit()
                 else:
-                    self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
-                self.signal_depth_image_updated.emit()
-            else:
-                self.xy_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
-                self.signal_xy_image_updated.emit()
+                    self.xy_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
+                    self.signal_xy_image_updated.emit()
 
             # next line in scan
             self._scan_counter += 1
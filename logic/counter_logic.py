@@ -30,6 +30,7 @@ from core.statusvariable import StatusVar
 from logic.generic_logic import GenericLogic
 from interface.slow_counter_interface import CountingMode
 from core.util.mutex import Mutex
+from core.util.instrumentation import instrumentation
 
 
 class CounterLogic(GenericLogic):
@@ -446,6 +447,7 @@ class CounterLogic(GenericLogic):
                 self.stopRequested = True
         return
 
+    @instrumentation.timed('counter_logic.count_loop_body')
     def count_loop_body(self):
         """ This method gets the count data from the hardware for the continuous counting mode (default).
 
@@ -468,23 +470,30 @@ class CounterLogic(GenericLogic):
                     return
 
                 # read the current counter value
-                self.rawdata = self._counting_device.get_counter(samples=self._counting_samples)
+                with instrumentation.timer('counter_logic.count_loop_body.hardware'):
+                    self.rawdata = self._counting_device.get_counter(
+                        samples=self._counting_samples)
+                instrumentation.count('counter_logic.count_loop_body.samples',
+                                      self.rawdata.shape[-1])
                 if self.rawdata[0, 0] < 0:
                     self.log.error('The counting went wrong, killing the counter.')
                     self.stopRequested = True
                 else:
-                    if self._counting_mode == CountingMode['CONTINUOUS']:
-                        self._process_data_continous()
-                    elif self._counting_mode == CountingMode['GATED']:
-                        self._process_data_gated()
-                    elif self._counting_mode == CountingMode['FINITE_GATED']:
-                        self._process_data_finite_gated()
-                    else:
-                        self.log.error('No valid counting mode set! Can not process counter data.')
+                    with instrumentation.timer('counter_logic.count_loop_body.processing'):
+                        if self._counting_mode == CountingMode['CONTINUOUS']:
+                            self._process_data_continous()
+                        elif self._counting_mode == CountingMode['GATED']:
+                            self._process_data_gated()
+                        elif self._counting_mode == CountingMode['FINITE_GATED']:
+                            self._process_data_finite_gated()
+                        else:
+                            self.log.error('No valid counting mode set! Can not process counter '
+                                           'data.')
 
             # call this again from event loop
-            self.sigCounterUpdated.emit()
-            self.sigCountDataNext.emit()
+            with instrumentation.timer('counter_logic.count_loop_body.signals'):
+                self.sigCounterUpdated.emit()
+                self.sigCountDataNext.emit()
         return
 
     def save_current_count_trace(self, name_tag=''):
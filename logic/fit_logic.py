@@ -20,14 +20,22 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import ast
+import copy
+import functools
 import importlib
 import inspect
 import lmfit
+import logging
 from qtpy import QtCore
 import numpy as np
 import os
+from scipy.ndimage import filters
 import sys
+import threading
+import time
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from distutils.version import LooseVersion
 
 from logic.generic_logic import GenericLogic
@@ -37,6 +45,94 @@ from core.config import load, save
 from core.configoption import ConfigOption
 
 
+def _cached_model_method(make_model):
+    """ Decorate a make_*_model method so the constructed model is taken from the model cache
+        of the FitLogic instance.
+
+        @param function make_model: make_*_model function to wrap
+
+        @return function: wrapped make_*_model function
+    """
+    @functools.wraps(make_model)
+    def wrapper(self, *args, **kwargs):
+        return self.get_cached_model(make_model, *args, **kwargs)
+    return wrapper
+
+
+def _index_fit_method_file(file_path):
+    """ Get the names of all functions defined in a fitmethods file without importing it.
+
+        @param str file_path: path of the python file
+
+        @return tuple: names of the module level functions
+    """
+    mtime = os.path.getmtime(file_path)
+    cached = _fit_method_file_index.get(file_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(file_path, 'rb') as file:
+        tree = ast.parse(file.read(), filename=file_path)
+    names = tuple(node.name for node in tree.body
+                  if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)))
+    _fit_method_file_index[file_path] = (mtime, names)
+    return names
+
+
+# {file path: (modification time, function names)} of the already indexed fitmethods files
+_fit_method_file_index = dict()
+
+
+class _FitMethodDict(OrderedDict):
+    """ Entry of FitLogic.fit_list holding the fit, model and estimator methods of one fit.
+
+    The methods are registered by name and replaced by the bound FitLogic methods on first access,
+    which imports their fitmethods file. Accessed values are always real bound methods.
+    """
+
+    def __init__(self, fit_logic):
+        super().__init__()
+        self._fit_logic = fit_logic
+        self._method_names = dict()
+
+    def register(self, key, method_name):
+        """ Add a FitLogic method by name without importing it.
+
+            @param str key: key in the fit_list entry, e.g. 'make_fit' or 'generic'
+            @param str method_name: name of the FitLogic method, e.g. 'make_lorentzian_fit'
+        """
+        super().__setitem__(key, None)
+        self._method_names[key] = method_name
+
+    def __getitem__(self, key):
+        if key in self._method_names:
+            super().__setitem__(key, getattr(self._fit_logic, self._method_names[key]))
+            del self._method_names[key]
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self._method_names.pop(key, None)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._method_names.pop(key, None)
+        super().__delitem__(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def copy(self):
+        return OrderedDict(self.items())
+
+    def __reduce__(self):
+        return OrderedDict, (self.items(),)
+
+
 class FitLogic(GenericLogic):
     """
     Documentation to add a new fit model/estimator/function can be found in
@@ -54,13 +150,24 @@ class FitLogic(GenericLogic):
     _additional_methods_import_path = ConfigOption(name='additional_fit_methods_path',
                                                    default=None,
                                                    missing='nothing')
+    # Cache the constructed lmfit models and parameters of the make_*_model methods
+    _use_model_cache = ConfigOption(name='use_model_cache', default=True, missing='nothing')
+
+    # Methods of the fitmethods files which are not imported yet, {method name: module name}
+    _lazy_fit_methods = dict()
+    _fit_import_lock = threading.RLock()
+    _imported_fit_modules = set()
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # locking for thread safety
         self.lock = Mutex()
 
-        filenames = []
+        # cache of constructed models, see get_cached_model
+        self._model_cache = dict()
+        self._model_cache_lock = Mutex()
+        self._model_cache_local = threading.local()
+
         # for path in directories:
         path_list = [os.path.join(get_main_dir(), 'logic', 'fitmethods')]
         # adding additional path, to be defined in the config
@@ -82,12 +189,19 @@ class FitLogic(GenericLogic):
                 self.log.error('ConfigOption additional_predefined_methods_path needs to either be a string or '
                                'a list of strings.')
 
+        # remember the paths for the worker processes of the batch fit
+        self._fit_method_paths = path_list
+
+        # Register the methods of all fitmethods files by name. A file is only imported when one
+        # of its methods is used for the first time (see __getattr__).
         for path in path_list:
-            for f in os.listdir(path):
+            if path not in sys.path:
+                sys.path.append(path)
+            for f in sorted(os.listdir(path)):
                 if os.path.isfile(os.path.join(path, f)) and f.endswith('.py'):
-                    filenames.append(f[:-3])
-                    if path not in sys.path:
-                        sys.path.append(path)
+                    for method in _index_fit_method_file(os.path.join(path, f)):
+                        if method not in FitLogic.__dict__:
+                            FitLogic._lazy_fit_methods.setdefault(method, f[:-3])
 
         # A dictionary containing all fit methods and their estimators.
         self.fit_list = OrderedDict()
@@ -95,31 +209,21 @@ class FitLogic(GenericLogic):
         self.fit_list['2d'] = OrderedDict()
         self.fit_list['3d'] = OrderedDict()
 
-        # Go through the fitmethods files and import all methods.
-        # Also determine which methods need to be added to the fit_list dictionary
+        # Determine which methods need to be added to the fit_list dictionary
         estimators_for_dict = list()
         models_for_dict = list()
         fits_for_dict = list()
 
-        for files in filenames:
-            mod = importlib.import_module('{0}'.format(files))
-            for method in dir(mod):
-                ref = getattr(mod, method)
-                if callable(ref) and (inspect.ismethod(ref) or inspect.isfunction(ref)):
-                    method_str = str(method)
-                    try:
-                        # import methods in Fitlogic
-                        setattr(FitLogic, method, ref)
-                        # append method to a list of methods to include in the fit_list dictionary
-                        if method_str.startswith('make_') and method_str.endswith('_fit'):
-                            fits_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
-                        elif method_str.startswith('make_') and method_str.endswith('_model'):
-                            models_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
-                        elif method_str.startswith('estimate_'):
-                            estimators_for_dict.append(method_str.split('_', 1)[1])
-                    except:
-                        self.log.error('Method "{0}" could not be imported to FitLogic.'
-                                       ''.format(str(method)))
+        method_names = set(FitLogic._lazy_fit_methods)
+        method_names.update(name for name in FitLogic.__dict__ if name.startswith('make_')
+                            or name.startswith('estimate_'))
+        for method_str in method_names:
+            if method_str.startswith('make_') and method_str.endswith('_fit'):
+                fits_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
+            elif method_str.startswith('make_') and method_str.endswith('_model'):
+                models_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
+            elif method_str.startswith('estimate_'):
+                estimators_for_dict.append(method_str.split('_', 1)[1])
 
         fits_for_dict.sort()
         models_for_dict.sort()
@@ -139,12 +243,12 @@ class FitLogic(GenericLogic):
 
             # Attach make_*_fit method to fit_list
             if fit_name not in self.fit_list[dimension]:
-                self.fit_list[dimension][fit_name] = OrderedDict()
-            self.fit_list[dimension][fit_name]['make_fit'] = getattr(self, fit_method)
+                self.fit_list[dimension][fit_name] = _FitMethodDict(self)
+            self.fit_list[dimension][fit_name].register('make_fit', fit_method)
 
             # Attach make_*_model method to fit_list
             if fit_name in models_for_dict:
-                self.fit_list[dimension][fit_name]['make_model'] = getattr(self, model_method)
+                self.fit_list[dimension][fit_name].register('make_model', model_method)
             else:
                 self.log.error('No make_*_model method for fit "{0}" found in FitLogic.'
                                ''.format(fit_name))
@@ -154,11 +258,12 @@ class FitLogic(GenericLogic):
             for estimator_name in estimators_for_dict:
                 estimator_method = 'estimate_' + estimator_name
                 if fit_name == estimator_name:
-                    self.fit_list[dimension][fit_name]['generic'] = getattr(self, estimator_method)
+                    self.fit_list[dimension][fit_name].register('generic', estimator_method)
                     found_estimator = True
                 elif estimator_name.startswith(fit_name + '_'):
                     custom_name = estimator_name.split('_', 1)[1]
-                    self.fit_list[dimension][fit_name][custom_name] = getattr(self, estimator_method)
+                    self.fit_list[dimension][fit_name].register(custom_name,
+                                                                estimator_method)
                     found_estimator = True
             if not found_estimator:
                 self.log.error('No estimator method for fit "{0}" found in FitLogic.'
@@ -167,6 +272,59 @@ class FitLogic(GenericLogic):
         self.log.info('Methods were included to FitLogic, but only if naming is right: check the'
                       ' doxygen documentation if you added a new method and it does not show.')
 
+    def __getattr__(self, name):
+        """ Import the fitmethods file of a registered but not yet imported fit method.
+
+            @param str name: name of the requested attribute
+
+            @return: the requested attribute
+        """
+        module_name = FitLogic._lazy_fit_methods.get(name)
+        if module_name is None:
+            raise AttributeError('{0} object has no attribute {1}'.format(
+                type(self).__name__, name))
+        self.import_fit_methods(module_name)
+        if name not in FitLogic.__dict__:
+            raise AttributeError('Fit method {0} could not be imported from {1}.'.format(
+                name, module_name))
+        return getattr(self, name)
+
+    def import_fit_methods(self, module_name):
+        """ Import a fitmethods file and attach all its methods to the FitLogic.
+
+            @param str module_name: name of the python module in one of the fit method paths
+        """
+        with FitLogic._fit_import_lock:
+            if module_name in FitLogic._imported_fit_modules:
+                return
+            start = time.perf_counter()
+            try:
+                mod = importlib.import_module(module_name)
+            except:
+                self.log.exception('Fit methods file "{0}" could not be imported.'
+                                   ''.format(module_name))
+                return
+            for method in dir(mod):
+                ref = getattr(mod, method)
+                if callable(ref) and (inspect.ismethod(ref) or inspect.isfunction(ref)):
+                    method_str = str(method)
+                    try:
+                        # import methods in Fitlogic, the model construction goes through the cache
+                        if method_str.startswith('make_') and method_str.endswith('_model'):
+                            ref = _cached_model_method(ref)
+                        setattr(FitLogic, method, ref)
+                    except:
+                        self.log.error('Method "{0}" could not be imported to FitLogic.'
+                                       ''.format(method_str))
+            FitLogic._imported_fit_modules.add(module_name)
+            self.log.debug('Imported fit methods of {0} in {1:.3f} s.'.format(
+                module_name, time.perf_counter() - start))
+
+    def import_all_fit_methods(self):
+        """ Import all registered fitmethods files at once instead of on first use. """
+        for module_name in sorted(set(FitLogic._lazy_fit_methods.values())):
+            self.import_fit_methods(module_name)
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
         """
@@ -179,6 +337,116 @@ class FitLogic(GenericLogic):
         """ """
         pass
 
+    def get_cached_model(self, make_model, *args, **kwargs):
+        """ Get the model and a copy of its parameters from the cache or construct them.
+
+            @param function make_model: undecorated make_*_model function
+            @param args: positional arguments passed to make_model (e.g. prefix)
+            @param kwargs: keyword arguments passed to make_model (e.g. prefix, no_of_functions)
+
+            @return tuple: (object model, object params) as returned by make_model
+
+        Models are cached per make_*_model function and call arguments, i.e. per fit name, prefix
+        and dimension. Only the outermost make_*_model call is cached, the sub-models used during
+        the construction of a composite model are always created freshly. Since the estimators
+        modify the parameters, each call returns an independent copy of the cached parameters.
+        """
+        if not self._use_model_cache or getattr(self._model_cache_local, 'building', False):
+            return make_model(self, *args, **kwargs)
+
+        key = (make_model.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            with self._model_cache_lock:
+                cached = self._model_cache.get(key)
+        except TypeError:
+            # unhashable arguments, do not cache
+            return make_model(self, *args, **kwargs)
+
+        if cached is None:
+            self._model_cache_local.building = True
+            try:
+                cached = make_model(self, *args, **kwargs)
+            finally:
+                self._model_cache_local.building = False
+            with self._model_cache_lock:
+                self._model_cache[key] = cached
+
+        model, params = cached
+        return model, copy.deepcopy(params)
+
+    def clear_model_cache(self):
+        """ Remove all constructed models from the model cache. """
+        with self._model_cache_lock:
+            self._model_cache.clear()
+
+    def do_batch_fit(self, fit_name, x_axis, data, estimator='generic', add_params=None,
+                     workers=1, chunk_size=None):
+        """ Fit the same 1D fit function to every row of a 2D data array.
+
+            @param str fit_name: name of the fit as in self.fit_list['1d'], e.g. 'lorentzian'
+            @param numpy.ndarray x_axis: 1D axis values common to all rows
+            @param numpy.ndarray data: 2D array of shape (number of datasets, len(x_axis))
+            @param estimator: name of the estimator (e.g. 'generic', 'dip') or the estimator method
+            @param Parameters or dict add_params: optional, additional parameters for all fits
+                                                  which will be used instead of the estimated ones
+            @param int workers: number of worker processes. For workers <= 1 all fits are done
+                                in the calling thread.
+            @param int chunk_size: optional, number of rows handed to a worker process at once
+
+            @return numpy.ndarray: structured array with one entry per row of data. It contains
+                                   a field for each fit parameter and a field '<param>_error' for
+                                   its standard error as well as the fields 'success' and
+                                   'chisqr'. Rows which could not be fitted (e.g. containing
+                                   non-finite values) are flagged with success=False and NaN.
+
+        The model is constructed only once (see get_cached_model) for each process.
+        """
+        x_axis = np.asarray(x_axis, dtype=float)
+        data = np.atleast_2d(np.asarray(data, dtype=float))
+        if data.ndim != 2 or data.shape[1] != x_axis.size:
+            self.log.error('Batch fit data must be a 2D array with rows of the length of x_axis '
+                           '({0:d}), but has shape {1}.'.format(x_axis.size, data.shape))
+            return None
+        if fit_name not in self.fit_list['1d']:
+            self.log.error('Unknown fit "{0}" for batch fit.'.format(fit_name))
+            return None
+        if callable(estimator):
+            estimator_method = estimator.__name__
+        elif estimator == 'generic':
+            estimator_method = 'estimate_{0}'.format(fit_name)
+        else:
+            estimator_method = 'estimate_{0}_{1}'.format(fit_name, estimator)
+        if not hasattr(self, estimator_method):
+            self.log.error('Unknown estimator "{0}" for batch fit.'.format(estimator_method))
+            return None
+
+        model, params = self.fit_list['1d'][fit_name]['make_model']()
+        param_names = list(params.keys())
+        results = _empty_batch_fit_results(data.shape[0], param_names)
+
+        # only rows with finite data are fitted
+        valid_rows = np.flatnonzero(np.all(np.isfinite(data), axis=1))
+        if valid_rows.size == 0:
+            return results
+
+        if workers is None or workers <= 1:
+            results[valid_rows] = _fit_rows(
+                self, fit_name, estimator_method, x_axis, data[valid_rows], param_names, add_params)
+            return results
+
+        if chunk_size is None:
+            chunk_size = max(1, int(np.ceil(valid_rows.size / (4 * workers))))
+        chunks = [valid_rows[i:i + chunk_size] for i in range(0, valid_rows.size, chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_batch_fit_worker,
+                                 initargs=(self._fit_method_paths,)) as executor:
+            futures = [executor.submit(_fit_rows_in_worker, fit_name, estimator_method, x_axis,
+                                       data[rows], param_names, add_params)
+                       for rows in chunks]
+            for rows, future in zip(chunks, futures):
+                results[rows] = future.result()
+        return results
+
     def validate_load_fits(self, fits):
         """ Take fit names and estimators from a dict and check if they are valid.
             @param fits dict: dictionary containing fit and estimator description
@@ -284,6 +552,240 @@ class FitLogic(GenericLogic):
         return FitContainer(self, container_name, dimension)
 
 
+def _empty_batch_fit_results(size, param_names):
+    """ Create the structured batch fit result array with all values set to NaN.
+
+        @param int size: number of fitted datasets
+        @param list param_names: names of the fit parameters
+
+        @return numpy.ndarray: structured array as described in FitLogic.do_batch_fit
+    """
+    fields = list()
+    for name in param_names:
+        fields.append((name, np.float64))
+        fields.append((name + '_error', np.float64))
+    fields.append(('success', np.bool_))
+    fields.append(('chisqr', np.float64))
+    results = np.zeros(size, dtype=np.dtype(fields))
+    for name, _ in fields:
+        if name != 'success':
+            results[name] = np.nan
+    return results
+
+
+def _fit_rows(fit_host, fit_name, estimator_method, x_axis, data, param_names, add_params):
+    """ Fit all rows of data with the same fit and return a structured result array.
+
+        @param fit_host: FitLogic instance or _BatchFitHost providing the fit methods
+        @param str fit_name: name of the fit, e.g. 'lorentzian'
+        @param str estimator_method: name of the estimator method, e.g. 'estimate_lorentzian_dip'
+        @param numpy.ndarray x_axis: 1D axis values
+        @param numpy.ndarray data: 2D array, one dataset per row
+        @param list param_names: parameter names defining the fields of the result array
+        @param add_params: additional parameters passed to each fit
+
+        @return numpy.ndarray: structured array as described in FitLogic.do_batch_fit
+    """
+    make_fit = getattr(fit_host, 'make_{0}_fit'.format(fit_name))
+    estimator = getattr(fit_host, estimator_method)
+    results = _empty_batch_fit_results(data.shape[0], param_names)
+    # initial values of all rows at once if the estimator has a vectorized version
+    initial_values = None
+    if estimator_method in _ROW_ESTIMATORS:
+        initial_values = _ROW_ESTIMATORS[estimator_method](fit_host, x_axis, data)
+    for index, row in enumerate(data):
+        if initial_values is not None:
+            estimator = _preset_estimator(initial_values, index)
+        try:
+            result = make_fit(x_axis=x_axis, data=row, estimator=estimator, add_params=add_params)
+        except:
+            fit_host.log.exception('Batch fit of dataset {0:d} failed.'.format(index))
+            continue
+        for name in param_names:
+            param = result.params[name]
+            results[name][index] = param.value
+            if param.stderr is not None:
+                results[name + '_error'][index] = param.stderr
+        results['success'][index] = result.success
+        results['chisqr'][index] = result.chisqr
+    return results
+
+
+def _preset_estimator(initial_values, index):
+    """ Create an estimator setting the initial values of one row computed by a row estimator.
+
+        @param dict initial_values: {parameter name: (values, min, max)} as returned by the
+                                    functions in _ROW_ESTIMATORS, min and max are None if
+                                    they are not changed
+        @param int index: row of the values
+
+        @return function: estimator(x_axis, data, params) like the estimators of the fit methods
+    """
+    def estimator(x_axis, data, params):
+        for name, (values, minimum, maximum) in initial_values.items():
+            params[name].set(value=values[index], min=minimum, max=maximum)
+        return 0, params
+    return estimator
+
+
+def _estimate_lorentzian_dip_rows(fit_host, x_axis, data):
+    """ Vectorized version of estimate_lorentzian_dip for all rows of data.
+
+        @param fit_host: FitLogic instance or _BatchFitHost providing the fit methods
+        @param numpy.ndarray x_axis: 1D axis values
+        @param numpy.ndarray data: 2D array, one dataset per row
+
+        @return dict: {parameter name: (values, min, max)}, see _preset_estimator
+    """
+    sorted_indices = np.argsort(x_axis)
+    x_axis = x_axis[sorted_indices]
+    data = data[:, sorted_indices]
+
+    # smoothing and offset histogram of find_offset_parameter for every row
+    if len(x_axis) < 20.:
+        len_x = 5
+    elif len(x_axis) >= 100.:
+        len_x = 10
+    else:
+        len_x = int(len(x_axis) / 10.) + 1
+    model, _ = fit_host.make_lorentzian_model()
+    lorentz = model.eval(x=np.linspace(0, len_x, len_x), amplitude=1, offset=0.,
+                         sigma=len_x / 4., center=len_x / 2.)
+    # the kernel is normalized, so padding with 0 and adding the row maximum afterwards is the
+    # same as padding every row with its maximum
+    data_max = data.max(axis=1)[:, np.newaxis]
+    data_smooth = filters.convolve1d(data - data_max, lorentz / lorentz.sum(), axis=1,
+                                     mode='constant', cval=0.) + data_max
+    offset = _histogram_mode_rows(data_smooth, 10)
+
+    data_level = data_smooth - offset[:, np.newaxis]
+    amplitude = data_level.min(axis=1)
+    # the integral of the linear spline of the estimator is the trapezoidal rule
+    numerical_integral = np.trapz(data_level, x_axis, axis=1)
+    x_zero = x_axis[np.argmin(data_smooth, axis=1)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma = np.abs(numerical_integral / (np.pi * amplitude))
+
+    stepsize = x_axis[1] - x_axis[0]
+    n_steps = len(x_axis)
+    return OrderedDict([
+        ('amplitude', (amplitude, None, -1e-12)),
+        ('sigma', (sigma, stepsize / 2, (x_axis[-1] - x_axis[0]) * 10)),
+        ('center', (x_zero, x_axis[0] - n_steps * stepsize, x_axis[-1] + n_steps * stepsize)),
+        ('offset', (offset, None, None))])
+
+
+def _estimate_lorentzian_peak_rows(fit_host, x_axis, data):
+    """ Vectorized version of estimate_lorentzian_peak, see _estimate_lorentzian_dip_rows. """
+    initial_values = _estimate_lorentzian_dip_rows(fit_host, x_axis, -data)
+    initial_values['offset'] = (-initial_values['offset'][0], None, None)
+    initial_values['amplitude'] = (-initial_values['amplitude'][0], -1e-12, np.inf)
+    return initial_values
+
+
+def _estimate_gaussian_peak_rows(fit_host, x_axis, data):
+    """ Vectorized version of estimate_gaussian_peak, see _estimate_lorentzian_dip_rows. """
+    stepsize = abs(x_axis[1] - x_axis[0])
+    n_steps = len(x_axis)
+    data_smoothed = filters.gaussian_filter1d(data, 2, axis=1)
+
+    offset = data_smoothed.min(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_val_calc = np.sum(x_axis * data_smoothed, axis=1) / np.sum(data_smoothed, axis=1)
+        mom2 = np.sum(x_axis ** 2 * data_smoothed, axis=1) / np.sum(data_smoothed, axis=1)
+    return OrderedDict([
+        ('offset', (offset, None, None)),
+        ('center', (x_axis[np.argmax(data_smoothed, axis=1)],
+                    x_axis[0] - n_steps * stepsize, x_axis[-1] + n_steps * stepsize)),
+        ('sigma', (np.sqrt(np.abs(mom2 - mean_val_calc ** 2)),
+                   stepsize, 3 * (x_axis[-1] - x_axis[0]))),
+        ('amplitude', (data_smoothed.max(axis=1) - offset, 0, None))])
+
+
+def _estimate_gaussian_dip_rows(fit_host, x_axis, data):
+    """ Vectorized version of estimate_gaussian_dip, see _estimate_lorentzian_dip_rows. """
+    initial_values = _estimate_gaussian_peak_rows(fit_host, x_axis, -data)
+    initial_values['offset'] = (-initial_values['offset'][0], None, None)
+    initial_values['amplitude'] = (-initial_values['amplitude'][0], -np.inf, 1e-12)
+    return initial_values
+
+
+def _histogram_mode_rows(data, bins):
+    """ Center of the most populated bin of the histogram (np.histogram) of every row.
+
+        @param numpy.ndarray data: 2D array, one dataset per row
+        @param int bins: number of histogram bins
+
+        @return numpy.ndarray: center of the first bin with the most entries for every row
+    """
+    lower = data.min(axis=1)
+    upper = data.max(axis=1)
+    # np.histogram extends the range of constant data by 0.5 to both sides
+    flat = lower == upper
+    lower = np.where(flat, lower - 0.5, lower)
+    upper = np.where(flat, upper + 0.5, upper)
+    width = (upper - lower) / bins
+    indices = np.floor((data - lower[:, np.newaxis]) / width[:, np.newaxis]).astype(int)
+    # the upper edge belongs to the last bin
+    indices = np.clip(indices, 0, bins - 1)
+    counts = np.zeros((data.shape[0], bins), dtype=int)
+    np.add.at(counts, (np.arange(data.shape[0])[:, np.newaxis], indices), 1)
+    return lower + (counts.argmax(axis=1) + 0.5) * width
+
+
+# vectorized versions of the estimators by name, used by the batch fit
+_ROW_ESTIMATORS = {'estimate_lorentzian_dip': _estimate_lorentzian_dip_rows,
+                   'estimate_lorentzian_peak': _estimate_lorentzian_peak_rows,
+                   'estimate_gaussian_peak': _estimate_gaussian_peak_rows,
+                   'estimate_gaussian_dip': _estimate_gaussian_dip_rows}
+
+
+class _BatchFitHost:
+    """ Minimal stand-in for the FitLogic in the worker processes of FitLogic.do_batch_fit.
+
+    It imports the fit methods from the same paths as the FitLogic and provides the model cache.
+    """
+    log = logging.getLogger('{0}.FitLogic.batch'.format(__name__))
+    get_cached_model = FitLogic.get_cached_model
+
+    def __init__(self, path_list):
+        self._use_model_cache = True
+        self._model_cache = dict()
+        self._model_cache_lock = Mutex()
+        self._model_cache_local = threading.local()
+
+        for path in path_list:
+            if path not in sys.path:
+                sys.path.append(path)
+            for f in os.listdir(path):
+                if not (os.path.isfile(os.path.join(path, f)) and f.endswith('.py')):
+                    continue
+                mod = importlib.import_module(f[:-3])
+                for method in dir(mod):
+                    ref = getattr(mod, method)
+                    if not inspect.isfunction(ref):
+                        continue
+                    if method.startswith('make_') and method.endswith('_model'):
+                        ref = _cached_model_method(ref)
+                    setattr(self, method, ref.__get__(self))
+
+
+# fit method provider of a batch fit worker process
+_batch_fit_host = None
+
+
+def _init_batch_fit_worker(path_list):
+    """ Initializer of the batch fit worker processes. """
+    global _batch_fit_host
+    _batch_fit_host = _BatchFitHost(path_list)
+
+
+def _fit_rows_in_worker(fit_name, estimator_method, x_axis, data, param_names, add_params):
+    """ Fit a chunk of rows inside a batch fit worker process. See _fit_rows. """
+    return _fit_rows(_batch_fit_host, fit_name, estimator_method, x_axis, data, param_names,
+                     add_params)
+
+
 class FitContainer(QtCore.QObject):
     """ A class for managing a single flexible fit setting in a logic module.
     """
@@ -448,10 +950,9 @@ class FitContainer(QtCore.QObject):
             self.current_fit = 'No Fit'
 
         if self.current_fit != 'No Fit':
-            # after the fit was performed, retrieve the fitting function and
-            # evaluate the fitted parameters according to the function:
-            model, params = self.fit_list[self.current_fit]['make_model']()
-            fit_y = model.eval(x=fit_x, params=result.params)
+            # after the fit was performed, evaluate the fitted parameters with the model of the
+            # fit result instead of constructing the model again:
+            fit_y = result.eval(x=fit_x)
 
         if result is not None:
             self.current_fit_param = result.params
@@ -26,6 +26,7 @@ import time
 
 from .qzmqkernel import QZMQKernel
 from core.util.network import netobtain
+from core.util.instrumentation import instrumentation
 
 
 # -----------------------------------------------------------------------------
@@ -84,7 +85,8 @@ class QudiKernelLogic(GenericLogic):
             'pg': pg,
             'np': np,
             'config': self._manager.tree['defined'],
-            'manager': self._manager
+            'manager': self._manager,
+            'instrumentation': instrumentation
         })
         kernel.sigShutdownFinished.connect(self.cleanupKernel)
         self.log.debug('Kernel is {0}'.format(kernel.engine_id))
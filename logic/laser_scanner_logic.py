@@ -78,6 +78,10 @@ class LaserScannerLogic(GenericLogic):
         self.plot_y = []
         self.plot_y2 = []
 
+        # cache of the generated scan lines, see _generate_ramp
+        self._ramp_cache = OrderedDict()
+        self._ramp_cache_size = 16
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
         """
@@ -168,12 +172,13 @@ class LaserScannerLogic(GenericLogic):
         self.sigVoltageChanged.emit(new_voltage)
         return 0
 
-    def _goto_during_scan(self, voltage=None):
+    def _goto_during_scan(self, voltage=None, spatial_pos=None):
 
         if voltage is None:
             return -1
 
-        goto_ramp = self._generate_ramp(self.get_current_voltage(), voltage, self._goto_speed)
+        goto_ramp = self._generate_ramp(self.get_current_voltage(), voltage, self._goto_speed,
+                                        spatial_pos)
         ignored_counts = self._scan_line(goto_ramp)
 
         return 0
@@ -278,9 +283,11 @@ class LaserScannerLogic(GenericLogic):
         self._scan_counter_down = 0
         self.upwards_scan = True
 
-        # TODO: Generate Ramps
-        self._upwards_ramp = self._generate_ramp(v_min, v_max, self._scan_speed)
-        self._downwards_ramp = self._generate_ramp(v_max, v_min, self._scan_speed)
+        # The spatial position does not change during the scan, so it is read only once
+        self._upwards_ramp = self._generate_ramp(v_min, v_max, self._scan_speed,
+                                                 self.current_position)
+        self._downwards_ramp = self._generate_ramp(v_max, v_min, self._scan_speed,
+                                                   self.current_position)
 
         self._initialise_data_matrix(len(self._upwards_ramp[3]))
 
@@ -318,14 +325,14 @@ class LaserScannerLogic(GenericLogic):
         # stops scanning
         if self.stopRequested or self._scan_counter_down >= self.number_of_repeats:
             print(self.current_position)
-            self._goto_during_scan(self._static_v)
+            self._goto_during_scan(self._static_v, self.current_position)
             self._close_scanner()
             self.sigScanFinished.emit()
             return
 
         if self._scan_counter_up == 0:
             # move from current voltage to start of scan range.
-            self._goto_during_scan(self.scan_range[0])
+            self._goto_during_scan(self.scan_range[0], self.current_position)
 
         if self.upwards_scan:
             counts = self._scan_line(self._upwards_ramp)
@@ -343,7 +350,7 @@ class LaserScannerLogic(GenericLogic):
         self.sigUpdatePlots.emit()
         self.sigScanNextLine.emit()
 
-    def _generate_ramp(self, voltage1, voltage2, speed):
+    def _generate_ramp(self, voltage1, voltage2, speed, spatial_pos=None):
         """Generate a ramp vrom voltage1 to voltage2 that
         satisfies the speed, step, smoothing_steps parameters.  Smoothing_steps=0 means that the
         ramp is just linear.
@@ -351,7 +358,27 @@ class LaserScannerLogic(GenericLogic):
         @param float voltage1: voltage at start of ramp.
 
         @param float voltage2: voltage at end of ramp.
+
+        @param float speed: ramp speed in volt per second.
+
+        @param list spatial_pos: optional, position of the three spatial scanner channels. If
+                                 not given, the current position is read from the hardware.
+
+        @return numpy.ndarray: scan line of shape (4, ramp length) for the hardware.
+
+        Generated scan lines are cached, so repeated scan lines (e.g. up- and downwards ramps
+        of a scan) are created only once. A copy is returned, since the scanner (e.g. the tilt
+        correction of the scanner_tilt_interfuse) may change the scan line in place.
         """
+        if spatial_pos is None:
+            spatial_pos = self._scanning_device.get_scanner_position()
+
+        key = (voltage1, voltage2, speed, self._clock_frequency, self._smoothing_steps,
+               tuple(spatial_pos[0:3]))
+        scan_line = self._ramp_cache.get(key)
+        if scan_line is not None:
+            self._ramp_cache.move_to_end(key)
+            return scan_line.copy()
 
         # It is much easier to calculate the smoothed ramp for just one direction (upwards),
         # and then to reverse it if a downwards ramp is required.
@@ -368,10 +395,9 @@ class LaserScannerLogic(GenericLogic):
 
             # Sanity check in case the range is too short
 
-            # The voltage range covered while accelerating in the smoothing steps
-            v_range_of_accel = sum(
-                n * linear_v_step / smoothing_range for n in range(0, smoothing_range)
-                )
+            # The voltage range covered while accelerating in the smoothing steps, i.e.
+            # sum(n * linear_v_step / smoothing_range for n in range(smoothing_range))
+            v_range_of_accel = linear_v_step * (smoothing_range - 1) / 2
 
             # Obtain voltage bounds for the linear part of the ramp
             v_min_linear = v_min + v_range_of_accel
@@ -382,19 +408,17 @@ class LaserScannerLogic(GenericLogic):
                     'Voltage ramp too short to apply the '
                     'configured smoothing_steps. A simple linear ramp '
                     'was created instead.')
-                num_of_linear_steps = np.rint((v_max - v_min) / linear_v_step)
+                num_of_linear_steps = int(np.rint((v_max - v_min) / linear_v_step))
                 ramp = np.linspace(v_min, v_max, num_of_linear_steps)
 
             else:
 
-                num_of_linear_steps = np.rint((v_max_linear - v_min_linear) / linear_v_step)
+                num_of_linear_steps = int(np.rint((v_max_linear - v_min_linear) / linear_v_step))
 
-                # Calculate voltage step values for smooth acceleration part of ramp
-                smooth_curve = np.array(
-                    [sum(
-                        n * linear_v_step / smoothing_range for n in range(1, N)
-                        ) for N in range(1, smoothing_range)
-                    ])
+                # Calculate voltage step values for smooth acceleration part of ramp, the N-th
+                # value is sum(n * linear_v_step / smoothing_range for n in range(1, N))
+                steps = np.arange(1, smoothing_range)
+                smooth_curve = linear_v_step / smoothing_range * steps * (steps - 1) / 2
 
                 accel_part = v_min + smooth_curve
                 decel_part = v_max - smooth_curve[::-1]
@@ -408,16 +432,15 @@ class LaserScannerLogic(GenericLogic):
             ramp = ramp[::-1]
 
         # Put the voltage ramp into a scan line for the hardware (4-dimension)
-        spatial_pos = self._scanning_device.get_scanner_position()
-
-        scan_line = np.vstack((
-            np.ones((len(ramp), )) * spatial_pos[0],
-            np.ones((len(ramp), )) * spatial_pos[1],
-            np.ones((len(ramp), )) * spatial_pos[2],
-            ramp
-            ))
-
-        return scan_line
+        scan_line = np.empty((4, len(ramp)))
+        scan_line[0:3] = np.asarray(spatial_pos[0:3], dtype=float)[:, np.newaxis]
+        scan_line[3] = ramp
+        scan_line.setflags(write=False)
+
+        self._ramp_cache[key] = scan_line
+        if len(self._ramp_cache) > self._ramp_cache_size:
+            self._ramp_cache.popitem(last=False)
+        return scan_line.copy()
 
     def _scan_line(self, line_to_scan=None):
         """do a single voltage scan from voltage1 to voltage2
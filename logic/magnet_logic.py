@@ -25,8 +25,10 @@ import numpy as np
 import time
 
 from collections import OrderedDict
+from core.configoption import ConfigOption
 from core.connector import Connector
 from core.statusvariable import StatusVar
+from core.util.array_buffer import ResultStore
 from logic.generic_logic import GenericLogic
 from qtpy import QtCore
 from interface.slow_counter_interface import CountingMode
@@ -82,8 +84,12 @@ class MagnetLogic(GenericLogic):
     align_2d_axis1_step = StatusVar('align_2d_axis1_step', 1e-3)
     align_2d_axis1_vel = StatusVar('align_2d_axis1_vel', 10e-6)
     curr_2d_pathway_mode = StatusVar('curr_2d_pathway_mode', 'snake-wise')
+    align_2d_adaptive_precision = StatusVar('align_2d_adaptive_precision', 0.0)
+    align_2d_adaptive_maximize = StatusVar('align_2d_adaptive_maximize', True)
 
     _checktime = StatusVar('_checktime', 2.5)
+    # interval in s to check whether a movement during an alignment is finished
+    _motion_poll_interval = ConfigOption('motion_poll_interval', 0.05)
     _1D_axis0_data = StatusVar('_1D_axis0_data', default=np.arange(3))
     _2D_axis0_data = StatusVar('_2D_axis0_data', default=np.arange(3))
     _2D_axis1_data = StatusVar('_2D_axis1_data', default=np.arange(2))
@@ -215,8 +221,21 @@ class MagnetLogic(GenericLogic):
         self._sigInitializeMeasPos.connect(self._move_to_curr_pathway_index)
         self._sigStepwiseAlignmentNext.connect(self._stepwise_loop_body,
                                                QtCore.Qt.QueuedConnection)
-
-        self.pathway_modes = ['spiral-in', 'spiral-out', 'snake-wise', 'diagonal-snake-wise']
+        self._sigContinuousAlignmentNext.connect(self._continuous_loop_body,
+                                                 QtCore.Qt.QueuedConnection)
+
+        # timer to wait for the end of a movement without blocking the event loop
+        self._motion_timer = QtCore.QTimer()
+        self._motion_timer.setSingleShot(True)
+        self._motion_timer.timeout.connect(self._check_motion_finished)
+        self._motion_callback = None
+        self._motion_record_axes = None
+        self._motion_trace = []
+
+        self.pathway_modes = ['spiral-in', 'spiral-out', 'snake-wise', 'diagonal-snake-wise',
+                              'adaptive']
+        self._adaptive_meas = False
+        self._adaptive_optimum = None
 
         # relative movement settings
 
@@ -295,6 +314,10 @@ class MagnetLogic(GenericLogic):
 
         self._statusVariables['odmr_2d_low_fitfunction'] = self.odmr_2d_low_fitfunction
         self._statusVariables['odmr_2d_high_fitfunction'] = self.odmr_2d_high_fitfunction
+
+        self._motion_timer.stop()
+        self._motion_timer.timeout.disconnect()
+        self._sigContinuousAlignmentNext.disconnect()
         return 0
 
     def get_hardware_constraints(self):
@@ -488,7 +511,8 @@ class MagnetLogic(GenericLogic):
                            'patharray.'.format(self.current_2d_pathway_mode))
             return [], []
 
-        # choose the snake-wise as default for now.
+        # choose the snake-wise as default for now. The 'adaptive' mode uses the
+        # snake-wise raster as grid of possible measurement points.
         else:
 
             # create a snake-wise stepping procedure through the matrix:
@@ -620,14 +644,153 @@ class MagnetLogic(GenericLogic):
         return pathway, back_map
 
     def _create_2d_cont_pathway(self, pathway):
+        """ Reduce the passed 1D path to the corner points of the lines along axis0.
 
-        # go through the passed 1D path and reduce the whole movement just to
-        # corner points
+        @param list pathway: pathway created by _create_2d_pathway
 
-        pathway_cont = dict()
+        @return list: one dict per line with the keys
+                        'start': move_abs dict of the first point of the line
+                        'end': move_abs dict of the last point of the line
+                        'axis1_index': index of the line in the 2D data matrix
+                        'path_index': pathway index of the first point of the line
+        """
+        pathway_cont = list()
 
+        for path_index in range(len(pathway)):
+            axis1_index = self._backmap[path_index]['index'][1]
+            move_dict_abs = self._move_to_index(path_index, pathway)[1]
+            if pathway_cont and pathway_cont[-1]['axis1_index'] == axis1_index:
+                pathway_cont[-1]['end'] = move_dict_abs
+            else:
+                pathway_cont.append({'start': move_dict_abs,
+                                     'end': move_dict_abs,
+                                     'axis1_index': axis1_index,
+                                     'path_index': path_index})
         return pathway_cont
 
+    def _init_adaptive_pathway(self):
+        """ Prepare the adaptive 2D alignment on the grid of the created raster pathway.
+
+        The adaptive alignment is a coarse-to-fine pattern search on the grid of the
+        snake-wise raster:
+            - a coarse sub-grid with at least 4 intervals along each axis is measured,
+            - the 8 neighbours at the current stride around the best point are measured
+              until the best point does not change anymore,
+            - the stride is halved and the search continues around the best point.
+        The search stops as soon as the best point is a local optimum with the stride being
+        smaller or equal to align_2d_adaptive_precision (or the grid step).
+
+        self._pathway and self._backmap are replaced by lists which contain only the
+        chosen points in measurement order. They grow during the measurement, so the
+        measurement loop and the save routine can use them like the raster pathway.
+        """
+        self._adaptive_grid = dict()
+        for path_index in range(len(self._pathway)):
+            grid_index = self._backmap[path_index]['index']
+            self._adaptive_grid[grid_index] = (self._pathway[path_index],
+                                               self._backmap[path_index])
+        self._adaptive_values = dict()
+        self._adaptive_optimum = None
+
+        grid_shape = np.shape(self._2D_data_matrix)
+        steps = (self.align_2d_axis0_step, self.align_2d_axis1_step)
+        self._adaptive_stride = list()
+        self._adaptive_min_stride = list()
+        for num_points, step in zip(grid_shape, steps):
+            stride = 1
+            while (num_points - 1) // (2 * stride) >= 4:
+                stride *= 2
+            self._adaptive_stride.append(stride)
+            self._adaptive_min_stride.append(
+                int(min(max(self.align_2d_adaptive_precision / step, 1), stride)))
+
+        # coarse grid including the last point of each axis, in snake-wise order
+        coarse_axes = list()
+        for num_points, stride in zip(grid_shape, self._adaptive_stride):
+            coarse_axis = list(range(0, num_points, stride))
+            if coarse_axis[-1] != num_points - 1:
+                coarse_axis.append(num_points - 1)
+            coarse_axes.append(coarse_axis)
+        self._adaptive_queue = list()
+        for line, axis1_index in enumerate(coarse_axes[1]):
+            axis0_indices = coarse_axes[0] if line % 2 == 0 else coarse_axes[0][::-1]
+            self._adaptive_queue.extend((axis0_index, axis1_index)
+                                        for axis0_index in axis0_indices)
+
+        self._pathway = list()
+        self._backmap = dict()
+        self._append_next_adaptive_point()
+
+    def _append_next_adaptive_point(self):
+        """ Append the next point of the adaptive alignment to the pathway.
+
+        @return bool: True if a point was appended, False if the optimum is localized
+        """
+        if not self._adaptive_queue:
+            self._refine_adaptive_queue()
+        if not self._adaptive_queue:
+            return False
+
+        # measure the queued points in the order of shortest moves
+        if self._pathway:
+            last_index = np.array(self._backmap[len(self._pathway) - 1]['index'])
+            distances = [np.sum(np.abs(np.array(index) - last_index))
+                         for index in self._adaptive_queue]
+            grid_index = self._adaptive_queue.pop(int(np.argmin(distances)))
+        else:
+            grid_index = self._adaptive_queue.pop(0)
+
+        step_config, back_map_entry = self._adaptive_grid[grid_index]
+        self._backmap[len(self._pathway)] = back_map_entry
+        self._pathway.append(step_config)
+        return True
+
+    def _refine_adaptive_queue(self):
+        """ Queue the unmeasured neighbours of the best point or halve the stride.
+
+        Sets self._adaptive_optimum if the optimum is localized.
+        """
+        grid_shape = np.shape(self._2D_data_matrix)
+        while True:
+            measured = list(self._adaptive_values)
+            values = np.array([self._adaptive_values[index] for index in measured])
+            if self.align_2d_adaptive_maximize:
+                best_index = measured[int(np.nanargmax(values))]
+            else:
+                best_index = measured[int(np.nanargmin(values))]
+
+            for offset0 in (-1, 0, 1):
+                for offset1 in (-1, 0, 1):
+                    index = (best_index[0] + offset0 * self._adaptive_stride[0],
+                             best_index[1] + offset1 * self._adaptive_stride[1])
+                    if (0 <= index[0] < grid_shape[0] and 0 <= index[1] < grid_shape[1]
+                            and index not in self._adaptive_values
+                            and index not in self._adaptive_queue):
+                        self._adaptive_queue.append(index)
+            if self._adaptive_queue:
+                return
+
+            if self._adaptive_stride == self._adaptive_min_stride:
+                break
+            self._adaptive_stride = [max(stride // 2, min_stride) for stride, min_stride
+                                     in zip(self._adaptive_stride, self._adaptive_min_stride)]
+
+        self._adaptive_optimum = self._adaptive_grid[best_index][1]
+        self.log.info('Adaptive alignment localized the optimum {0} at {1} after {2} of {3} '
+                      'points.'.format(self._adaptive_values[best_index],
+                                       {axis: self._adaptive_optimum[axis]
+                                        for axis in (self.align_2d_axis0_name,
+                                                     self.align_2d_axis1_name)},
+                                       len(self._adaptive_values), len(self._adaptive_grid)))
+
+    def get_2d_adaptive_optimum(self):
+        """ Get the optimum found by the last adaptive 2D alignment.
+
+        @return dict: positions of both alignment axes and the 'index' in the 2D data matrix,
+                      None if no adaptive alignment has finished
+        """
+        return self._adaptive_optimum
+
     def _prepare_2d_graph(self, axis0_start, axis0_range, axis0_step,
                           axis1_start, axis1_range, axis1_step):
         # set up a matrix where measurement points are save to
@@ -712,10 +875,11 @@ class MagnetLogic(GenericLogic):
         key_complement = key_set1 - key_set2
         self._control_dict = {key: pos_dict[key] for key in key_complement}
 
-        # additional values to save
-        self._2d_error = []
-        self._2d_measured_fields = []
-        self._2d_intended_fields = []
+        # additional values to save, the fields are stored with one column per axis
+        field_dtype = [(axis_name, float) for axis_name in pos_dict]
+        self._2d_error = ResultStore(dtype=float)
+        self._2d_measured_fields = ResultStore(dtype=field_dtype)
+        self._2d_intended_fields = ResultStore(dtype=field_dtype)
 
         # save only the position of the axis, which are going to be moved
         # during alignment, the return will be a dict!
@@ -756,9 +920,24 @@ class MagnetLogic(GenericLogic):
 
             self._2D_add_data_matrix = np.zeros(shape=np.shape(self._2D_data_matrix), dtype=object)
 
+            self._adaptive_meas = self.curr_2d_pathway_mode == 'adaptive'
+            if self._adaptive_meas:
+                if not stepwise_meas:
+                    self.log.warning('The adaptive alignment chooses every point from the '
+                                     'previous results. Measure stepwise instead.')
+                    stepwise_meas = True
+                self._init_adaptive_pathway()
+
+            if not stepwise_meas and self.curr_alignment_method != '2d_fluorescence':
+                self.log.warning('Continuous alignment is only possible for the '
+                                 'fluorescence measurement. Measure stepwise instead.')
+                stepwise_meas = True
+
+            # the index of the current line of the continuous measurement
+            self._pathway_cont_index = 0
             if stepwise_meas:
-                # just make it to an empty dict
-                self._pathway_cont = dict()
+                # just make it to an empty list
+                self._pathway_cont = list()
 
             else:
                 # create from the path_points the continuous points
@@ -797,24 +976,43 @@ class MagnetLogic(GenericLogic):
         # self.set_velocity(move_dict_vel)
         self._magnet_device.move_abs(move_dict_abs)
         # self.move_rel(move_dict_rel)
-        while self._check_is_moving():
-            time.sleep(self._checktime)
-            self.log.debug("Went into while loop in _move_to_curr_pathway_index")
-
-        # this function will return to this function if position is reached:
-        start_pos = self._saved_pos_before_align
-        end_pos = dict()
-        for axis_name in self._saved_pos_before_align:
-            end_pos[axis_name] = self._backmap[self._pathway_index][axis_name]
-
-        self.log.debug("(first movement) magnet moving ? {0}".format(self._check_is_moving()))
 
         if stepwise_meas:
             # start the Stepwise alignment loop body self._stepwise_loop_body:
-            self._sigStepwiseAlignmentNext.emit()
+            self._wait_for_motion(self._sigStepwiseAlignmentNext.emit)
         else:
             # start the continuous alignment loop body self._continuous_loop_body:
-            self._sigContinuousAlignmentNext.emit()
+            self._wait_for_motion(self._sigContinuousAlignmentNext.emit)
+
+    def _wait_for_motion(self, callback, record_axes=None):
+        """ Call callback as soon as the magnet has stopped moving.
+
+        @param callable callback: function without arguments called after the movement
+        @param list record_axes: optional, axes whose positions are recorded with time stamps
+                                 in self._motion_trace while the magnet moves
+
+        The magnet status is checked every motion_poll_interval seconds by a timer, so the
+        event loop of the logic keeps running (e.g. to process stop requests) while the magnet
+        moves.
+        """
+        self._motion_callback = callback
+        self._motion_record_axes = record_axes
+        self._motion_trace = []
+        if record_axes is not None:
+            self._motion_trace.append((time.time(), self.get_pos(record_axes)))
+        self._motion_timer.start(int(round(1000 * self._motion_poll_interval)))
+
+    def _check_motion_finished(self):
+        """ Check whether the movement is finished and proceed with the waiting callback. """
+        if self._motion_record_axes is not None:
+            self._motion_trace.append((time.time(), self.get_pos(self._motion_record_axes)))
+        if self._check_is_moving() and not self._stop_measure:
+            self._motion_timer.start(int(round(1000 * self._motion_poll_interval)))
+            return
+        callback = self._motion_callback
+        self._motion_callback = None
+        if callback is not None:
+            callback()
 
     def _stepwise_loop_body(self):
         """ Go one by one through the created path
@@ -845,7 +1043,8 @@ class MagnetLogic(GenericLogic):
         # variation of the measurement variables. ( Don't know which coordinates are used ... spheric, cartesian ... )
         distance = np.sqrt(distance)
         self._2d_error.append(distance)
-        self._2d_measured_fields.append(pos)
+        self._2d_measured_fields.append(
+            tuple(pos[key] for key in self._2d_measured_fields.dtype.names))
         # the desired field
         act_pos = {key: self._pathway[self._pathway_index][key]['move_abs'] for key in
                    self._pathway[self._pathway_index]}
@@ -854,21 +1053,23 @@ class MagnetLogic(GenericLogic):
         self._control_dict.update(act_pos)
         wanted_pos = self._control_dict
 
-        self._2d_intended_fields.append(wanted_pos)
+        self._2d_intended_fields.append(
+            tuple(wanted_pos[key] for key in self._2d_intended_fields.dtype.names))
 
         self.log.debug("Distance from desired position: {0}".format(distance))
         # perform here one of the chosen alignment measurements
         meas_val, add_meas_val = self._do_alignment_measurement()
 
-        # set the measurement point to the proper array and the proper position:
-        # save also all additional measurement information, which have been
-        # done during the measurement in add_meas_val.
-        self._set_meas_point(meas_val, add_meas_val, self._pathway_index, self._backmap)
-
         # increase the index
+        measured_index = self._pathway_index
         self._pathway_index += 1
 
-        if self._pathway_index < len(self._pathway):
+        if self._adaptive_meas:
+            # choose the next point from the results obtained so far
+            self._adaptive_values[self._backmap[measured_index]['index']] = meas_val
+            self._append_next_adaptive_point()
+
+        if self._pathway_index < len(self._pathway) and not self._stop_measure:
 
             #
             self._do_postmeasurement_proc()
@@ -878,25 +1079,20 @@ class MagnetLogic(GenericLogic):
 
             # commenting this out for now, because it is kind of useless for us
             # self.set_velocity(move_dict_vel)
+            # Start the movement to the next point right after the acquisition
+            # and handle the measured point while the magnet is moving.
             self._magnet_device.move_abs(move_dict_abs)
 
-            while self._check_is_moving():
-                time.sleep(self._checktime)
-                self.log.debug("Went into while loop in stepwise_loop_body")
-
-            self.log.debug("stepwise_loop_body reports magnet moving ? {0}".format(self._check_is_moving()))
+            # set the measurement point to the proper array and the proper position:
+            # save also all additional measurement information, which have been
+            # done during the measurement in add_meas_val.
+            self._set_meas_point(meas_val, add_meas_val, measured_index, self._backmap)
 
-            # this function will return to this function if position is reached:
-            start_pos = dict()
-            end_pos = dict()
-            for axis_name in self._saved_pos_before_align:
-                start_pos[axis_name] = self._backmap[self._pathway_index - 1][axis_name]
-                end_pos[axis_name] = self._backmap[self._pathway_index][axis_name]
-
-            # rerun this loop again
-            self._sigStepwiseAlignmentNext.emit()
+            # rerun this loop again as soon as the position is reached
+            self._wait_for_motion(self._sigStepwiseAlignmentNext.emit)
 
         else:
+            self._set_meas_point(meas_val, add_meas_val, measured_index, self._backmap)
             self._end_alignment_procedure()
         return
 
@@ -905,9 +1101,73 @@ class MagnetLogic(GenericLogic):
 
         @return:
 
-        The loop body goes through the 1D array
+        The loop body goes through the lines of self._pathway_cont. For each line
+        the magnet moves to the line start, then the fluorescence is counted while
+        the magnet moves with the set velocity to the end of the line.
         """
-        pass
+        if self._stop_measure or self._pathway_cont_index >= len(self._pathway_cont):
+            self._end_alignment_procedure()
+            return
+
+        line = self._pathway_cont[self._pathway_cont_index]
+        self._pathway_index = line['path_index']
+        self._magnet_device.move_abs(line['start'])
+        self._wait_for_motion(self._start_continuous_line)
+
+    def _start_continuous_line(self):
+        """ Start counting and move along the current line. """
+        if self._stop_measure:
+            self._end_alignment_procedure()
+            return
+
+        self._do_premeasurement_proc()
+
+        line = self._pathway_cont[self._pathway_cont_index]
+        if self._counter_logic.get_counting_mode() != CountingMode.CONTINUOUS:
+            self._counter_logic.set_counting_mode(mode=CountingMode.CONTINUOUS)
+        self._counter_logic.start_saving()
+
+        self._magnet_device.set_velocity({self.align_2d_axis0_name: self.align_2d_axis0_vel})
+        self._magnet_device.move_abs(line['end'])
+        self._wait_for_motion(self._finish_continuous_line,
+                              record_axes=[self.align_2d_axis0_name])
+
+    def _finish_continuous_line(self):
+        """ Assign the counts of the finished line to the positions of the 2D matrix. """
+        data_array, parameters = self._counter_logic.save_data(to_file=False)
+        data_array = np.array(data_array)
+        line = self._pathway_cont[self._pathway_cont_index]
+
+        if len(data_array) > 0 and len(self._motion_trace) > 0:
+            # interpolate the stage position at the time stamps of the counts
+            trace_times = np.array([entry[0] for entry in self._motion_trace])
+            trace_pos = np.array([entry[1][self.align_2d_axis0_name]
+                                  for entry in self._motion_trace])
+            count_times = self._counter_logic._saving_start_time + data_array[:, 0]
+            count_pos = np.interp(count_times, trace_times, trace_pos)
+
+            # assign the counts to the nearest point of the axis0 data
+            axis0_data = self._2D_axis0_data
+            if len(axis0_data) > 1:
+                step = axis0_data[1] - axis0_data[0]
+                indices = np.rint((count_pos - axis0_data[0]) / step).astype(int)
+            else:
+                indices = np.zeros(len(count_pos), dtype=int)
+            valid = (indices >= 0) & (indices < len(axis0_data))
+            indices = indices[valid]
+            count_sums = np.bincount(indices, weights=data_array[valid, 1],
+                                     minlength=len(axis0_data))
+            count_num = np.bincount(indices, minlength=len(axis0_data))
+            measured = count_num > 0
+            self._2D_data_matrix[measured, line['axis1_index']] = \
+                count_sums[measured] / count_num[measured]
+            for axis0_index in np.flatnonzero(measured):
+                self._2D_add_data_matrix[axis0_index, line['axis1_index']] = parameters
+            self.sig2DMatrixChanged.emit()
+
+        self._do_postmeasurement_proc()
+        self._pathway_cont_index += 1
+        self._sigContinuousAlignmentNext.emit()
 
     def stop_alignment(self):
         """ Stops any kind of ongoing alignment measurement by setting a flag.
@@ -934,10 +1194,10 @@ class MagnetLogic(GenericLogic):
             last_pos[axis_name] = self._backmap[self._pathway_index - 1][axis_name]
 
         self._magnet_device.move_abs(self._saved_pos_before_align)
+        self._wait_for_motion(self._alignment_finished)
 
-        while self._check_is_moving():
-            time.sleep(self._checktime)
-
+    def _alignment_finished(self):
+        """ Called after the magnet went back to the position before the alignment. """
         self.sigMeasurementFinished.emit()
 
         self._pathway_index = 0
@@ -1002,11 +1262,9 @@ class MagnetLogic(GenericLogic):
 
         @return bool: True indicates the magnet is moving, False the magnet stopped movement
         """
-        # get axis names
-        axes = [i for i in self._magnet_device.get_constraints()]
         state = self._magnet_device.get_status()
 
-        return (state[axes[0]] or state[axes[1]] or state[axes[2]]) is (1 or -1)
+        return any(axis_state == 1 for axis_state in state.values())
 
     def _set_meas_point(self, meas_val, add_meas_val, pathway_index, back_map):
 
@@ -1883,25 +2141,23 @@ class MagnetLogic(GenericLogic):
 
         self._save_logic.save_data(save_dict, filepath=filepath, filelabel=filelabel3,
                                    timestamp=timestamp, fmt='%.6e')
-        keys = self._2d_intended_fields[0].keys()
+        keys = self._2d_intended_fields.dtype.names
         intended_fields = OrderedDict()
         for key in keys:
-            field_values = [coord_dict[key] for coord_dict in self._2d_intended_fields]
-            intended_fields[key] = field_values
+            intended_fields[key] = self._2d_intended_fields.data[key]
 
         self._save_logic.save_data(intended_fields, filepath=filepath, filelabel=filelabel4,
                                    timestamp=timestamp)
 
         measured_fields = OrderedDict()
         for key in keys:
-            field_values = [coord_dict[key] for coord_dict in self._2d_measured_fields]
-            measured_fields[key] = field_values
+            measured_fields[key] = self._2d_measured_fields.data[key]
 
         self._save_logic.save_data(measured_fields, filepath=filepath, filelabel=filelabel5,
                                    timestamp=timestamp)
 
         error = OrderedDict()
-        error['quadratic error'] = self._2d_error
+        error['quadratic error'] = self._2d_error.data
 
         self._save_logic.save_data(error, filepath=filepath, filelabel=filelabel6,
                                    timestamp=timestamp)
@@ -2055,6 +2311,25 @@ class MagnetLogic(GenericLogic):
         self.sig2DAxis1VelChanged.emit(vel)
         return vel
 
+    def set_2d_pathway_mode(self, mode):
+        """Set the pathway mode of the 2D alignment, e.g. 'snake-wise' or 'adaptive' """
+        if mode not in self.pathway_modes:
+            self.log.error('Unknown pathway mode "{0}". Choose one of {1}.'
+                           ''.format(mode, self.pathway_modes))
+            return self.curr_2d_pathway_mode
+        self.curr_2d_pathway_mode = mode
+        return mode
+
+    def set_align_2d_adaptive_precision(self, precision):
+        """Set the precision to which the adaptive alignment localizes the optimum """
+        self.align_2d_adaptive_precision = precision
+        return precision
+
+    def set_align_2d_adaptive_maximize(self, maximize):
+        """Set whether the adaptive alignment searches the maximum or the minimum """
+        self.align_2d_adaptive_maximize = bool(maximize)
+        return self.align_2d_adaptive_maximize
+
     def get_align_2d_axis0_name(self):
         """Return the current value"""
         return self.align_2d_axis0_name
@@ -25,8 +25,10 @@ import numpy as np
 import time
 
 from collections import OrderedDict
+from core.configoption import ConfigOption
 from core.connector import Connector
 from core.statusvariable import StatusVar
+from core.util.array_buffer import ResultStore
 from core.util.mutex import Mutex
 from logic.generic_logic import GenericLogic
 from qtpy import QtCore
@@ -68,6 +70,9 @@ class NuclearOperationsLogic(GenericLogic):
     scannerlogic = Connector(interface='ConfocalLogic')
     savelogic = Connector(interface='SaveLogic')
 
+    # optional directory to move large result matrices of long measurements to a file
+    _result_spill_directory = ConfigOption('result_spill_directory', None)
+
     # status vars
     electron_rabi_periode = StatusVar('electron_rabi_periode', 1800e-9) # in s
 
@@ -144,6 +149,25 @@ class NuclearOperationsLogic(GenericLogic):
 
         self.threadlock = Mutex()
 
+        self._y_axis_store = ResultStore(row_shape=(0,))
+        self._parameter_store = ResultStore(row_shape=(0,), dtype=object)
+
+    @property
+    def y_axis_matrix(self):
+        """ All measured values, one row per measurement run (the current run is the last row).
+
+        @return numpy.ndarray: 2D array of shape (num_of_current_meas_runs + 1, x_axis points)
+        """
+        return self._y_axis_store.data
+
+    @property
+    def parameter_matrix(self):
+        """ The measurement parameters per measurement point, same shape as y_axis_matrix.
+
+        @return numpy.ndarray: 2D object array
+        """
+        return self._parameter_store.data
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
         """
@@ -207,10 +231,13 @@ class NuclearOperationsLogic(GenericLogic):
 
         # here all consequutive measurements are saved, where the
         # self.num_of_meas_runs determines the measurement index for the row.
-        self.y_axis_matrix = np.zeros((1, len(self.x_axis_list)))
+        self._y_axis_store = ResultStore(row_shape=(len(self.x_axis_list),),
+                                         spill_directory=self._result_spill_directory)
+        self._y_axis_store.append_row()
 
         # here all the measurement parameters per measurement point are stored:
-        self.parameter_matrix = np.zeros((1, len(self.x_axis_list)), dtype=object)
+        self._parameter_store = ResultStore(row_shape=(len(self.x_axis_list),), dtype=object)
+        self._parameter_store.append_row()
 
     def initialize_meas_param(self):
         """ Initialize the measurement param containter. """
@@ -345,12 +372,10 @@ class NuclearOperationsLogic(GenericLogic):
             # self.y_axis_matrix
             self.num_of_current_meas_runs += 1
 
-            new_row = np.zeros(len(self.x_axis_list))
-
-            # that vertical stack command behaves similar to the append method
-            # in python lists, where the new_row will be appended to the matrix:
-            self.y_axis_matrix = np.vstack((self.y_axis_matrix, new_row))
-            self.parameter_matrix = np.vstack((self.parameter_matrix, new_row))
+            # the result stores preallocate their rows, so appending a new
+            # zero initialized row does not copy the previous runs:
+            self._y_axis_store.append_row()
+            self._parameter_store.append_row()
 
         else:
             self.current_meas_index += 1
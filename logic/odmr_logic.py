@@ -31,6 +31,7 @@ import matplotlib.pyplot as plt
 
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
+from core.util.instrumentation import instrumentation
 from core.connector import Connector
 from core.configoption import ConfigOption
 from core.statusvariable import StatusVar
@@ -674,6 +675,7 @@ class ODMRLogic(GenericLogic):
                 self._clearOdmrData = True
         return
 
+    @instrumentation.timed('odmr_logic.scan_odmr_line')
     def _scan_odmr_line(self):
         """ Scans one line in ODMR
 
@@ -701,7 +703,8 @@ class ODMRLogic(GenericLogic):
             self.reset_sweep()
 
             # Acquire count data
-            error, new_counts = self._odmr_counter.count_odmr(length=self.odmr_plot_x.size)
+            with instrumentation.timer('odmr_logic.scan_odmr_line.hardware'):
+                error, new_counts = self._odmr_counter.count_odmr(length=self.odmr_plot_x.size)
 
             if error:
                 self.stopRequested = True
@@ -754,9 +757,11 @@ class ODMRLogic(GenericLogic):
             if self.elapsed_time >= self.run_time:
                 self.stopRequested = True
             # Fire update signals
-            self.sigOdmrElapsedTimeUpdated.emit(self.elapsed_time, self.elapsed_sweeps)
-            self.sigOdmrPlotsUpdated.emit(self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
-            self.sigNextLine.emit()
+            with instrumentation.timer('odmr_logic.scan_odmr_line.signals'):
+                self.sigOdmrElapsedTimeUpdated.emit(self.elapsed_time, self.elapsed_sweeps)
+                self.sigOdmrPlotsUpdated.emit(self.odmr_plot_x, self.odmr_plot_y,
+                                              self.odmr_plot_xy)
+                self.sigNextLine.emit()
             return
 
     def get_odmr_channels(self):
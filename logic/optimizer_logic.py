@@ -24,20 +24,70 @@ import numpy as np
 import time
 
 from logic.generic_logic import GenericLogic
+from core.configoption import ConfigOption
 from core.connector import Connector
 from core.statusvariable import StatusVar
+from core.util.fast_gaussian_fit import fit_twoDgaussian_grid, estimate_twoDgaussian_moments
 from core.util.mutex import Mutex
+from core.util.instrumentation import instrumentation
+
+
+class RefocusFitWorker(QtCore.QObject):
+
+    """ Helper class for fitting the xy refocus image in a separate thread.
+
+    The worker gets everything it needs with the start signal and hands the result back with a
+    queued signal, so it never touches the state of the optimizer logic while the z scan is
+    running.
+    """
+
+    sigXyFitFinished = QtCore.Signal(object)
+
+    def __init__(self, parentclass):
+        super().__init__()
+
+        # remember the reference to the parent class to access the fit settings
+        self._parentclass = parentclass
+
+    def fit_image(self, x_values, y_values, image):
+        """ Fit the xy refocus image and hand the result back to the optimizer logic.
+
+        @param numpy.ndarray x_values: x positions of the image columns
+        @param numpy.ndarray y_values: y positions of the image rows
+        @param numpy.ndarray image: 2D image of the optimization channel
+        """
+        result = self._parentclass._fit_xy_image(x_values, y_values, image)
+        self.sigXyFitFinished.emit(result)
 
 
 class OptimizerLogic(GenericLogic):
 
     """This is the Logic class for optimizing scanner position on bright features.
+
+    Example config for copy-paste:
+
+    optimizerlogic:
+        module.Class: 'optimizer_logic.OptimizerLogic'
+        xy_fit_method: 'fast'  # 'lmfit' (default) or 'fast'
+        pipelined_refocus: True  # start the z scan while the xy image is still being fitted
+        connect:
+            confocalscanner1: 'scanner_tilt_interfuse'
+            fitlogic: 'fitlogic'
     """
 
     # declare connectors
     confocalscanner1 = Connector(interface='ConfocalScannerInterface')
     fitlogic = Connector(interface='FitLogic')
 
+    # config options
+    # Fit used for the xy refocus image. 'lmfit' uses the generic 2D gaussian fit of the FitLogic,
+    # 'fast' uses the specialised (axis-aligned) gaussian fitter from core.util.fast_gaussian_fit.
+    _xy_fit_method = ConfigOption('xy_fit_method', 'lmfit',
+                                  checker=lambda x: x in ('lmfit', 'fast'))
+    # If True, a 'Z' step directly following an 'XY' step starts at the moment estimate of the
+    # xy image while the actual xy fit is running in a worker thread.
+    _pipelined_refocus = ConfigOption('pipelined_refocus', False)
+
     # declare status vars
     _clock_frequency = StatusVar('clock_frequency', 50)
     return_slowness = StatusVar(default=20)
@@ -57,6 +107,7 @@ class OptimizerLogic(GenericLogic):
     _sigCompletedXyOptimizerScan = QtCore.Signal()
     _sigDoNextOptimizationStep = QtCore.Signal()
     _sigFinishedAllOptimizationSteps = QtCore.Signal()
+    _sigStartXyFit = QtCore.Signal(object, object, object)
 
     # public signals
     sigImageUpdated = QtCore.Signal()
@@ -79,6 +130,11 @@ class OptimizerLogic(GenericLogic):
         # Keep track of who called the refocus
         self._caller_tag = ''
 
+        # Keep track of a running xy fit in pipelined mode
+        self._xy_fit_pending = False
+        self._step_waiting_for_xy_fit = False
+        self._pre_estimate_pos = (0., 0.)
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
 
@@ -129,6 +185,15 @@ class OptimizerLogic(GenericLogic):
 
         self._sigDoNextOptimizationStep.connect(self._do_next_optimization_step, QtCore.Qt.QueuedConnection)
         self._sigFinishedAllOptimizationSteps.connect(self.finish_refocus)
+
+        # create an independent thread for the xy fit in pipelined mode
+        self._fit_thread = QtCore.QThread()
+        self._fit_worker = RefocusFitWorker(self)
+        self._fit_worker.moveToThread(self._fit_thread)
+        self._sigStartXyFit.connect(self._fit_worker.fit_image, QtCore.Qt.QueuedConnection)
+        self._fit_worker.sigXyFitFinished.connect(self._xy_fit_finished, QtCore.Qt.QueuedConnection)
+        self._fit_thread.start()
+
         self._initialize_xy_refocus_image()
         self._initialize_z_refocus_image()
         return 0
@@ -138,6 +203,10 @@ class OptimizerLogic(GenericLogic):
 
         @return int: error code (0:OK, -1:error)
         """
+        self._sigStartXyFit.disconnect()
+        self._fit_worker.sigXyFitFinished.disconnect()
+        self._fit_thread.quit()
+        self._fit_thread.wait()
         return 0
 
     def check_optimization_sequence(self):
@@ -222,6 +291,8 @@ class OptimizerLogic(GenericLogic):
         self.optim_sigma_z = 0.
         #
         self._xy_scan_line_count = 0
+        self._xy_fit_pending = False
+        self._step_waiting_for_xy_fit = False
         self._optimization_step = 0
         self.check_optimization_sequence()
 
@@ -311,6 +382,7 @@ class OptimizerLogic(GenericLogic):
         time.sleep(self.hw_settle_time)
         return 0
 
+    @instrumentation.timed('optimizer_logic.refocus_xy_line')
     def _refocus_xy_line(self):
         """Scanning a line of the xy optimization image.
         This method repeats itself using the _sigScanNextXyLine
@@ -349,7 +421,8 @@ class OptimizerLogic(GenericLogic):
         else:
             line = np.vstack((lsx, lsy, lsz, np.zeros(lsx.shape)))
 
-        line_counts = self._scanning_device.scan_line(line)
+        with instrumentation.timer('optimizer_logic.refocus_xy_line.hardware'):
+            line_counts = self._scanning_device.scan_line(line)
         if np.any(line_counts == -1):
             self.log.error('The scan went wrong, killing the scanner.')
             self.stop_refocus()
@@ -364,7 +437,8 @@ class OptimizerLogic(GenericLogic):
         else:
             return_line = np.vstack((lsx, lsy, lsz, np.zeros(lsx.shape)))
 
-        return_line_counts = self._scanning_device.scan_line(return_line)
+        with instrumentation.timer('optimizer_logic.refocus_xy_line.return_line'):
+            return_line_counts = self._scanning_device.scan_line(return_line)
         if np.any(return_line_counts == -1):
             self.log.error('The scan went wrong, killing the scanner.')
             self.stop_refocus()
@@ -373,7 +447,8 @@ class OptimizerLogic(GenericLogic):
 
         s_ch = len(self.get_scanner_count_channels())
         self.xy_refocus_image[self._xy_scan_line_count, :, 3:3 + s_ch] = line_counts
-        self.sigImageUpdated.emit()
+        with instrumentation.timer('optimizer_logic.refocus_xy_line.signals'):
+            self.sigImageUpdated.emit()
 
         self._xy_scan_line_count += 1
 
@@ -384,20 +459,87 @@ class OptimizerLogic(GenericLogic):
 
     def _set_optimized_xy_from_fit(self):
         """Fit the completed xy optimizer scan and set the optimized xy position."""
-        fit_x, fit_y = np.meshgrid(self._X_values, self._Y_values)
-        xy_fit_data = self.xy_refocus_image[:, :, 3+self.opt_channel].ravel()
-        axes = np.empty((len(self._X_values) * len(self._Y_values), 2))
-        axes = (fit_x.flatten(), fit_y.flatten())
-        result_2D_gaus = self._fit_logic.make_twoDgaussian_fit(
-            xy_axes=axes,
-            data=xy_fit_data,
-            estimator=self._fit_logic.estimate_twoDgaussian_MLE
-        )
+        if self._pipelined_refocus:
+            self._start_pipelined_xy_fit()
+            return
+
+        result = self._fit_xy_image(self._X_values,
+                                    self._Y_values,
+                                    self.xy_refocus_image[:, :, 3 + self.opt_channel])
+        self._apply_xy_fit_result(result)
+        self._sigDoNextOptimizationStep.emit()
+
+    def _start_pipelined_xy_fit(self):
+        """ Start the xy fit in the worker thread and continue with a preliminary xy position.
+
+        The preliminary position is the first moment of the xy refocus image. A following z scan
+        is performed at this position, the fit result is applied as soon as it is available.
+        The fit needs the complete image, so it overlaps with the z scan and not with the xy scan.
+        """
+        image = self.xy_refocus_image[:, :, 3 + self.opt_channel]
+        estimate = estimate_twoDgaussian_moments(self._X_values, self._Y_values, image)
+
+        self._pre_estimate_pos = (self.optim_pos_x, self.optim_pos_y)
+        self.optim_pos_x = np.clip(estimate[1], self._X_values.min(), self._X_values.max())
+        self.optim_pos_y = np.clip(estimate[2], self._Y_values.min(), self._Y_values.max())
+
+        self._xy_fit_pending = True
+        self._step_waiting_for_xy_fit = False
+        self._sigStartXyFit.emit(self._X_values.copy(),
+                                 self._Y_values.copy(),
+                                 image.copy())
+
+        self.sigImageUpdated.emit()
+        self._sigDoNextOptimizationStep.emit()
+
+    def _xy_fit_finished(self, result):
+        """ Apply the result of a pipelined xy fit and resume a waiting optimization sequence.
+
+        @param object result: fit result as returned by _fit_xy_image
+        """
+        if not self._xy_fit_pending:
+            return
+        self._xy_fit_pending = False
+        self.optim_pos_x, self.optim_pos_y = self._pre_estimate_pos
+        self._apply_xy_fit_result(result)
+        if self._step_waiting_for_xy_fit:
+            self._step_waiting_for_xy_fit = False
+            self._sigDoNextOptimizationStep.emit()
+
+    def _fit_xy_image(self, x_values, y_values, image):
+        """ Fit a 2D gaussian to the xy refocus image with the configured fit method.
+
+        Does not change the state of the logic, since it is also called by the fit worker thread.
+
+        @param numpy.ndarray x_values: x positions of the image columns
+        @param numpy.ndarray y_values: y positions of the image rows
+        @param numpy.ndarray image: 2D image of the optimization channel
+
+        @return object: lmfit.model.ModelResult or GaussianFitResult (depending on xy_fit_method)
+        """
+        if self._xy_fit_method == 'fast':
+            result_2D_gaus = fit_twoDgaussian_grid(
+                x_axis=x_values,
+                y_axis=y_values,
+                image=image)
+        else:
+            fit_x, fit_y = np.meshgrid(x_values, y_values)
+            axes = (fit_x.flatten(), fit_y.flatten())
+            result_2D_gaus = self._fit_logic.make_twoDgaussian_fit(
+                xy_axes=axes,
+                data=image.ravel(),
+                estimator=self._fit_logic.estimate_twoDgaussian_MLE
+            )
         # print(result_2D_gaus.fit_report())
+        return result_2D_gaus
 
+    def _apply_xy_fit_result(self, result_2D_gaus):
+        """ Set the optimized xy position from a 2D gaussian fit result.
+
+        @param object result_2D_gaus: result of _fit_xy_image
+        """
         if result_2D_gaus.success is False:
-            self.log.error('Error: 2D Gaussian Fit was not successfull!.')
-            print('2D gaussian fit not successfull')
+            self.log.warning('2D gaussian fit of the xy refocus image was not successful.')
             self.optim_pos_x = self._initial_pos_x
             self.optim_pos_y = self._initial_pos_y
             self.optim_sigma_x = 0.
@@ -419,7 +561,6 @@ class OptimizerLogic(GenericLogic):
 
         # emit image updated signal so crosshair can be updated from this fit
         self.sigImageUpdated.emit()
-        self._sigDoNextOptimizationStep.emit()
 
     def do_z_optimization(self):
         """ Do the z axis optimization."""
@@ -467,9 +608,7 @@ class OptimizerLogic(GenericLogic):
                 if self.z_range[0] <= result.best_values['center'] <= self.z_range[1]:
                     self.optim_pos_z = result.best_values['center']
                     self.optim_sigma_z = result.best_values['sigma']
-                    gauss, params = self._fit_logic.make_gaussianlinearoffset_model()
-                    self.z_fit_data = gauss.eval(
-                        x=self._fit_zimage_Z_values, params=result.params)
+                    self.z_fit_data = result.eval(x=self._fit_zimage_Z_values)
                 else:  # new pos is too far away
                     # checks if new pos is too high
                     self.optim_sigma_z = 0.
@@ -616,6 +755,15 @@ class OptimizerLogic(GenericLogic):
         """Handle the steps through the specified optimization sequence
         """
 
+        # In pipelined mode only a 'Z' step directly following the 'XY' step may run while the
+        # xy fit is still pending. Everything else has to wait for the fit result.
+        if self._xy_fit_pending:
+            at_end = self._optimization_step == len(self.optimization_sequence)
+            if at_end or self.optimization_sequence[self._optimization_step] != 'Z' \
+                    or self.optimization_sequence[self._optimization_step - 1] != 'XY':
+                self._step_waiting_for_xy_fit = True
+                return
+
         # At the end fo the sequence, finish the optimization
         if self._optimization_step == len(self.optimization_sequence):
             self._sigFinishedAllOptimizationSteps.emit()
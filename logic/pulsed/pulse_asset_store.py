@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the storage of the pulsed assets (PulseBlock, PulseBlockEnsemble and
+PulseSequence instances) created by the SequenceGeneratorLogic.
+
+All assets are kept in a single SQLite database in the assets storage directory. The assets are
+indexed by type and name, so the names can be listed without de-serializing any asset and every
+asset is only de-serialized when it is used for the first time.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from core.util.helpers import natural_sort
+
+
+class PulseAssetStore:
+    """ Indexed storage of pickled pulsed assets in a SQLite database.
+
+    The assets are stored per kind ('block', 'ensemble' or 'sequence') and name. Every call of
+    save or delete is committed immediately, unless it happens inside a batch, which is committed
+    as a single transaction.
+
+    The store may be used from several threads, the access to the database is serialized.
+
+    Usage:
+        store = PulseAssetStore(directory)
+        with store.batch():
+            for block in blocks:
+                store.save('block', block.name, block)
+        store.names('block')  # naturally sorted names of all stored blocks
+        store.load('block', name)
+    """
+
+    kinds = ('block', 'ensemble', 'sequence')
+    filename = 'pulse_assets.sqlite'
+    legacy_directory = 'legacy_pickle_files'
+
+    def __init__(self, directory):
+        """
+        @param str directory: directory the database is created in
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, self.filename)
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._connection = sqlite3.connect(self.path, isolation_level=None,
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS assets ('
+                                 'kind TEXT NOT NULL, '
+                                 'name TEXT NOT NULL, '
+                                 'data BLOB NOT NULL, '
+                                 'modified REAL NOT NULL, '
+                                 'PRIMARY KEY (kind, name))')
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @contextmanager
+    def batch(self):
+        """ Context manager collecting all changes to the store in a single transaction.
+        Batches can be nested, the outermost batch commits. If an exception is raised in the
+        outermost batch, all of its changes are discarded.
+        """
+        with self._lock:
+            if self._batch_depth == 0:
+                self._connection.execute('BEGIN')
+            self._batch_depth += 1
+            try:
+                yield self
+            except:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._connection.execute('ROLLBACK')
+                raise
+            else:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._connection.execute('COMMIT')
+
+    def names(self, kind):
+        """ Names of all stored assets of a kind.
+
+        @param str kind: 'block', 'ensemble' or 'sequence'
+
+        @return list: naturally sorted asset names
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT name FROM assets WHERE kind=?', (kind,))
+            return natural_sort(row[0] for row in rows)
+
+    def load(self, kind, name):
+        """ De-serialize a single asset.
+
+        @param str kind: 'block', 'ensemble' or 'sequence'
+        @param str name: name of the asset
+
+        @return object: the asset, None if there is no asset by that name. Errors of the
+                        de-serialization (e.g. pickle.UnpicklingError) are raised.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT data FROM assets WHERE kind=? AND name=?',
+                                           (kind, name)).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def save(self, kind, name, asset):
+        """ Serialize an asset, replacing a stored asset of the same kind and name.
+
+        @param str kind: 'block', 'ensemble' or 'sequence'
+        @param str name: name of the asset
+        @param object asset: the asset to store
+        """
+        self._write(kind, name, pickle.dumps(asset))
+
+    def delete(self, kind, name):
+        """ Remove an asset from the store. Nothing happens if it does not exist.
+
+        @param str kind: 'block', 'ensemble' or 'sequence'
+        @param str name: name of the asset
+        """
+        with self._lock:
+            self._connection.execute('DELETE FROM assets WHERE kind=? AND name=?', (kind, name))
+
+    def _write(self, kind, name, data):
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO assets (kind, name, data, modified) VALUES (?, ?, ?, ?)',
+                (kind, name, sqlite3.Binary(data), time.time()))
+
+    def import_legacy_files(self):
+        """ Move the assets stored as one pickle file per asset (<name>.block, <name>.ensemble
+        and <name>.sequence) in the directory into the database. The files are not
+        de-serialized, just copied into the database and moved to a subdirectory afterwards.
+        Files of assets already in the database are moved without overwriting the stored asset.
+
+        @return int: number of imported assets
+        """
+        extensions = {'.' + kind: kind for kind in self.kinds}
+        with os.scandir(self.directory) as scan:
+            files = [(entry.path, os.path.splitext(entry.name)) for entry in scan
+                     if entry.is_file() and os.path.splitext(entry.name)[1] in extensions]
+        if not files:
+            return 0
+
+        legacy_dir = os.path.join(self.directory, self.legacy_directory)
+        os.makedirs(legacy_dir, exist_ok=True)
+        imported = 0
+        with self.batch():
+            existing = {(kind, name) for kind in self.kinds for name in self.names(kind)}
+            for path, (name, extension) in files:
+                kind = extensions[extension]
+                if (kind, name) not in existing:
+                    with open(path, 'rb') as file:
+                        self._write(kind, name, file.read())
+                    imported += 1
+        # the files are only moved once the transaction is committed
+        for path, _ in files:
+            shutil.move(path, os.path.join(legacy_dir, os.path.basename(path)))
+        return imported
+
+
+class LazyAssetDict(OrderedDict):
+    """ Dictionary of assets by name which de-serializes every asset on first access.
+
+    The names are known from the start, the values are loaded by calling loader(name). If the
+    loader returns None, the asset is dropped from the dictionary. Iterating over the keys (e.g.
+    to list the names) never loads an asset. Loading is guarded by a lock, so an asset accessed
+    by several threads at once is loaded once and never returned as the None placeholder.
+    """
+
+    def __init__(self, names=(), loader=None):
+        """
+        @param iterable names: names of the assets which are not loaded yet
+        @param callable loader: function loader(name) returning the asset or None
+        """
+        super().__init__()
+        self._loader = loader
+        self._unloaded = set()
+        self._load_lock = threading.RLock()
+        for name in names:
+            super().__setitem__(name, None)
+            self._unloaded.add(name)
+
+    def __getitem__(self, name):
+        with self._load_lock:
+            if name in self._unloaded:
+                asset = self._loader(name)
+                self._unloaded.discard(name)
+                if asset is None:
+                    super().__delitem__(name)
+                    raise KeyError(name)
+                super().__setitem__(name, asset)
+            return super().__getitem__(name)
+
+    def __setitem__(self, name, asset):
+        with self._load_lock:
+            self._unloaded.discard(name)
+            super().__setitem__(name, asset)
+
+    def __delitem__(self, name):
+        with self._load_lock:
+            self._unloaded.discard(name)
+            super().__delitem__(name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def pop(self, name, *default):
+        with self._load_lock:
+            try:
+                asset = self[name]
+            except KeyError:
+                if default:
+                    return default[0]
+                raise
+            del self[name]
+            return asset
+
+    def values(self):
+        return [asset for _, asset in self.items()]
+
+    def items(self):
+        items = list()
+        for name in tuple(self.keys()):
+            try:
+                items.append((name, self[name]))
+            except KeyError:
+                pass
+        return items
+
+    def is_loaded(self, name):
+        """ True if the asset by that name is already de-serialized. """
+        with self._load_lock:
+            return name in self and name not in self._unloaded
+
+    def clear(self):
+        with self._load_lock:
+            self._unloaded.clear()
+            super().clear()
+
+    def copy(self):
+        return OrderedDict(self.items())
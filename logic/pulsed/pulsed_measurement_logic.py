@@ -31,6 +31,7 @@ from core.connector import Connector
 from core.configoption import ConfigOption
 from core.statusvariable import StatusVar
 from core.util.mutex import Mutex
+from core.util.instrumentation import instrumentation
 from core.util.network import netobtain
 from core.util import units
 from core.util.math import compute_ft
@@ -1097,6 +1098,7 @@ class PulsedMeasurementLogic(GenericLogic):
                                                                         self.__fast_counter_gates))
         return
 
+    @instrumentation.timed('pulsed_measurement_logic.pulsed_analysis_loop')
     def _pulsed_analysis_loop(self):
         """ Acquires laser pulses from fast counter,
             calculates fluorescence signal and creates plots.
@@ -1107,7 +1109,8 @@ class PulsedMeasurementLogic(GenericLogic):
 
                 self._extract_laser_pulses()
 
-                tmp_signal, tmp_error = self._analyze_laser_pulses()
+                with instrumentation.timer('pulsed_measurement_logic.pulsed_analysis_loop.analysis'):
+                    tmp_signal, tmp_error = self._analyze_laser_pulses()
 
                 # exclude laser pulses to ignore
                 if len(self._laser_ignore_list) > 0:
@@ -1139,23 +1142,28 @@ class PulsedMeasurementLogic(GenericLogic):
                     self.measurement_error[1] = tmp_error
 
                 # Compute alternative data array from signal
-                self._compute_alt_data()
+                with instrumentation.timer(
+                        'pulsed_measurement_logic.pulsed_analysis_loop.alternative_data'):
+                    self._compute_alt_data()
 
             # emit signals
-            self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
-                                      self.__timer_interval)
-            self.sigMeasurementDataUpdated.emit()
+            with instrumentation.timer('pulsed_measurement_logic.pulsed_analysis_loop.signals'):
+                self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
+                                          self.__timer_interval)
+                self.sigMeasurementDataUpdated.emit()
             return
 
     def _extract_laser_pulses(self):
         # Get counter raw data (including recalled raw data from previous measurement)
-        fc_data, info_dict = self._get_raw_data()
+        with instrumentation.timer('pulsed_measurement_logic.pulsed_analysis_loop.hardware'):
+            fc_data, info_dict = self._get_raw_data()
         self.raw_data = fc_data
         self.__elapsed_sweeps = info_dict['elapsed_sweeps']
         self.__elapsed_time = info_dict['elapsed_time']
 
         # extract laser pulses from raw data
-        return_dict = self._pulseextractor.extract_laser_pulses(self.raw_data)
+        with instrumentation.timer('pulsed_measurement_logic.pulsed_analysis_loop.extraction'):
+            return_dict = self._pulseextractor.extract_laser_pulses(self.raw_data)
         self.laser_data = return_dict['laser_counts_arr']
         return
 
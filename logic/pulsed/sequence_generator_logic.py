@@ -38,6 +38,7 @@ from core.util.network import netobtain
 from logic.generic_logic import GenericLogic
 from logic.pulsed.pulse_objects import PulseBlock, PulseBlockEnsemble, PulseSequence
 from logic.pulsed.pulse_objects import PulseObjectGenerator, PulseBlockElement
+from logic.pulsed.pulse_asset_store import PulseAssetStore, LazyAssetDict
 from logic.pulsed.sampling_functions import SamplingFunctions
 from interface.pulser_interface import SequenceOption
 
@@ -138,6 +139,12 @@ class SequenceGeneratorLogic(GenericLogic):
         self._saved_pulse_blocks = OrderedDict()
         self._saved_pulse_block_ensembles = OrderedDict()
         self._saved_pulse_sequences = OrderedDict()
+        # Database holding the serialized pulse objects
+        self._asset_store = None
+        # Waveforms and sequences present on the pulse generator during activation. Used to
+        # discard outdated sampling information of pulse objects when they are loaded.
+        self._pulser_waveforms = set()
+        self._pulser_sequences = set()
         return
 
     def on_activate(self):
@@ -187,13 +194,21 @@ class SequenceGeneratorLogic(GenericLogic):
         # Read back settings from device and update instance variables accordingly
         self._read_settings_from_device()
 
-        # Update saved blocks/ensembles/sequences from serialized files
-        self._saved_pulse_blocks = OrderedDict()
-        self._saved_pulse_block_ensembles = OrderedDict()
-        self._saved_pulse_sequences = OrderedDict()
-        self._update_blocks_from_file()
-        self._update_ensembles_from_file()
-        self._update_sequences_from_file()
+        # Open the asset database and move pulse objects saved by older versions (one file per
+        # object) into it
+        self._asset_store = PulseAssetStore(self._assets_storage_dir)
+        imported = self._asset_store.import_legacy_files()
+        if imported:
+            self.log.info('Moved {0:d} pulse objects from single files into the asset database '
+                          '"{1}".'.format(imported, self._asset_store.path))
+
+        # Update saved blocks/ensembles/sequences from the asset database. The objects themselves
+        # are de-serialized on first access.
+        self._pulser_waveforms = set(self.sampled_waveforms)
+        self._pulser_sequences = set(self.sampled_sequences)
+        self._update_blocks_from_store()
+        self._update_ensembles_from_store()
+        self._update_sequences_from_store()
 
         # Get instance of PulseObjectGenerator which takes care of collecting all predefined methods
         self._pog = PulseObjectGenerator(sequencegeneratorlogic=self)
@@ -204,6 +219,9 @@ class SequenceGeneratorLogic(GenericLogic):
     def on_deactivate(self):
         """ Deinitialisation performed during deactivation of the module.
         """
+        if self._asset_store is not None:
+            self._asset_store.close()
+            self._asset_store = None
         return
 
     # @_saved_pulse_blocks.constructor
@@ -446,15 +464,23 @@ class SequenceGeneratorLogic(GenericLogic):
             self.log.error('Can´t clear the pulser as it is running. Switch off the pulser and try again.')
             return -1
         self.pulsegenerator().clear_all()
-        # Delete all sampling information from all PulseBlockEnsembles and PulseSequences
-        for seq_name in self.saved_pulse_sequences:
-            seq = self.saved_pulse_sequences[seq_name]
-            seq.sampling_information = dict()
-            self.save_sequence(seq)
-        for ens_name in self.saved_pulse_block_ensembles:
-            ens = self.saved_pulse_block_ensembles[ens_name]
-            ens.sampling_information = dict()
-            self.save_ensemble(ens)
+        # Delete all sampling information from all PulseBlockEnsembles and PulseSequences.
+        # Objects not loaded yet are cleaned up when they are loaded since the pulser is empty.
+        self._pulser_waveforms = set()
+        self._pulser_sequences = set()
+        with self._asset_store.batch():
+            for seq_name in self.saved_pulse_sequences:
+                if self._saved_pulse_sequences.is_loaded(seq_name):
+                    seq = self.saved_pulse_sequences[seq_name]
+                    seq.sampling_information = dict()
+                    self._save_sequence_to_store(seq)
+            for ens_name in self.saved_pulse_block_ensembles:
+                if self._saved_pulse_block_ensembles.is_loaded(ens_name):
+                    ens = self.saved_pulse_block_ensembles[ens_name]
+                    ens.sampling_information = dict()
+                    self._save_ensemble_to_store(ens)
+        self.sigSequenceDictUpdated.emit(self.saved_pulse_sequences)
+        self.sigEnsembleDictUpdated.emit(self.saved_pulse_block_ensembles)
         self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
         self.sigAvailableSequencesUpdated.emit(self.sampled_sequences)
         self.sigLoadedAssetUpdated.emit('', '')
@@ -708,7 +734,7 @@ class SequenceGeneratorLogic(GenericLogic):
         @param PulseBlock block: PulseBlock instance to save
         """
         self._saved_pulse_blocks[block.name] = block
-        self._save_block_to_file(block)
+        self._save_block_to_store(block)
         self.sigBlockDictUpdated.emit(self._saved_pulse_blocks)
         return
 
@@ -733,74 +759,60 @@ class SequenceGeneratorLogic(GenericLogic):
             del (self._saved_pulse_blocks[name])
 
         # Delete from disk
-        filepath = os.path.join(self._assets_storage_dir, '{0}.block'.format(name))
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        self._asset_store.delete('block', name)
 
         self.sigBlockDictUpdated.emit(self.saved_pulse_blocks)
         return
 
-    def _load_block_from_file(self, block_name):
+    def _load_block_from_store(self, block_name):
         """
-        De-serializes a PulseBlock instance from file.
+        De-serializes a PulseBlock instance from the asset store.
 
         @param str block_name: The name of the PulseBlock instance to de-serialize
         @return PulseBlock: The de-serialized PulseBlock instance
         """
         block = None
-        filepath = os.path.join(self._assets_storage_dir, '{0}.block'.format(block_name))
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'rb') as file:
-                    block = pickle.load(file)
-            except pickle.UnpicklingError:
-                self.log.error('Failed to de-serialize PulseBlock "{0}" from file.'
-                               ''.format(block_name))
-                os.remove(filepath)
-            except ModuleNotFoundError:
-                self.log.error('Failed to de-serialize PulseBlock "{0}" from file because of missing dependencies.\n'
-                               'For better debugging I dumped the traceback to debug.'.format(block_name))
-                self.log.debug('{0!s}'.format(traceback.format_exc()))
+        try:
+            block = self._asset_store.load('block', block_name)
+        except pickle.UnpicklingError:
+            self.log.error('Failed to de-serialize PulseBlock "{0}" from file.'
+                           ''.format(block_name))
+            self._asset_store.delete('block', block_name)
+        except ModuleNotFoundError:
+            self.log.error('Failed to de-serialize PulseBlock "{0}" from file because of missing dependencies.\n'
+                           'For better debugging I dumped the traceback to debug.'.format(block_name))
+            self.log.debug('{0!s}'.format(traceback.format_exc()))
         return block
 
-    def _update_blocks_from_file(self):
+    def _update_blocks_from_store(self):
         """
-        Update the saved_pulse_blocks dict by de-serializing stored file.
+        Update the saved_pulse_blocks dict with the names of the stored PulseBlocks. The blocks
+        are de-serialized on first access.
         """
-        # Get all files in asset directory ending on ".block" and extract a sorted list of
-        # PulseBlock names
-        with os.scandir(self._assets_storage_dir) as scan:
-            names = natural_sort(f.name[:-6] for f in scan if f.is_file and f.name.endswith('.block'))
-
-        # Load all blocks from file
-        for block_name in names:
-            block = self._load_block_from_file(block_name)
-            if block is not None:
-                self._saved_pulse_blocks[block_name] = block
-
+        self._saved_pulse_blocks = LazyAssetDict(self._asset_store.names('block'),
+                                                 loader=self._load_block_from_store)
         self.sigBlockDictUpdated.emit(self._saved_pulse_blocks)
         return
 
-    def _save_block_to_file(self, block):
+    def _save_block_to_store(self, block):
         """
-        Saves a single PulseBlock instance to file by serialization using pickle.
+        Saves a single PulseBlock instance to the asset store by serialization using pickle.
 
         @param PulseBlock block: The PulseBlock instance to be saved
         """
-        filename = '{0}.block'.format(block.name)
         try:
-            with open(os.path.join(self._assets_storage_dir, filename), 'wb') as file:
-                pickle.dump(block, file)
+            self._asset_store.save('block', block.name, block)
         except:
             self.log.error('Failed to serialize PulseBlock "{0}" to file.'.format(block.name))
         return
 
-    def _save_blocks_to_file(self):
+    def _save_blocks_to_store(self):
         """
-        Saves the saved_pulse_blocks dict items to files.
+        Saves the saved_pulse_blocks dict items to the asset store in a single transaction.
         """
-        for block in self._saved_pulse_blocks.values():
-            self._save_block_to_file(block)
+        with self._asset_store.batch():
+            for block in self._saved_pulse_blocks.values():
+                self._save_block_to_store(block)
         return
 
     def save_ensemble(self, ensemble):
@@ -809,7 +821,7 @@ class SequenceGeneratorLogic(GenericLogic):
         @param PulseBlockEnsemble ensemble: PulseBlockEnsemble instance to save
         """
         self._saved_pulse_block_ensembles[ensemble.name] = ensemble
-        self._save_ensemble_to_file(ensemble)
+        self._save_ensemble_to_store(ensemble)
         self.sigEnsembleDictUpdated.emit(self.saved_pulse_block_ensembles)
         return
 
@@ -832,87 +844,73 @@ class SequenceGeneratorLogic(GenericLogic):
         # Delete from dict
         if name in self.saved_pulse_block_ensembles:
             # check if ensemble has already been sampled and delete associated waveforms
-            if self.saved_pulse_block_ensembles[name].sampling_information:
-                self._delete_waveform(
-                    self.saved_pulse_block_ensembles[name].sampling_information['waveforms'])
+            ensemble = self.saved_pulse_block_ensembles.get(name)
+            if ensemble is not None and ensemble.sampling_information:
+                self._delete_waveform(ensemble.sampling_information['waveforms'])
                 self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
             # delete PulseBlockEnsemble
-            del self._saved_pulse_block_ensembles[name]
+            self._saved_pulse_block_ensembles.pop(name, None)
 
         # Delete from disk
-        filepath = os.path.join(self._assets_storage_dir, '{0}.ensemble'.format(name))
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        self._asset_store.delete('ensemble', name)
 
         self.sigEnsembleDictUpdated.emit(self.saved_pulse_block_ensembles)
         return
 
-    def _load_ensemble_from_file(self, ensemble_name):
+    def _load_ensemble_from_store(self, ensemble_name):
         """
-        De-serializes a PulseBlockEnsemble instance from file.
+        De-serializes a PulseBlockEnsemble instance from the asset store.
+        Sampling information referring to waveforms that were not present on the pulse generator
+        during activation is discarded.
 
         @param str ensemble_name: The name of the PulseBlockEnsemble instance to de-serialize
         @return PulseBlockEnsemble: The de-serialized PulseBlockEnsemble instance
         """
         ensemble = None
-        filepath = os.path.join(self._assets_storage_dir, '{0}.ensemble'.format(ensemble_name))
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'rb') as file:
-                    ensemble = pickle.load(file)
-            except pickle.UnpicklingError:
-                self.log.error('Failed to de-serialize PulseBlockEnsemble "{0}" from file. '
-                               'Deleting broken file.'.format(ensemble_name))
-                os.remove(filepath)
+        try:
+            ensemble = self._asset_store.load('ensemble', ensemble_name)
+        except pickle.UnpicklingError:
+            self.log.error('Failed to de-serialize PulseBlockEnsemble "{0}" from file. '
+                           'Deleting broken file.'.format(ensemble_name))
+            self._asset_store.delete('ensemble', ensemble_name)
+        if ensemble is not None and ensemble.sampling_information.get('waveforms'):
+            waveform_set = set(ensemble.sampling_information['waveforms'])
+            if not self._pulser_waveforms.issuperset(waveform_set):
+                ensemble.sampling_information = dict()
         return ensemble
 
-    def _update_ensembles_from_file(self):
+    def _update_ensembles_from_store(self):
         """
-        Update the saved_pulse_block_ensembles dict from temporary file.
+        Update the saved_pulse_block_ensembles dict with the names of the stored
+        PulseBlockEnsembles. The ensembles are de-serialized on first access.
         """
-        # Get all files in asset directory ending on ".ensemble" and extract a sorted list of
-        # PulseBlockEnsemble names
-        with os.scandir(self._assets_storage_dir) as scan:
-            names = natural_sort(f.name[:-9] for f in scan if f.is_file and f.name.endswith('.ensemble'))
-
-        # Get all waveforms currently stored on pulser hardware in order to delete outdated
-        # sampling_information dicts
-        sampled_waveforms = set(self.sampled_waveforms)
-
-        # Load all ensembles from file
-        for ensemble_name in names:
-            ensemble = self._load_ensemble_from_file(ensemble_name)
-            if ensemble is not None:
-                if ensemble.sampling_information.get('waveforms'):
-                    waveform_set = set(ensemble.sampling_information['waveforms'])
-                    if not sampled_waveforms.issuperset(waveform_set):
-                        ensemble.sampling_information = dict()
-                self._saved_pulse_block_ensembles[ensemble_name] = ensemble
-
+        self._saved_pulse_block_ensembles = LazyAssetDict(
+            self._asset_store.names('ensemble'), loader=self._load_ensemble_from_store)
         self.sigEnsembleDictUpdated.emit(self.saved_pulse_block_ensembles)
         return
 
-    def _save_ensemble_to_file(self, ensemble):
+    def _save_ensemble_to_store(self, ensemble):
         """
-        Saves a single PulseBlockEnsemble instance to file by serialization using pickle.
+        Saves a single PulseBlockEnsemble instance to the asset store by serialization using
+        pickle.
 
         @param PulseBlockEnsemble ensemble: The PulseBlockEnsemble instance to be saved
         """
-        filename = '{0}.ensemble'.format(ensemble.name)
         try:
-            with open(os.path.join(self._assets_storage_dir, filename), 'wb') as file:
-                pickle.dump(ensemble, file)
+            self._asset_store.save('ensemble', ensemble.name, ensemble)
         except:
             self.log.error('Failed to serialize PulseBlockEnsemble "{0}" to file.'
                            ''.format(ensemble.name))
         return
 
-    def _save_ensembles_to_file(self):
+    def _save_ensembles_to_store(self):
         """
-        Saves the saved_pulse_block_ensembles dict items to files.
+        Saves the saved_pulse_block_ensembles dict items to the asset store in a single
+        transaction.
         """
-        for ensemble in self.saved_pulse_block_ensembles.values():
-            self._save_ensemble_to_file(ensemble)
+        with self._asset_store.batch():
+            for ensemble in self.saved_pulse_block_ensembles.values():
+                self._save_ensemble_to_store(ensemble)
         return
 
     def save_sequence(self, sequence):
@@ -924,7 +922,7 @@ class SequenceGeneratorLogic(GenericLogic):
         @return: str: name of the serialized object, if needed.
         """
         self._saved_pulse_sequences[sequence.name] = sequence
-        self._save_sequence_to_file(sequence)
+        self._save_sequence_to_store(sequence)
         self.sigSequenceDictUpdated.emit(self.saved_pulse_sequences)
         return
 
@@ -947,44 +945,43 @@ class SequenceGeneratorLogic(GenericLogic):
         if name in self.saved_pulse_sequences:
             # check if sequence has already been sampled and delete associated sequence from pulser.
             # Also delete associated waveforms if sequence has been sampled within rotating frame.
-            if self.saved_pulse_sequences[name].sampling_information:
+            sequence = self.saved_pulse_sequences.get(name)
+            if sequence is not None and sequence.sampling_information:
                 self._delete_sequence(name)
-                if self.saved_pulse_sequences[name].rotating_frame:
-                    self._delete_waveform(
-                        self.saved_pulse_sequences[name].sampling_information['waveforms'])
+                if sequence.rotating_frame:
+                    self._delete_waveform(sequence.sampling_information['waveforms'])
                     self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
             # delete PulseSequence
-            del self._saved_pulse_sequences[name]
+            self._saved_pulse_sequences.pop(name, None)
 
         # Delete from disk
-        filepath = os.path.join(self._assets_storage_dir, '{0}.sequence'.format(name))
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        self._asset_store.delete('sequence', name)
 
         self.sigSequenceDictUpdated.emit(self.saved_pulse_sequences)
         return
 
-    def _load_sequence_from_file(self, sequence_name):
+    def _load_sequence_from_store(self, sequence_name):
         """
-        De-serializes a PulseSequence instance from file.
+        De-serializes a PulseSequence instance from the asset store.
+        Sampling information referring to sequences or waveforms that were not present on the
+        pulse generator during activation is discarded.
 
         @param str sequence_name: The name of the PulseSequence instance to de-serialize
         @return PulseSequence: The de-serialized PulseSequence instance
         """
-        filepath = os.path.join(self._assets_storage_dir, '{0}.sequence'.format(sequence_name))
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'rb') as file:
-                    sequence = pickle.load(file)
-                # FIXME: Due to the pickling the dict namespace merging gets lost on the way.
-                # Restored it here but a better way needs to be found.
-                for step in range(len(sequence)):
-                    sequence[step].__dict__ = sequence[step]
-            except pickle.UnpicklingError:
-                self.log.error('Failed to de-serialize PulseSequence "{0}" from file.'
-                               ''.format(sequence_name))
-                os.remove(filepath)
-                return None
+        try:
+            sequence = self._asset_store.load('sequence', sequence_name)
+        except pickle.UnpicklingError:
+            self.log.error('Failed to de-serialize PulseSequence "{0}" from file.'
+                           ''.format(sequence_name))
+            self._asset_store.delete('sequence', sequence_name)
+            return None
+        if sequence is None:
+            return None
+        # FIXME: Due to the pickling the dict namespace merging gets lost on the way.
+        # Restored it here but a better way needs to be found.
+        for step in range(len(sequence)):
+            sequence[step].__dict__ = sequence[step]
 
         # Conversion for backwards compatibility
         if len(sequence) > 0 and not isinstance(sequence[0].flag_high, list):
@@ -1007,7 +1004,7 @@ class SequenceGeneratorLogic(GenericLogic):
                     self.log.error('Failed to de-serialize PulseSequence "{0}" from file.'
                                    '"flag_high" step parameter is of unknown type'
                                    ''.format(sequence_name))
-                    os.remove(filepath)
+                    self._asset_store.delete('sequence', sequence_name)
                     return None
 
                 # Try to convert "flag_trigger" step parameter
@@ -1023,60 +1020,47 @@ class SequenceGeneratorLogic(GenericLogic):
                     self.log.error('Failed to de-serialize PulseSequence "{0}" from file.'
                                    '"flag_trigger" step parameter is of unknown type'
                                    ''.format(sequence_name))
-                    os.remove(filepath)
+                    self._asset_store.delete('sequence', sequence_name)
                     return None
-            self._save_sequence_to_file(sequence)
+            self._save_sequence_to_store(sequence)
+
+        if sequence.name not in self._pulser_sequences:
+            sequence.sampling_information = dict()
+        elif sequence.sampling_information:
+            waveform_set = set(sequence.sampling_information['waveforms'])
+            if not self._pulser_waveforms.issuperset(waveform_set):
+                sequence.sampling_information = dict()
         return sequence
 
-    def _update_sequences_from_file(self):
+    def _update_sequences_from_store(self):
         """
-        Update the saved_pulse_sequences dict from files.
+        Update the saved_pulse_sequences dict with the names of the stored PulseSequences. The
+        sequences are de-serialized on first access.
         """
-        # Get all files in asset directory ending on ".sequence" and extract a sorted list of
-        # PulseSequence names
-        with os.scandir(self._assets_storage_dir) as scan:
-            names = natural_sort(f.name[:-9] for f in scan if f.is_file and f.name.endswith('.sequence'))
-
-        # Get all waveforms and sequences currently stored on pulser hardware in order to delete
-        # outdated sampling_information dicts
-        sampled_waveforms = set(self.sampled_waveforms)
-        sampled_sequences = set(self.sampled_sequences)
-
-        # Load all sequences from file
-        for sequence_name in names:
-            sequence = self._load_sequence_from_file(sequence_name)
-            if sequence is not None:
-                if sequence.name not in sampled_sequences:
-                    sequence.sampling_information = dict()
-                elif sequence.sampling_information:
-                    waveform_set = set(sequence.sampling_information['waveforms'])
-                    if not sampled_waveforms.issuperset(waveform_set):
-                        sequence.sampling_information = dict()
-                self._saved_pulse_sequences[sequence_name] = sequence
-
+        self._saved_pulse_sequences = LazyAssetDict(self._asset_store.names('sequence'),
+                                                    loader=self._load_sequence_from_store)
         self.sigSequenceDictUpdated.emit(self.saved_pulse_sequences)
         return
 
-    def _save_sequence_to_file(self, sequence):
+    def _save_sequence_to_store(self, sequence):
         """
-        Saves a single PulseSequence instance to file by serialization using pickle.
+        Saves a single PulseSequence instance to the asset store by serialization using pickle.
 
         @param PulseSequence sequence: The PulseSequence instance to be saved
         """
-        filename = '{0}.sequence'.format(sequence.name)
         try:
-            with open(os.path.join(self._assets_storage_dir, filename), 'wb') as file:
-                pickle.dump(sequence, file)
+            self._asset_store.save('sequence', sequence.name, sequence)
         except:
             self.log.error('Failed to serialize PulseSequence "{0}" to file.'.format(sequence.name))
         return
 
-    def _save_sequences_to_file(self):
+    def _save_sequences_to_store(self):
         """
-        Saves the saved_pulse_sequences dict items to files.
+        Saves the saved_pulse_sequences dict items to the asset store in a single transaction.
         """
-        for sequence in self.saved_pulse_sequences.values():
-            self._save_sequence_to_file(sequence)
+        with self._asset_store.batch():
+            for sequence in self.saved_pulse_sequences.values():
+                self._save_sequence_to_store(sequence)
         return
 
     def generate_predefined_sequence(self, predefined_sequence_name, kwargs_dict):
@@ -1110,23 +1094,25 @@ class SequenceGeneratorLogic(GenericLogic):
             self.sigPredefinedSequenceGenerated.emit(None, False)
             return
 
-        # Save objects
-        for block in blocks:
-            self.save_block(block)
-        for ensemble in ensembles:
-            ensemble.sampling_information = dict()
-            self.save_ensemble(ensemble)
-
-        if self.pulse_generator_constraints.sequence_option == SequenceOption.FORCED and len(sequences) < 1:
-            self.log.info('Adding default sequence for: {0:s}'.format(predefined_sequence_name))
-            self._add_default_sequence(ensembles, sequences)
-            if len(sequences) > 0:
-                self.log.debug('New default PulseSequence is: {0:s} length {1:d}'
-                               ''.format(sequences[0].name, len(sequences)))
-
-        for sequence in sequences:
-            sequence.sampling_information = dict()
-            self.save_sequence(sequence)
+        # Save objects. The asset database is written in a single transaction.
+        with self._asset_store.batch():
+            for block in blocks:
+                self.save_block(block)
+            for ensemble in ensembles:
+                ensemble.sampling_information = dict()
+                self.save_ensemble(ensemble)
+
+            if (self.pulse_generator_constraints.sequence_option == SequenceOption.FORCED
+                    and len(sequences) < 1):
+                self.log.info('Adding default sequence for: {0:s}'.format(predefined_sequence_name))
+                self._add_default_sequence(ensembles, sequences)
+                if len(sequences) > 0:
+                    self.log.debug('New default PulseSequence is: {0:s} length {1:d}'
+                                   ''.format(sequences[0].name, len(sequences)))
+
+            for sequence in sequences:
+                sequence.sampling_information = dict()
+                self.save_sequence(sequence)
 
         created_name = gen_params.get('name') if 'name' not in kwargs_dict else kwargs_dict['name']
         self.sigPredefinedSequenceGenerated.emit(created_name, len(sequences) > 0)
@@ -28,11 +28,68 @@ import time
 
 from collections import OrderedDict
 from core.connector import Connector
+from core.configoption import ConfigOption
 from core.util.network import netobtain
 from logic.generic_logic import GenericLogic
 from qtpy import QtCore
 
 
+class SingleShotBinnings:
+    """ Lazily computed re-binnings of single shot data.
+
+    All binnings are calculated from a single cumulative sum over the rows of the data, so each
+    binning costs O(n_rows / bin_width) and is only computed when it is requested. Binning
+    number i (starting at 0) sums up i + 1 consecutive rows, an incomplete group of rows at the
+    end of the data is dropped.
+    """
+
+    def __init__(self, data, n_binnings):
+        """
+        @param numpy.ndarray data: 2D array (n_rows x n_columns), e.g. the summed laser pulses
+        @param int n_binnings: number of binnings, i.e. the largest bin width in rows
+        """
+        data = np.asarray(data)
+        self.n_rows = data.shape[0]
+        self.n_binnings = max(0, min(int(n_binnings), self.n_rows))
+        self._cumsum = np.zeros((self.n_rows + 1,) + data.shape[1:],
+                                dtype=np.result_type(data.dtype, np.int64))
+        np.cumsum(data, axis=0, out=self._cumsum[1:])
+
+    def __len__(self):
+        return self.n_binnings
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.n_binnings
+        if not 0 <= index < self.n_binnings:
+            raise IndexError('Binning index {0} out of range.'.format(index))
+        return self.binning(index + 1)
+
+    def __iter__(self):
+        for width in range(1, self.n_binnings + 1):
+            yield self.binning(width)
+
+    def binning(self, width):
+        """ Sum up groups of consecutive rows.
+
+        @param int width: number of rows summed up into one bin
+
+        @return numpy.ndarray: array of shape (n_rows // width, n_columns)
+        """
+        edges = self._cumsum[0:(self.n_rows // width) * width + 1:width]
+        return np.diff(edges, axis=0)
+
+    def normalized_binning(self, width):
+        """ Normalized signal (col0 - col1) / (col0 + col1) of a binning with 2 columns.
+
+        @param int width: number of rows summed up into one bin
+
+        @return numpy.ndarray: 1D array of length n_rows // width
+        """
+        binning = self.binning(width)
+        return (binning[:, 0] - binning[:, 1]) / (binning[:, 0] + binning[:, 1])
+
+
 class SingleShotLogic(GenericLogic):
     """ This class brings raw data coming from fastcounter measurements (gated or ungated)
         into trace form processable by the trace_analysis_logic.
@@ -51,10 +108,19 @@ class SingleShotLogic(GenericLogic):
     pulsedmasterlogic = Connector(interface='PulsedMasterLogic')
     odmrlogic = Connector(interface='ODMRLogic')
 
+    # streaming readout settings
+    _stream_interval = ConfigOption('stream_interval', 1.0)  # in s
+    _stream_threshold_interval = ConfigOption('stream_threshold_interval', 10.0)  # in s
+    _stream_histogram_bins = ConfigOption('stream_histogram_bins', 100)
+    _stream_min_rows = ConfigOption('stream_min_rows', 10)
+
     # add possible signals here
     sigHistogramUpdated = QtCore.Signal()
     sigMeasurementFinished = QtCore.Signal()
     sigTraceUpdated = QtCore.Signal()
+    sigStreamUpdated = QtCore.Signal(dict)
+    _sigStartStream = QtCore.Signal(float, int)
+    _sigStopStream = QtCore.Signal()
 
     def __init__(self, config, **kwargs):
         """ Create CounterLogic object with connectors.
@@ -76,6 +142,9 @@ class SingleShotLogic(GenericLogic):
 
         self.data_dict = None
 
+        self._stream_timer = None
+        self._reset_stream()
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
         """
@@ -96,6 +165,12 @@ class SingleShotLogic(GenericLogic):
         self.trace = None
         self.sigMeasurementFinished.connect(self.ssr_measurement_analysis)
 
+        self._stream_timer = QtCore.QTimer()
+        self._stream_timer.setSingleShot(False)
+        self._stream_timer.timeout.connect(self._stream_step)
+        # Connect internal start/stop signals to decouple QTimer from other threads
+        self._sigStartStream.connect(self._start_stream, QtCore.Qt.QueuedConnection)
+        self._sigStopStream.connect(self._stop_stream, QtCore.Qt.QueuedConnection)
 
     def on_deactivate(self):
         """ Deinitialisation performed during deactivation of the module.
@@ -103,8 +178,202 @@ class SingleShotLogic(GenericLogic):
         @param object e: Event class object from Fysom. A more detailed
                          explanation can be found in method activation.
         """
+        self._stop_stream()
+        self._sigStartStream.disconnect()
+        self._sigStopStream.disconnect()
+        self._stream_timer.timeout.disconnect()
+        self._stream_timer = None
         return
 
+    # =========================================================================
+    #                           Streaming readout
+    # =========================================================================
+
+    def start_streaming(self, smoothing=10.0, n_laserpulses=2):
+        """
+        Start to periodically pull the completed rows of a running single shot measurement.
+        The laser sums, the histogram of the normalized signal and the flip probability are
+        updated incrementally, the threshold is refitted at most every stream_threshold_interval
+        seconds. Each update is published via sigStreamUpdated.
+        The fastcounter has to be started separately, e.g. by do_singleshot.
+
+        @param float smoothing: smoothing used to detect the laser pulses
+        @param int n_laserpulses: number of laser pulses per row, has to be 2 for normalization
+        """
+        self._sigStartStream.emit(smoothing, n_laserpulses)
+
+    def stop_streaming(self):
+        """ Stop the streaming readout. The accumulated results are kept. """
+        self._sigStopStream.emit()
+
+    def get_stream_results(self):
+        """
+        @return dict: current results of the streaming readout
+        """
+        n_done = self._stream_rows_done
+        if n_done > 1:
+            flip_prob = 1.0 - self._stream_no_flips / n_done
+        else:
+            flip_prob = np.nan
+        return {'rows_done': n_done,
+                'n_rows': self._stream_n_rows,
+                'laser_sums': self._stream_laser_sums[:n_done],
+                'histogram': [self._stream_hist_edges, self._stream_hist_counts],
+                'threshold': self._stream_threshold,
+                'fidelity': self._stream_fidelity,
+                'flip_probability': flip_prob,
+                'finished': self._stream_finished}
+
+    def _reset_stream(self, n_rows=0):
+        """ Clear all accumulated streaming data. """
+        self._stream_n_rows = n_rows
+        self._stream_rows_done = 0
+        self._stream_laser_windows = None
+        self._stream_laser_sums = np.zeros((n_rows, 2), dtype=np.int64)
+        self._stream_normalized = np.zeros(n_rows, dtype=float)
+        # the normalized signal is bounded, so the histogram can use fixed bins
+        self._stream_hist_edges = np.linspace(-1, 1, self._stream_histogram_bins + 1)
+        self._stream_hist_counts = np.zeros(self._stream_histogram_bins, dtype=np.int64)
+        self._stream_threshold = None
+        self._stream_fidelity = np.nan
+        self._stream_no_flips = 0
+        self._stream_last_threshold_fit = 0
+        self._stream_finished = False
+        self._stream_counter_started = False
+        # last row known to contain counts and its advance during the last step
+        self._stream_fill_row = -1
+        self._stream_fill_step = 0
+
+    def _start_stream(self, smoothing, n_laserpulses):
+        if self._stream_timer.isActive():
+            self.log.warning('Streaming readout is already running.')
+            return
+        if n_laserpulses != 2:
+            self.log.error('Streaming readout needs 2 laser pulses per row for the normalized '
+                           'signal, got {0}.'.format(n_laserpulses))
+            return
+        if self._fast_counter_device.is_gated():
+            self.log.error('Streaming readout is only implemented for ungated counters.')
+            return
+
+        settings = netobtain(self._fast_counter_device.get_settings())
+        self._reset_stream(n_rows=int(settings.cycles))
+        self._stream_smoothing = smoothing
+        self._stream_timer.start(int(1000 * self._stream_interval))
+
+    def _stop_stream(self):
+        if self._stream_timer is not None and self._stream_timer.isActive():
+            self._stream_timer.stop()
+
+    def _stream_step(self):
+        """ Process the rows completed since the last call. """
+        # query the status before the data, so the data of a finished measurement is complete
+        status = self._fast_counter_device.get_status()
+        if status == 2:
+            self._stream_counter_started = True
+        elif not self._stream_counter_started:
+            # the fastcounter has not been started yet, its status does not mean finished
+            return
+
+        raw_data = netobtain(self._fast_counter_device.get_data_trace())
+        if isinstance(raw_data, tuple):
+            raw_data = raw_data[0]
+        raw_data = np.asarray(raw_data).reshape(self._stream_n_rows, -1)
+
+        if status == 2:
+            # the row currently being filled is the last one containing counts
+            n_complete = self._find_stream_fill_row(raw_data)
+        else:
+            n_complete = self._stream_n_rows
+            self._stop_stream()
+            self._stream_finished = True
+
+        if self._stream_laser_windows is None:
+            if n_complete < min(self._stream_min_rows, self._stream_n_rows):
+                return
+            windows = self._find_laser_windows(raw_data[:n_complete].sum(axis=0),
+                                               self._stream_smoothing, 2)
+            if len(windows) != 2:
+                self.log.error('Could not find 2 laser pulses for streaming readout.')
+                self._stop_stream()
+                return
+            self._stream_laser_windows = windows
+
+        if n_complete > self._stream_rows_done:
+            self._add_stream_rows(raw_data[self._stream_rows_done:n_complete])
+
+        if self._stream_rows_done > 1 and (
+                self._stream_finished or time.time() - self._stream_last_threshold_fit
+                >= self._stream_threshold_interval):
+            self._update_stream_threshold()
+
+        self.sigStreamUpdated.emit(self.get_stream_results())
+
+    def _find_stream_fill_row(self, raw_data):
+        """ Index of the row currently being filled by the running fastcounter.
+
+        Only the rows after the last known filled row are scanned, in blocks growing with the
+        number of rows filled since the last call, until a block without any counts is found.
+
+        @param numpy.ndarray raw_data: 2D array of all raw data rows
+
+        @return int: index of the last row containing counts
+        """
+        fill_row = self._stream_fill_row
+        block = max(2 * self._stream_fill_step, self._stream_min_rows, 1)
+        start = fill_row + 1
+        while start < self._stream_n_rows:
+            filled = np.flatnonzero(raw_data[start:start + block].any(axis=1))
+            if filled.size == 0:
+                break
+            fill_row = start + filled[-1]
+            start += block
+            block *= 2
+        self._stream_fill_step = fill_row - self._stream_fill_row
+        self._stream_fill_row = fill_row
+        return max(fill_row, self._stream_rows_done)
+
+    def _add_stream_rows(self, rows):
+        """ Add newly completed rows to the laser sums, the histogram and the flip statistics.
+
+        @param numpy.ndarray rows: 2D array of raw data rows
+        """
+        start = self._stream_rows_done
+        stop = start + rows.shape[0]
+        sums = self._stream_laser_sums[start:stop]
+        for index, (laser_start, laser_stop) in enumerate(self._stream_laser_windows):
+            sums[:, index] = rows[:, laser_start:laser_stop].sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normalized = (sums[:, 0] - sums[:, 1]) / (sums[:, 0] + sums[:, 1])
+        self._stream_normalized[start:stop] = normalized
+        self._stream_hist_counts += np.histogram(normalized, self._stream_hist_edges)[0]
+        if self._stream_threshold is not None:
+            # include the pair between the last old and the first new row
+            self._stream_no_flips += self._count_no_flips(
+                self._stream_normalized[max(start - 1, 0):stop], self._stream_threshold)
+        self._stream_rows_done = stop
+
+    def _update_stream_threshold(self):
+        """ Refit the threshold from the online histogram and recount the flips. """
+        self._stream_last_threshold_fit = time.time()
+        threshold, fidelity, param_dict = self._traceanalysis_logic.calculate_threshold(
+            hist_data=[self._stream_hist_edges, self._stream_hist_counts],
+            distr='gaussian_normalized')
+        self._stream_fidelity = fidelity
+        if threshold != self._stream_threshold:
+            self._stream_threshold = threshold
+            self._stream_no_flips = self._count_no_flips(
+                self._stream_normalized[:self._stream_rows_done], threshold)
+
+    @staticmethod
+    def _count_no_flips(trace, threshold):
+        """ Number of consecutive data point pairs staying on the same side of the threshold.
+        (see TraceAnalysisLogic.analyze_flip_prob2)
+        """
+        high = trace > threshold
+        low = trace < threshold
+        return int(np.count_nonzero(high[:-1] & high[1:]) + np.count_nonzero(low[:-1] & low[1:]))
+
     # =========================================================================
     #                           Raw Data Analysis
     # =========================================================================
@@ -168,7 +437,16 @@ class SingleShotLogic(GenericLogic):
                            'of singleshot_logic')
 
         summed_pulses = np.sum(data, axis)
+        return self._find_laser_windows(summed_pulses, smoothing, n_laserpulses)
 
+    def _find_laser_windows(self, summed_pulses, smoothing, n_laserpulses):
+        """
+        returns the start and stop indices of the laserpulses in a trace summed over all rows
+        @param numpy.ndarray summed_pulses: 1D trace of all rows added up
+        @param float smoothing: smoothing data to improve flank detection
+        @param int n_laserpulses: the number of laserpulses expected in the data
+        @return: list containing tupels of start and stop values of individual laser pulses
+        """
         # TODO make the type of pulsed extraction adjustable
         self._pe_logic.number_of_lasers = n_laserpulses
         self._pe_logic.extraction_settings['conv_std_dev'] = smoothing
@@ -191,17 +469,18 @@ class SingleShotLogic(GenericLogic):
         @param float smoothing: If pulse detection doesn't work, change this value
         @return numpy array: dimensionality is n_rows x n_laserpulses
         """
-        sum_single_pulses = []
         start_stop_tupel_list = self.find_laser(smoothing=smoothing, n_laserpulses=n_laserpulses)
         if self.data_dict:
             data = self.data_dict['raw_data']
-            for row in data:
-                laser_pulses = [np.sum(row[jj[0]:jj[1]]) for jj in start_stop_tupel_list]
-                sum_single_pulses.append(laser_pulses)
+            # sum up each laser window for all rows at once
+            sum_single_pulses = np.stack(
+                [np.sum(data[:, start:stop], axis=1) for start, stop in start_stop_tupel_list],
+                axis=1)
         else:
             self.log.error('Pull data from fastcounting device using get_data function before trying to sum_laserpulse.')
+            sum_single_pulses = np.array([])
 
-        return np.array(sum_single_pulses)
+        return sum_single_pulses
 
 
     def get_normalized_signal(self, smoothing=10.0):
@@ -214,14 +493,34 @@ class SingleShotLogic(GenericLogic):
         @return numpy array: 1D array containing the normalized signal
         """
 
-        sum_single_pulses = self.sum_laserpulse()
+        sum_single_pulses = self.sum_laserpulse(smoothing=smoothing)
         if sum_single_pulses.shape[1] == 2:
-            normalized_signal = np.array([(ii[0] - ii[1])/(ii[0] + ii[1]) for ii in sum_single_pulses])
+            normalized_signal = (sum_single_pulses[:, 0] - sum_single_pulses[:, 1]) / \
+                                (sum_single_pulses[:, 0] + sum_single_pulses[:, 1])
         else:
             self.log.warning('could not perform normalisation. Wrong number of laserpulses.')
 
         return normalized_signal
 
+    def get_binnings(self, num_bins=100):
+        """
+        Get the lazily evaluated binnings of the summed laser pulses.
+        @param int num_bins: minimal number of bins a binning can have
+        @return SingleShotBinnings: binnings object. Index 0 is the initial binning given by the
+                                    measurement, each following binning adds up one more row.
+        """
+        if not self.data_dict:
+            self.log.error('Pull data from fastcounting device using get_data function '
+                           'before trying to get_binnings.')
+            return SingleShotBinnings(np.zeros((0, 2)), 0)
+
+        # this is just a guess value, at some point it doesn't make
+        # sense anymore to further decrease the number of bins
+        max_bin = self.data_dict['n_rows'] // num_bins
+        signal = self.sum_laserpulse()
+        # the largest binning (max_bin rows per bin) has never been part of the bin list
+        return SingleShotBinnings(signal[:, 0:2], max_bin - 1)
+
     def calc_all_binnings(self, num_bins=100):
         """
         calculate reasonable binnings of the signal
@@ -230,40 +529,12 @@ class SingleShotLogic(GenericLogic):
                                Data is structured as follows: bin_list[0] is the
                                initial binning given by the measurement and then going up.
         """
-
-        if self.data_dict:
-            data = self.data_dict
-        else:
-            self.log.error('Pull data from fastcounting device using get_data function '
-                           'before trying to calc_all_binnings.')
-
-        NN = data['n_rows']
-        # this is just a guess value, at some point it doesn't make
-        # sense anymore to further decrease the number of bins
-        max_bin = NN // num_bins
-        count_var = 1
-        bin_list = []
-        temp_list = []
-        signal = self.sum_laserpulse()
-        while count_var <= max_bin:
-            # check if the the first run through loop was done
-            if temp_list:
-                app_arr = np.array(temp_list)
-                bin_list.append(app_arr)
-                temp_list = []
-            jj = 0
-            while jj < NN:
-                sum_ind = np.linspace(jj, jj + count_var - 1, count_var, dtype=np.int)
-                # make sure we don't try to adress not reserved memory
-                jj += count_var
-                if sum_ind[-1] < NN:
-                    # normalize
-                    temp_list.append(np.array([np.sum(signal[sum_ind, 0]), np.sum(signal[sum_ind, 1])]))
-                else:
-                    jj = NN
-            count_var += 1
-
-        return np.array(bin_list)
+        binnings = self.get_binnings(num_bins=num_bins)
+        # the binnings have different lengths, so they are stored in an object array
+        bin_list = np.empty(len(binnings), dtype=object)
+        for index, binning in enumerate(binnings):
+            bin_list[index] = binning
+        return bin_list
 
     def calc_all_binnings_normalized(self, num_bins=100):
         """
@@ -273,15 +544,11 @@ class SingleShotLogic(GenericLogic):
         @return list normalized_bin_list: The entries are numpy arrays that represent different binnings
                                           ( 1 to n values)
         """
-
-        bin_list = self.calc_all_binnings(num_bins=num_bins)
-        normalized_bin_list = []
-        for binning in bin_list:
-            normalized_binning = (binning[:, 0] - binning[:, 1])/(binning[:, 0] + binning[:, 1])
-            normalized_bin_list.append(normalized_binning)
-
-        return np.array(normalized_bin_list)
-
+        binnings = self.get_binnings(num_bins=num_bins)
+        normalized_bin_list = np.empty(len(binnings), dtype=object)
+        for index in range(len(binnings)):
+            normalized_bin_list[index] = binnings.normalized_binning(index + 1)
+        return normalized_bin_list
 
     def get_timetrace(self):
         """
@@ -294,7 +561,7 @@ class SingleShotLogic(GenericLogic):
         # what needs to be done here now is the basic evaluation steps like fit, threshold
         # readout fidelity
 
-        bin_list = self.calc_all_binnings(self, num_bins=100)
+        bin_list = self.calc_all_binnings(num_bins=100)
 
         param_dict_list = []
         fidelity_list = []
@@ -31,6 +31,45 @@ from core.util.network import netobtain
 from logic.generic_logic import GenericLogic
 
 
+class DifferentialSpectrumWorker(QtCore.QObject):
+
+    """ Helper class for recording the spectra of a differential measurement in a separate thread.
+
+    The worker alternately toggles the modulation and records a spectrum. Each spectrum is handed
+    to the spectrum logic via a queued signal and the next spectrum is recorded right away, so the
+    spectrometer keeps acquiring while the logic accumulates the previous spectrum.
+    """
+
+    sigSpectrumRecorded = QtCore.Signal(bool, np.ndarray)
+    sigAcquisitionStopped = QtCore.Signal()
+    _sigNextSpectrum = QtCore.Signal(bool)
+
+    def __init__(self, parentclass):
+        super().__init__()
+
+        # remember the reference to the parent class to access the hardware and the stop flag
+        self._parentclass = parentclass
+        self._sigNextSpectrum.connect(self.record_spectrum, QtCore.Qt.QueuedConnection)
+
+    @QtCore.Slot(bool)
+    def record_spectrum(self, modulation_on):
+        """ Record a single spectrum with the given modulation state and queue the next one.
+
+        @param bool modulation_on: state of the modulation during the spectrum
+        """
+        if not self._parentclass._continue_differential:
+            self._parentclass.toggle_modulation(on=False)
+            self.sigAcquisitionStopped.emit()
+            return
+
+        self._parentclass.toggle_modulation(on=modulation_on)
+        # a remote spectrum is transferred in one go, all processing happens locally
+        spectrum = netobtain(self._parentclass._spectrometer_device.recordSpectrum())
+        self.sigSpectrumRecorded.emit(modulation_on, np.asarray(spectrum, dtype=float))
+
+        self._sigNextSpectrum.emit(not modulation_on)
+
+
 class SpectrumLogic(GenericLogic):
 
     """This logic module gathers data from the spectrometer.
@@ -60,7 +99,7 @@ class SpectrumLogic(GenericLogic):
 
     # Internal signals
     sig_specdata_updated = QtCore.Signal()
-    sig_next_diff_loop = QtCore.Signal()
+    _sig_record_diff_spectrum = QtCore.Signal(bool)
 
     # External signals eg for GUI module
     spectrum_fit_updated_Signal = QtCore.Signal(np.ndarray, dict, str)
@@ -88,19 +127,40 @@ class SpectrumLogic(GenericLogic):
         self.diff_spec_data_mod_on = np.array([])
         self.diff_spec_data_mod_off = np.array([])
         self.repetition_count = 0    # count loops for differential spectrum
+        # running mean and sum of squared deviations of the differences (Welford)
+        self._diff_mean = np.array([])
+        self._diff_m2 = np.array([])
+        self._pending_mod_on = None
+        self._continue_differential = False
+        self._diff_acquiring = False
 
         self._spectrometer_device = self.spectrometer()
         self._odmr_logic = self.odmrlogic()
         self._save_logic = self.savelogic()
 
-        self.sig_next_diff_loop.connect(self._loop_differential_spectrum)
+        # create an independent thread for the acquisition of differential spectra
+        self._diff_thread = QtCore.QThread()
+        self._diff_worker = DifferentialSpectrumWorker(self)
+        self._diff_worker.moveToThread(self._diff_thread)
+        self._sig_record_diff_spectrum.connect(self._diff_worker.record_spectrum,
+                                               QtCore.Qt.QueuedConnection)
+        self._diff_worker.sigSpectrumRecorded.connect(self._add_differential_spectrum,
+                                                      QtCore.Qt.QueuedConnection)
+        self._diff_worker.sigAcquisitionStopped.connect(self._differential_acquisition_stopped,
+                                                        QtCore.Qt.QueuedConnection)
+        self._diff_thread.start()
+
         self.sig_specdata_updated.emit()
 
     def on_deactivate(self):
         """ Deinitialisation performed during deactivation of the module.
         """
-        if self.module_state() != 'idle' and self.module_state() != 'deactivated':
-            pass
+        self._continue_differential = False
+        self._sig_record_diff_spectrum.disconnect()
+        self._diff_worker.sigSpectrumRecorded.disconnect()
+        self._diff_worker.sigAcquisitionStopped.disconnect()
+        self._diff_thread.quit()
+        self._diff_thread.wait()
 
     @fc.constructor
     def sv_set_fits(self, val):
@@ -186,65 +246,89 @@ class SpectrumLogic(GenericLogic):
         self._spectrometer_device.saveSpectrum(path, postfix=postfix)
 
     def start_differential_spectrum(self):
-        """Start a differential spectrum acquisition.  An initial spectrum is recorded to initialise the data arrays to the right size.
+        """Start a differential spectrum acquisition.  The data arrays are initialised with the
+        first recorded spectrum.
         """
-
-        self._continue_differential = True
-
-        # Taking a demo spectrum gives us the wavelength values and the length of the spectrum data.
-        demo_data = netobtain(self._spectrometer_device.recordSpectrum())
-
-        wavelengths = demo_data[0, :]
-        empty_signal = np.zeros(len(wavelengths))
-
-        # Using this information to initialise the differential spectrum data arrays.
-        self._spectrum_data = np.array([wavelengths, empty_signal])
-        self.diff_spec_data_mod_on = np.array([wavelengths, empty_signal])
-        self.diff_spec_data_mod_off = np.array([wavelengths, empty_signal])
+        self.diff_spec_data_mod_on = np.array([])
+        self.diff_spec_data_mod_off = np.array([])
+        self._diff_mean = np.array([])
+        self._diff_m2 = np.array([])
         self.repetition_count = 0
 
-        # Starting the measurement loop
-        self._loop_differential_spectrum()
+        self.resume_differential_spectrum()
 
     def resume_differential_spectrum(self):
         """Resume a differential spectrum acquisition.
         """
-
+        self._pending_mod_on = None
         self._continue_differential = True
 
-        # Starting the measurement loop
-        self._loop_differential_spectrum()
+        # Starting the acquisition in the worker thread, unless it is still running
+        if not self._diff_acquiring:
+            self._diff_acquiring = True
+            self._sig_record_diff_spectrum.emit(True)
 
-    def _loop_differential_spectrum(self):
-        """ This loop toggles the modulation and iteratively records a differential spectrum.
-        """
+    def _differential_acquisition_stopped(self):
+        """ Called when the worker thread has finished the differential acquisition. """
+        self._diff_acquiring = False
+        # restart if the acquisition was resumed while the worker was finishing
+        if self._continue_differential:
+            self.resume_differential_spectrum()
 
-        # If the loop should not continue, then return immediately without
-        # emitting any signal to repeat.
-        if not self._continue_differential:
-            return
-
-        # Otherwise, we make a measurement and then emit a signal to repeat this loop.
+    def _add_differential_spectrum(self, modulation_on, these_data):
+        """ Accumulate a spectrum recorded by the differential acquisition worker.
 
-        # Toggle on, take spectrum and add data to the mod_on data
-        self.toggle_modulation(on=True)
-        these_data = netobtain(self._spectrometer_device.recordSpectrum())
-        self.diff_spec_data_mod_on[1, :] += these_data[1, :]
+        @param bool modulation_on: whether the spectrum was recorded with modulation
+        @param numpy.ndarray these_data: the recorded spectrum (wavelength, intensity)
 
-        # Toggle off, take spectrum and add data to the mod_off data
-        self.toggle_modulation(on=False)
-        these_data = netobtain(self._spectrometer_device.recordSpectrum())
+        The differential spectrum is updated as soon as a pair of spectra with modulation on
+        and off is complete.
+        """
+        if modulation_on:
+            self._pending_mod_on = these_data
+            return
+        if self._pending_mod_on is None:
+            return
+        mod_on_data, self._pending_mod_on = self._pending_mod_on, None
+
+        if len(self.diff_spec_data_mod_on) == 0 \
+                or self.diff_spec_data_mod_on.shape[1] != these_data.shape[1]:
+            wavelengths = these_data[0, :]
+            empty_signal = np.zeros(len(wavelengths))
+            self._spectrum_data = np.array([wavelengths, empty_signal])
+            self.diff_spec_data_mod_on = np.array([wavelengths, empty_signal])
+            self.diff_spec_data_mod_off = np.array([wavelengths, empty_signal])
+            self._diff_mean = np.zeros(len(wavelengths))
+            self._diff_m2 = np.zeros(len(wavelengths))
+            self.repetition_count = 0
+
+        self.diff_spec_data_mod_on[1, :] += mod_on_data[1, :]
         self.diff_spec_data_mod_off[1, :] += these_data[1, :]
 
         self.repetition_count += 1    # increment the loop count
 
+        # update the running mean and variance of the single differences
+        difference = mod_on_data[1, :] - these_data[1, :]
+        delta = difference - self._diff_mean
+        self._diff_mean += delta / self.repetition_count
+        self._diff_m2 += delta * (difference - self._diff_mean)
+
         # Calculate the differential spectrum
         self._spectrum_data[1, :] = self.diff_spec_data_mod_on[
             1, :] - self.diff_spec_data_mod_off[1, :]
 
         self.sig_specdata_updated.emit()
 
-        self.sig_next_diff_loop.emit()
+    @property
+    def differential_spectrum_error(self):
+        """ Standard error of the accumulated differential spectrum for each pixel, estimated
+        from the variance of the single differences. Zero as long as less than two
+        repetitions have been recorded.
+        """
+        if self.repetition_count < 2:
+            return np.zeros(len(self._diff_mean))
+        variance = self._diff_m2 / (self.repetition_count - 1)
+        return np.sqrt(self.repetition_count * variance)
 
     def stop_differential_spectrum(self):
         """Stop an ongoing differential spectrum acquisition
@@ -313,6 +397,8 @@ class SpectrumLogic(GenericLogic):
             data['signal_mod_on'] = self.diff_spec_data_mod_on[1, :]
             data['signal_mod_off'] = self.diff_spec_data_mod_off[1, :]
             data['differential'] = spectrum_data[1, :]
+            if len(self._diff_mean) == len(spectrum_data[1, :]):
+                data['differential_error'] = self.differential_spectrum_error
         else:
             data['signal'] = spectrum_data[1, :]
 
@@ -24,6 +24,7 @@ from scipy.interpolate import InterpolatedUnivariateSpline
 from collections import OrderedDict
 
 from core.connector import Connector
+from core.util.math import run_length_encode
 from logic.generic_logic import GenericLogic
 
 
@@ -232,36 +233,27 @@ class TraceAnalysisLogic(GenericLogic):
                       float lifetime_dark: the lifetime in the dark state in s
                       float lifetime_bright: lifetime in the bright state in s
         """
-        no_flip = 0.0
+        # compare every data point with its successor
+        current_high = trace[:-1] > threshold
+        current_low = trace[:-1] < threshold
+        next_high = trace[1:] > threshold
+        next_low = trace[1:] < threshold
 
         if analyze_mode == 'full':
-            for ii in range(len(trace) - 1):
-                if trace[ii] > threshold and trace[ii + 1] > threshold:
-                    no_flip = no_flip + 1
-
-                elif trace[ii] < threshold and trace[ii + 1] < threshold:
-                    no_flip = no_flip + 1
-
+            no_flip = float(np.count_nonzero(current_high & next_high)
+                            + np.count_nonzero(current_low & next_low))
             probability = 1.0 - (no_flip / len(trace))
             lost_events = 0.0
 
         if analyze_mode == 'dark':
-            dark_counter = 0.0
-            for ii in range(len(trace) - 1):
-                if trace[ii] < threshold:
-                    dark_counter = dark_counter + 1
-                    if trace[ii + 1] < threshold:
-                        no_flip = no_flip + 1
+            dark_counter = float(np.count_nonzero(current_low))
+            no_flip = float(np.count_nonzero(current_low & next_low))
             probability = 1.0 - (no_flip / dark_counter)
             lost_events = (1.0 - (dark_counter / len(trace))) * 100
 
         if analyze_mode == 'bright':
-            bright_counter = 0.0
-            for ii in range(len(trace) - 1):
-                if trace[ii] > threshold:
-                    bright_counter = bright_counter + 1
-                    if trace[ii + 1] > threshold:
-                        no_flip = no_flip + 1
+            bright_counter = float(np.count_nonzero(current_high))
+            no_flip = float(np.count_nonzero(current_high & next_high))
             probability = 1.0 - (no_flip / bright_counter)
             lost_events = (1.0 - (bright_counter / len(trace))) * 100
 
@@ -284,35 +276,7 @@ class TraceAnalysisLogic(GenericLogic):
         """
         init_threshold = init_threshold if init_threshold is not None else [1, 1]
         ana_threshold = ana_threshold if ana_threshold is not None else [1, 1]
-        no_flip = 0.0
-        flip = 0.0
-
-        # find all indices in the trace-array, where the value is above init_threshold[1]
-        init_high = np.where(trace[:-1] > init_threshold[1])[0]
-        # find all indices in the trace-array, where the value is below init_threshold[0]
-        init_low = np.where(trace[:-1] < init_threshold[0])[0]
-        # find all indices in the trace-array, where the value is above ana_threshold[1]
-        ana_high = np.where(trace > ana_threshold[1])[0]
-        # find all indices in the trace-array, where the value is below ana_threshold[0]
-        ana_low = np.where(trace < ana_threshold[0])[0]
-
-        if analyze_mode == 'bright' or analyze_mode == 'full':
-            # analyze the trace where the data were the nuclear was initalized into one direction
-            for index in init_high:
-                # check if the following data point is in the analysis array
-                if index + 1 in ana_high:
-                    no_flip = no_flip + 1
-                elif index + 1 in ana_low:
-                    flip = flip + 1
-
-        if analyze_mode == 'dark' or analyze_mode == 'full':
-            # repeat the same if the nucleus was initalized into the other array
-            for index in init_low:
-                # check if the following data point is in the analysis array
-                if index + 1 in ana_high:
-                    flip = flip + 1
-                elif index + 1 in ana_low:
-                    no_flip = no_flip + 1
+        flip, no_flip = self._count_flips(trace, init_threshold, ana_threshold, analyze_mode)
 
         # the flip probability is given by the number of flips divided by the total number of analyzed data points
         if (flip + no_flip) == 0:
@@ -366,33 +330,7 @@ class TraceAnalysisLogic(GenericLogic):
             self.log.warning('Not enough data points yet!')
 
         # calculate the flip probability
-        no_flip = 0.0
-        flip = 0.0
-        # find all indices in the trace-array, where the value is above init_threshold[1]
-        init_high = np.where(trace[:-1] > init_threshold[1])[0]
-        # find all indices in the trace-array, where the value is below init_threshold[0]
-        init_low = np.where(trace[:-1] < init_threshold[0])[0]
-        # find all indices in the trace-array, where the value is above ana_threshold[1]
-        ana_high = np.where(trace > ana_threshold[1])[0]
-        # find all indices in the trace-array, where the value is below ana_threshold[0]
-        ana_low = np.where(trace < ana_threshold[0])[0]
-
-        if analyze_mode == 'bright' or analyze_mode == 'full':
-            # analyze the trace where the data were the nuclear was initalized into one direction
-            for index in init_high:
-                # check if the following data point is in the analysis array
-                if index + 1 in ana_high:
-                    no_flip = no_flip + 1
-                elif index + 1 in ana_low:
-                    flip = flip + 1
-        if analyze_mode == 'dark' or analyze_mode == 'full':
-            # repeat the same if the nucleus was initalized into the other array
-            for index in init_low:
-                # check if the following data point is in the analysis array
-                if index + 1 in ana_high:
-                    flip = flip + 1
-                elif index + 1 in ana_low:
-                    no_flip = no_flip + 1
+        flip, no_flip = self._count_flips(trace, init_threshold, ana_threshold, analyze_mode)
 
         # the flip probability is given by the number of flips divided by the total number of analyzed data points
         if (flip + no_flip) == 0:
@@ -411,6 +349,40 @@ class TraceAnalysisLogic(GenericLogic):
 
         return self.spin_flip_prob, lost_events, hist_fit_x, hist_fit_y, fit_result
 
+    def _count_flips(self, trace, init_threshold, ana_threshold, analyze_mode='full'):
+        """ Count the flips and non-flips between all pairs of consecutive data points.
+
+        @param np.array trace: 1D trace of data
+        @param list init_threshold: [lower, upper] threshold for the initialization data point
+        @param list ana_threshold: [lower, upper] threshold for the following (analysis) data point
+        @param str analyze_mode: 'bright', 'dark' or 'full'
+
+        @return tuple(flip, no_flip): float number of flips and of non-flips
+
+        A data point above init_threshold[1] (below init_threshold[0]) initializes the bright
+        (dark) state. The following data point counts as no flip if it is in the same state with
+        respect to ana_threshold and as flip if it is in the other state.
+        """
+        # state of each data point (except the last one) used for the initialization
+        init_high = trace[:-1] > init_threshold[1]
+        init_low = trace[:-1] < init_threshold[0]
+        # state of the following data point used for the analysis. A data point above the upper
+        # analysis threshold is always counted as high, even if the thresholds overlap.
+        ana_high = trace[1:] > ana_threshold[1]
+        ana_low = (trace[1:] < ana_threshold[0]) & ~ana_high
+
+        no_flip = 0
+        flip = 0
+        if analyze_mode == 'bright' or analyze_mode == 'full':
+            # analyze the trace where the data were the nuclear was initalized into one direction
+            no_flip += np.count_nonzero(init_high & ana_high)
+            flip += np.count_nonzero(init_high & ana_low)
+        if analyze_mode == 'dark' or analyze_mode == 'full':
+            # repeat the same if the nucleus was initalized into the other array
+            flip += np.count_nonzero(init_low & ana_high)
+            no_flip += np.count_nonzero(init_low & ana_low)
+        return float(flip), float(no_flip)
+
     def analyze_flip_prob_postselect(self):
         """ Post select the data trace so that the flip probability is only
             calculated from a jump from below a threshold value to an value
@@ -506,50 +478,7 @@ class TraceAnalysisLogic(GenericLogic):
                                                                                distr='gaussian_normalized')
                 threshold = threshold_fit
 
-            # helper functions to get and analyze the timetrace
-            def analog_digitial_converter(cut_off, data):
-                new_digital_trace = []
-                for data_point in data:
-                    if data_point >= cut_off:
-                        new_digital_trace.append(1)
-                    else:
-                        new_digital_trace.append(0)
-                return new_digital_trace
-
-            def time_in_high_low(raw_digital_trace, local_dt):
-                """
-                What I need this function to do is to get all consecutive {1, ... , n} 1s or 0s and add
-                them up and put into a list to later make a histogram from them.
-                """
-                occurances = []
-                index = 0
-                index2 = 0
-
-                while index < len(raw_digital_trace):
-                    occurances.append(0)
-                    # start following the consecutive 1s
-                    while raw_digital_trace[index] == 1:
-                        occurances[index2] += 1
-                        if index == (len(raw_digital_trace) - 1):
-                            occurances = np.array(occurances)
-                            return occurances * local_dt
-                        else:
-                            index += 1
-                    if raw_digital_trace[index - 1] == 1:
-                        index2 += 1
-                        occurances.append(0)
-                    # start following the consecutive 0s
-                    while raw_digital_trace[index] == 0:
-                        occurances[index2] -= 1
-                        if index == (len(raw_digital_trace) - 1):
-                            occurances = np.array(occurances)
-                            return occurances * local_dt
-                        else:
-                            index += 1
-                    index2 += 1
-
-            digital_trace = analog_digitial_converter(threshold, trace)
-            time_array = time_in_high_low(digital_trace, dt)
+            time_array = self.calculate_dwell_times(trace, threshold, dt)
 
             # now we need to make a histogram as well as a fit
             # what would be a good estimate for the number of bins
@@ -558,15 +487,13 @@ class TraceAnalysisLogic(GenericLogic):
             # number of steps in between, rather not use that for now
             # est_bins = np.int(longest/dt)
 
-            time_array_high = np.array([ii for ii in filter(lambda x: x > 0, time_array)])
-            time_array_low = np.array([ii for ii in filter(lambda x: x < 0, time_array)])
+            time_array_high = time_array[time_array > 0]
+            time_array_low = time_array[time_array < 0]
 
             # get lifetime of bright state
             time_hist_high = np.histogram(time_array_high, bins=num_bins)
-            vals = [i for i in filter(lambda x: x[1] > 0, enumerate(time_hist_high[0][0:num_bins]))]
-
-            indices = np.array([val[0] for val in vals])
-            indices = np.array([np.int(indice) for indice in indices])
+            # only use the non-empty bins
+            indices = np.flatnonzero(time_hist_high[0][0:num_bins] > 0)
             self.log.debug('threshold {0}'.format(threshold))
             self.log.debug('time_array:{0}'.format(time_array))
             self.log.debug('time_array_high:{0}'.format(time_array_high))
@@ -588,10 +515,8 @@ class TraceAnalysisLogic(GenericLogic):
 
             # get lifetime of dark state
             time_hist_low = np.histogram(time_array_low, bins=num_bins)
-            vals = [i for i in filter(lambda x: x[1] > 0, enumerate(time_hist_low[0][0:num_bins]))]
-            indices = np.array([val[0] for val in vals])
-            indices = np.array([np.int(indice) for indice in indices])
-            values = np.array([val[1] for val in vals])
+            indices = np.flatnonzero(time_hist_low[0][0:num_bins] > 0)
+            values = time_hist_low[0][indices]
             # positive axis
             mirror_axis = -time_hist_low[1][indices]
             result = self._fit_logic.make_decayexponential_fit(mirror_axis,
@@ -1044,6 +969,21 @@ class TraceAnalysisLogic(GenericLogic):
 
             return threshold_fit, fidelity, param_dict
 
+    def calculate_dwell_times(self, trace, threshold, dt=1.0):
+        """ Calculate the dwell times in the high and the low state of a time trace.
+
+        @param np.array trace: 1D array containing the y data, e.g. counts
+        @param float threshold: values greater or equal threshold are in the high (bright) state,
+                                values below threshold are in the low (dark) state.
+        @param float dt: time between two data points of the trace
+
+        @return np.array: 1D array with the duration of each consecutive run of data points in
+                          the same state, in temporal order. Durations in the high state are
+                          positive, durations in the low state are negative.
+        """
+        high_state, run_lengths, run_starts = run_length_encode(np.asarray(trace) >= threshold)
+        return np.where(high_state, run_lengths, -run_lengths) * dt
+
     def calculate_binary_trace(self, trace, threshold):
         """ Calculate for a given threshold all the trace values und output a
             binary array, where
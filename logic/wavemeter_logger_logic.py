@@ -31,6 +31,7 @@ import matplotlib.pyplot as plt
 
 from core.connector import Connector
 from core.configoption import ConfigOption
+from core.util.array_buffer import GrowingArray
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
 
@@ -73,7 +74,7 @@ class HardwarePull(QtCore.QObject):
         # only wavelength >200 nm make sense, ignore the rest
         if self._parentclass.current_wavelength > 200:
             self._parentclass._wavelength_data.append(
-                np.array([time_stamp, self._parentclass.current_wavelength])
+                (time_stamp, self._parentclass.current_wavelength)
             )
 
         # check if we have a new min or max and save it if so
@@ -127,7 +128,9 @@ class WavemeterLoggerLogic(GenericLogic):
         self._data_index = 0
 
         self._recent_wavelength_window = [0, 0]
-        self.counts_with_wavelength = []
+        # rows of (measurement time, counts, interpolated wavelength, counts of further channels),
+        # the width is adapted to the counter rows with the first stitched data
+        self.counts_with_wavelength = GrowingArray(n_columns=3)
 
         self._xmin = 650
         self._xmax = 750
@@ -139,7 +142,8 @@ class WavemeterLoggerLogic(GenericLogic):
     def on_activate(self):
         """ Initialisation performed during activation of the module.
         """
-        self._wavelength_data = []
+        # rows of (time stamp, wavelength)
+        self._wavelength_data = GrowingArray(n_columns=2)
 
         self.stopRequested = False
 
@@ -296,12 +300,12 @@ class WavemeterLoggerLogic(GenericLogic):
 
         if not resume:
             self._acqusition_start_time = self._counter_logic._saving_start_time
-            self._wavelength_data = []
+            self._wavelength_data.clear()
 
-            self.data_index = 0
+            self._data_index = 0
 
             self._recent_wavelength_window = [0, 0]
-            self.counts_with_wavelength = []
+            self.counts_with_wavelength.clear()
 
             self.rawhisto = np.zeros(self._bins)
             self.sumhisto = np.ones(self._bins) * 1.0e-10
@@ -360,7 +364,7 @@ class WavemeterLoggerLogic(GenericLogic):
         wavelength_recentness = np.min([5, len(self._wavelength_data)])
 
         recent_counts = np.array(self._counter_logic._data_to_save[-count_recentness:])
-        recent_wavelengths = np.array(self._wavelength_data[-wavelength_recentness:])
+        recent_wavelengths = self._wavelength_data[-wavelength_recentness:]
 
         # The latest counts are those recorded during the recent_wavelength_window
         count_idx = [0, 0]
@@ -378,8 +382,17 @@ class WavemeterLoggerLogic(GenericLogic):
         # Stitch interpolated wavelength into latest counts array
         latest_stitched_data = np.insert(latest_counts, 2, values=interpolated_wavelengths, axis=1)
 
-        # Add this latest data to the list of counts vs wavelength
-        self.counts_with_wavelength += latest_stitched_data.tolist()
+        # Add this latest data to the array of counts vs wavelength. The rows of the counter
+        # contain the time and all counter channels, so the width depends on the counter.
+        n_columns = latest_stitched_data.shape[1]
+        if self.counts_with_wavelength.data.shape[1] != n_columns:
+            if len(self.counts_with_wavelength) == 0:
+                self.counts_with_wavelength = GrowingArray(n_columns=n_columns)
+            else:
+                self.log.error('The number of counter channels changed during the '
+                               'measurement, the latest counts are not stitched.')
+                latest_stitched_data = latest_stitched_data[:0]
+        self.counts_with_wavelength.extend(latest_stitched_data)
 
         # The start of the recent data window for the next round will be the end of this one.
         self._recent_wavelength_window[0] = self._recent_wavelength_window[1]
@@ -408,61 +421,65 @@ class WavemeterLoggerLogic(GenericLogic):
         # Note: The histogram may be recalculated (bins changed, etc) from the stitched data.
         # There is no need to recompute the interpolation for the stitched data.
         if complete_histogram:
-            count_window = len(self._counter_logic._data_to_save)
             self._data_index = 0
             self.log.info('Recalcutating Laser Scanning Histogram for: '
                           '{0:d} counts and {1:d} wavelength.'.format(
-                              count_window,
+                              len(self._counter_logic._data_to_save),
                               len(self._wavelength_data)
                           )
                           )
+            # The stitched data contains all counts up to the latest wavelength value
+            if len(self.counts_with_wavelength) >= 2:
+                temp = self.counts_with_wavelength.data[:, 0:2]
+            else:
+                temp = np.array(self._counter_logic._data_to_save)
         else:
             count_window = min(100, len(self._counter_logic._data_to_save))
+            temp = np.array(self._counter_logic._data_to_save[-count_window:])
 
-        if count_window < 2:
+        if len(temp) < 2:
             time.sleep(self._logic_update_timing * 1e-3)
             self.sig_update_histogram_next.emit(False)
             return
 
-        temp = np.array(self._counter_logic._data_to_save[-count_window:])
-
         # only do something if there is wavelength data to work with
-        if len(self._wavelength_data) > 0:
-
-            for i in self._wavelength_data[self._data_index:]:
-                self._data_index += 1
-
-                if i[1] < self._xmin or i[1] > self._xmax:
-                    continue
-
-                # calculate the bin the new wavelength needs to go in
-                newbin = np.digitize([i[1]], self.histogram_axis)[0]
-                # if the bin make no sense, start from the beginning
-                if newbin > len(self.rawhisto) - 1:
-                    continue
-
-                # sum the counts in rawhisto and count the occurence of the bin in sumhisto
-                interpolation = np.interp(i[0], xp=temp[:, 0], fp=temp[:, 1])
-                self.rawhisto[newbin] += interpolation
-                self.sumhisto[newbin] += 1.0
-
-                self.envelope_histogram[newbin] = np.max([interpolation,
-                                                          self.envelope_histogram[newbin]
-                                                          ])
-
-                datapoint = [i[1], i[0], interpolation]
-                if time.time() - self.last_point_time > 1:
-                    self.sig_new_data_point.emit(self.recent_avg)
-                    self.last_point_time = time.time()
-                    self.recent_count = 0
-                else:
-                    self.recent_count += 1
-                    for j in range(3):
-                        self.recent_avg[j] -= self.recent_avg[j] / self.recent_count
-                        self.recent_avg[j] += datapoint[j] / self.recent_count
-
-            # the plot data is the summed counts divided by the occurence of the respective bins
-            self.histogram = self.rawhisto / self.sumhisto
+        new_data = self._wavelength_data.data[self._data_index:]
+        self._data_index += len(new_data)
+        if len(new_data) == 0:
+            return
+
+        # drop the wavelengths outside of the histogram range
+        new_data = new_data[(new_data[:, 1] >= self._xmin) & (new_data[:, 1] <= self._xmax)]
+
+        # calculate the bins all new wavelengths need to go in and drop the ones beyond the axis
+        new_bins = np.searchsorted(self.histogram_axis, new_data[:, 1], side='right')
+        in_histogram = new_bins < len(self.rawhisto)
+        new_data = new_data[in_histogram]
+        new_bins = new_bins[in_histogram]
+        if len(new_bins) == 0:
+            return
+
+        # sum the counts in rawhisto and count the occurence of the bins in sumhisto
+        interpolation = np.interp(new_data[:, 0], xp=temp[:, 0], fp=temp[:, 1])
+        self.rawhisto += np.bincount(new_bins, weights=interpolation, minlength=len(self.rawhisto))
+        self.sumhisto += np.bincount(new_bins, minlength=len(self.sumhisto))
+        np.maximum.at(self.envelope_histogram, new_bins, interpolation)
+
+        # running average of the recent data points, published at most once per second
+        datapoints = np.column_stack((new_data[:, 1], new_data[:, 0], interpolation))
+        if time.time() - self.last_point_time > 1:
+            self.sig_new_data_point.emit(self.recent_avg)
+            self.last_point_time = time.time()
+            self.recent_count = 0
+            datapoints = datapoints[1:]
+        if len(datapoints) > 0:
+            count = self.recent_count + len(datapoints)
+            self.recent_avg = ((np.asarray(self.recent_avg) * self.recent_count
+                                + datapoints.sum(axis=0)) / count).tolist()
+            self.recent_count = count
+
+        # the plot data is the summed counts divided by the occurence of the respective bins
+        self.histogram = self.rawhisto / self.sumhisto
 
     def save_data(self, timestamp=None):
         """ Save the counter trace data and writes it to a file.
@@ -512,7 +529,7 @@ class WavemeterLoggerLogic(GenericLogic):
 
         # prepare the data in a dict or in an OrderedDict:
         data = OrderedDict()
-        data['Time (s), Wavelength (nm)'] = self._wavelength_data
+        data['Time (s), Wavelength (nm)'] = self._wavelength_data.data
         # write the parameters:
         parameters = OrderedDict()
         parameters['Acquisition Timing (ms)'] = self._logic_acquisition_timing
@@ -558,7 +575,7 @@ class WavemeterLoggerLogic(GenericLogic):
 
         # prepare the data in a dict or in an OrderedDict:
         data = OrderedDict()
-        data['Measurement Time (s), Signal (counts/s), Interpolated Wavelength (nm)'] = np.array(self.counts_with_wavelength)
+        data['Measurement Time (s), Signal (counts/s), Interpolated Wavelength (nm)'] = self.counts_with_wavelength.data
 
         fig = self.draw_figure()
         # write the parameters:
@@ -587,8 +604,8 @@ class WavemeterLoggerLogic(GenericLogic):
         """
         # TODO: Draw plot for second APD if it is connected
 
-        wavelength_data = [entry[2] for entry in self.counts_with_wavelength]
-        count_data = np.array([entry[1] for entry in self.counts_with_wavelength])
+        wavelength_data = self.counts_with_wavelength.data[:, 2]
+        count_data = self.counts_with_wavelength.data[:, 1]
 
         # Index of max counts, to use to position "0" of frequency-shift axis
         count_max_index = count_data.argmax()
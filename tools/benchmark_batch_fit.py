@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of FitLogic.do_batch_fit with many single Lorentzian dips compared to fitting each
+dataset with an individual make_lorentzian_fit call.
+
+Run from the qudi main directory:
+
+    python tools/benchmark_batch_fit.py [--fits 10000] [--points 100] [--workers 4]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from logic.fit_logic import FitLogic
+
+
+def make_odmr_rows(fits, points, rng):
+    """ Create noisy single Lorentzian ODMR dips with random center frequencies. """
+    x_axis = np.linspace(2.82e9, 2.92e9, points)
+    centers = rng.uniform(2.85e9, 2.89e9, fits)
+    widths = rng.uniform(3e6, 6e6, fits)
+    dips = 0.1 / (1 + ((x_axis - centers[:, np.newaxis]) / widths[:, np.newaxis]) ** 2)
+    data = 1e4 * (1 - dips) + rng.normal(0, 30, (fits, points))
+    return x_axis, data, centers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the FitLogic batch fit.')
+    parser.add_argument('--fits', type=int, default=10000, help='Number of Lorentzian fits')
+    parser.add_argument('--points', type=int, default=100, help='Data points per fit')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                        help='Number of worker processes for the parallel batch fit')
+    args = parser.parse_args()
+
+    fit_logic = FitLogic(manager=None, name='fitlogic')
+    x_axis, data, centers = make_odmr_rows(args.fits, args.points, np.random.RandomState(42))
+
+    start = time.perf_counter()
+    for row in data:
+        fit_logic.make_lorentzian_fit(x_axis=x_axis, data=row,
+                                      estimator=fit_logic.estimate_lorentzian_dip)
+    single = time.perf_counter() - start
+    print('{0:>28}: {1:8.2f} s ({2:.2f} ms per fit)'.format(
+        'individual fits', single, 1e3 * single / args.fits))
+
+    for workers in sorted({1, args.workers}):
+        start = time.perf_counter()
+        results = fit_logic.do_batch_fit('lorentzian', x_axis, data, estimator='dip',
+                                         workers=workers)
+        elapsed = time.perf_counter() - start
+        deviation = np.nanmedian(np.abs(results['center'] - centers))
+        print('{0:>28}: {1:8.2f} s ({2:.2f} ms per fit), {3:d} failed, median center '
+              'deviation {4:.2e} Hz, speedup {5:.1f}x'.format(
+                  'batch fit ({0:d} workers)'.format(workers), elapsed,
+                  1e3 * elapsed / args.fits, int(np.sum(~results['success'])), deviation,
+                  single / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of method calls through a qudi Connector compared to direct calls.
+
+Run from the qudi main directory:
+
+    python tools/benchmark_connector.py [--calls 200000]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from core.connector import Connector
+from core.interface import InterfaceMethod, interface_method
+
+
+class BenchmarkInterface:
+    """ Interface with a plain and an overloaded interface method. """
+
+    def get_data(self):
+        pass
+
+    @interface_method
+    def get_overloaded_data(self):
+        pass
+
+
+class BenchmarkModule(BenchmarkInterface):
+    """ Connected module counting the calls. """
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_data(self):
+        self.calls += 1
+        return self.calls
+
+    @BenchmarkInterface.get_overloaded_data.register('BenchmarkInterface')
+    def get_overloaded_data_benchmark(self):
+        self.calls += 1
+        return self.calls
+
+
+def legacy_proxy(connector):
+    """ Proxy as created by Connector.__call__ up to now: a new class on every call and the
+    interface method resolution on every attribute access. """
+    class ConnectedInterfaceProxy:
+        def __getattribute__(*args):
+            attr = getattr(connector.obj, args[1])
+            if isinstance(attr, InterfaceMethod):
+                return attr[connector.interface]
+            return attr
+    return ConnectedInterfaceProxy()
+
+
+def calls_per_second(function, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of calls through a Connector.')
+    parser.add_argument('--calls', type=int, default=200000, help='Number of calls per case')
+    args = parser.parse_args()
+
+    module = BenchmarkModule()
+    connector = Connector(interface='BenchmarkInterface', name='benchmark')
+    connector.connect(module)
+    proxy = connector()
+
+    cases = (
+        ('direct call', lambda: module.get_data()),
+        ('stored proxy', lambda: proxy.get_data()),
+        ('connector() per call', lambda: connector().get_data()),
+        ('legacy connector() per call', lambda: legacy_proxy(connector).get_data()),
+        ('overloaded, stored proxy', lambda: proxy.get_overloaded_data()),
+        ('overloaded, connector()', lambda: connector().get_overloaded_data()),
+        ('overloaded, legacy', lambda: legacy_proxy(connector).get_overloaded_data()),
+    )
+    for name, function in cases:
+        print('{0:>30}: {1:12,.0f} calls/s'.format(name, calls_per_second(function, args.calls)))
+
+
+if __name__ == '__main__':
+    main()
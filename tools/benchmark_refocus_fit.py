@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark comparing the fast refocus fitter (core.util.fast_gaussian_fit) with the generic lmfit
+based 2D gaussian fit of the FitLogic as used by the OptimizerLogic.
+
+Run from the qudi main directory:
+
+    python tools/benchmark_refocus_fit.py [--size 30] [--repetitions 200]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from core.util.fast_gaussian_fit import fit_twoDgaussian_grid
+from logic.fitmethods import gaussianlikemethods, generalmethods
+
+
+class LmfitPath:
+    """ Minimal stand-in for the FitLogic providing only the 2D gaussian fit methods. """
+    log = logging.getLogger('LmfitPath')
+
+    _substitute_params = generalmethods._substitute_params
+    make_twoDgaussian_model = gaussianlikemethods.make_twoDgaussian_model
+    make_twoDgaussian_fit = gaussianlikemethods.make_twoDgaussian_fit
+    estimate_twoDgaussian_MLE = gaussianlikemethods.estimate_twoDgaussian_MLE
+
+
+def make_refocus_image(size, rng):
+    """ Create a noisy refocus image of a spot at a random position near the image center. """
+    x_axis = np.linspace(-0.3e-6, 0.3e-6, size)
+    y_axis = np.linspace(-0.3e-6, 0.3e-6, size)
+    center = rng.uniform(-0.1e-6, 0.1e-6, 2)
+    sigma = rng.uniform(0.08e-6, 0.12e-6, 2)
+    xx, yy = np.meshgrid(x_axis, y_axis)
+    image = 1e5 * np.exp(-(xx - center[0]) ** 2 / (2 * sigma[0] ** 2)
+                         - (yy - center[1]) ** 2 / (2 * sigma[1] ** 2)) + 5e3
+    return x_axis, y_axis, rng.poisson(image).astype(float), center
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the refocus 2D gaussian fits.')
+    parser.add_argument('--size', type=int, default=30, help='Refocus image size in pixels')
+    parser.add_argument('--repetitions', type=int, default=200, help='Number of fitted images')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(42)
+    images = [make_refocus_image(args.size, rng) for _ in range(args.repetitions)]
+    lmfit_path = LmfitPath()
+
+    results = dict()
+    for name in ('lmfit', 'fast'):
+        deviations = list()
+        failures = 0
+        start = time.perf_counter()
+        for x_axis, y_axis, image, center in images:
+            if name == 'lmfit':
+                xx, yy = np.meshgrid(x_axis, y_axis)
+                result = lmfit_path.make_twoDgaussian_fit(
+                    xy_axes=(xx.flatten(), yy.flatten()),
+                    data=image.ravel(),
+                    estimator=lmfit_path.estimate_twoDgaussian_MLE)
+            else:
+                result = fit_twoDgaussian_grid(x_axis, y_axis, image)
+            if not result.success:
+                failures += 1
+            deviations.append(np.hypot(result.best_values['center_x'] - center[0],
+                                       result.best_values['center_y'] - center[1]))
+        elapsed = time.perf_counter() - start
+        results[name] = elapsed
+        print('{0:>18}: {1:8.3f} ms per fit, {2:d} failed fits, median center deviation '
+              '{3:.2e} m'.format(name, 1e3 * elapsed / args.repetitions, failures,
+                                 np.median(deviations)))
+
+    print('Speedup (fast vs. lmfit): {0:.1f}x'.format(results['lmfit'] / results['fast']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Localhost benchmark of the transfer of numpy arrays from a remote module.
+
+A rpyc server with the array channel of the remote module service is started in a separate
+python process. The client obtains arrays of several sizes from it
+
+  - by pickling (rpyc.utils.classic.obtain, the transfer used before the array channel),
+  - through the array channel as raw buffer (sent through the array channel socket from
+    64 kB on),
+  - through the array channel as zlib compressed buffer,
+  - through the array channel via shared memory (large arrays only),
+
+and, for comparison, by iterating over the elements of the remote array (netref), which is
+what happens when a remote array is accidentally used like a local one.
+
+Run from the qudi main directory:
+
+    python tools/benchmark_remote_arrays.py [--port 18861] [--repetitions 5]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+MAIN_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, MAIN_DIR)
+
+import numpy as np
+import rpyc
+import rpyc.utils.classic
+
+from core.util import network
+
+# number of elements of the transferred arrays
+SIZES = (1000, 100000, 1000000, 10000000)
+# elements iterated over in the netref iteration benchmark
+ITERATED_ELEMENTS = 1000
+
+
+def run_server(port):
+    """ Serve arrays of simulated counts (int64, poisson distributed) until killed. """
+    from rpyc.utils.server import ThreadedServer
+    from core.remote import ArrayTransferService
+
+    arrays = dict()
+
+    class BenchmarkService(ArrayTransferService):
+        def exposed_getData(self, size):
+            size = int(size)
+            if size not in arrays:
+                arrays[size] = np.random.poisson(20, size).astype(np.int64)
+            return arrays[size]
+
+    server = ThreadedServer(BenchmarkService, hostname='localhost', port=port,
+                            protocol_config={'allow_all_attrs': True, 'allow_pickle': True})
+    server.start()
+
+
+def connect(port, timeout=10):
+    start = time.monotonic()
+    while True:
+        try:
+            return rpyc.connect('localhost', port,
+                                config={'allow_all_attrs': True, 'allow_pickle': True})
+        except ConnectionRefusedError:
+            if time.monotonic() - start > timeout:
+                raise
+            time.sleep(0.1)
+
+
+def measure(function, repetitions):
+    """ Median duration of a function call in s. """
+    durations = list()
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the remote array transfer.')
+    parser.add_argument('--port', type=int, default=18861, help='Port of the benchmark server')
+    parser.add_argument('--repetitions', type=int, default=5,
+                        help='Number of transfers per method, the median is reported')
+    parser.add_argument('--server', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.server:
+        run_server(args.port)
+        return
+
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--server',
+                               '--port', str(args.port)])
+    try:
+        connection = connect(args.port)
+        remote = connection.root
+
+        def classic(proxy):
+            return rpyc.utils.classic.obtain(proxy)
+
+        def channel(shared_memory, compression):
+            def obtain(proxy):
+                network.configure_array_transport(connection, shared_memory=shared_memory,
+                                                  compression=compression)
+                return network.netobtain(proxy)
+            return obtain
+
+        methods = (('pickle', classic),
+                   ('raw', channel(False, 0)),
+                   ('zlib', channel(False, 1)),
+                   ('shared memory', channel(True, 0)))
+
+        print('{0:>12} {1:>10}  {2}'.format(
+            'elements', 'MB', ''.join('{0:>22}'.format(name) for name, _ in methods)))
+        for size in SIZES:
+            proxy = remote.getData(size)
+            reference = classic(proxy)
+            results = list()
+            for name, method in methods:
+                if name == 'shared memory' and reference.nbytes < network.SHARED_MEMORY_MIN_BYTES:
+                    results.append('{0:>22}'.format('-'))
+                    continue
+                if not np.array_equal(method(proxy), reference):
+                    raise RuntimeError('Transfer by {0} returned wrong data.'.format(name))
+                duration = measure(lambda: method(proxy), args.repetitions)
+                results.append('{0:>10.2f} ms {1:>6.0f} MB/s'.format(
+                    duration * 1e3, reference.nbytes / duration / 1e6))
+            print('{0:>12d} {1:>10.2f}  {2}'.format(size, reference.nbytes / 1e6,
+                                                    ''.join(results)))
+
+        proxy = remote.getData(ITERATED_ELEMENTS)
+        duration = measure(lambda: [value for value in proxy], 1)
+        print('\nIterating over a remote array of {0:d} elements: {1:.2f} ms'.format(
+            ITERATED_ELEMENTS, duration * 1e3))
+        connection.close()
+    finally:
+        server.kill()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
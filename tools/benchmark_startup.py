@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Headless benchmark of the qudi startup. The Manager is booted without GUI with a configuration
+file (by default the dummy hardware configuration config/example/default.cfg) and all hardware
+and logic modules are started. The time spent in reading the configuration and, for every
+module, in importing, loading, connecting, loading the status variables and activating is
+written to a JSON report, which can be compared against a baseline report.
+
+Every repetition is run in a fresh python process, since the imports are cached within a
+process. The configuration is copied to a temporary directory, so the status variables of a
+real setup are neither used nor overwritten and the runs are reproducible.
+
+Run from the qudi main directory:
+
+    python tools/benchmark_startup.py [--config config/example/default.cfg] [--repetitions 3]
+                                      [--output report.json] [--baseline baseline.json]
+                                      [--tolerance 0.2] [--min-delta 0.05]
+
+Create a baseline with --output and pass it as --baseline to later runs. The script exits with
+code 1 if no module was loaded or any error was logged during the startup (e.g. the
+configuration could not be read), or if the total startup time or the time of any module exceeds
+the baseline by more than the tolerance (relative) and the minimum difference (absolute, in s).
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, MAIN_DIR)
+
+# timings of a module in the report, in the order of the startup
+MODULE_TIMINGS = ('import', 'instantiate', 'connect', 'status_variables', 'activation')
+
+
+class ErrorCounter(logging.Handler):
+    """ Logging handler counting the logged errors. """
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def run_single(config_file, output_file):
+    """ Boot the manager in this process, measure the startup and exit the process.
+
+    @param str config_file: path of the configuration file
+    @param str output_file: path of the JSON file the report of this run is written to
+    """
+    start = time.perf_counter()
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    logging.basicConfig(format='%(levelname)s %(name)s %(message)s', level=logging.WARNING)
+    logging.getLogger().setLevel(logging.INFO)
+    logging.getLogger().handlers[0].setLevel(logging.WARNING)
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+
+    from qtpy import QtWidgets
+    app = QtWidgets.QApplication([sys.argv[0]])
+    from core.manager import Manager
+    imports = time.perf_counter() - start
+
+    manager_start = time.perf_counter()
+    manager = Manager(args=argparse.Namespace(no_gui=True, config=config_file))
+    manager_init = time.perf_counter() - manager_start
+
+    modules_start = time.perf_counter()
+    manager.startAllConfiguredModules()
+    start_modules = time.perf_counter() - modules_start
+    total = time.perf_counter() - start
+
+    phases = {'core_imports': imports,
+              'manager_init': manager_init,
+              'start_all_modules': start_modules,
+              'total': total}
+    for phase, duration in manager.startup_phases.items():
+        phases['manager_init.' + phase] = duration
+
+    # import times are recorded per python module, the first Qudi module using it is charged
+    import_profile = manager.getImportProfile()
+    modules = dict()
+    for base in ('hardware', 'logic'):
+        for name, definition in manager.tree['defined'][base].items():
+            timeline = manager.startup_timeline.get(name, dict())
+            class_path = str(definition.get('module.Class', ''))
+            module_file = '{0}.{1}'.format(base, class_path.rsplit('.', 1)[0])
+            entry = {'base': base,
+                     'import': import_profile.pop(module_file, {'total': 0.})['total']}
+            # the load time of the manager includes the import
+            entry['instantiate'] = max(timeline.get('load', 0.) - entry['import'], 0.)
+            for key in ('connect', 'status_variables'):
+                entry[key] = timeline.get(key, 0.)
+            entry['activation'] = timeline.get('end', 0.) - timeline.get('start', 0.)
+            module = manager.tree['loaded'][base].get(name)
+            entry['state'] = module.module_state() if module is not None else 'not loaded'
+            modules[name] = entry
+
+    loaded = sum(len(manager.tree['loaded'][base]) for base in ('hardware', 'logic'))
+    with open(output_file, 'w') as file:
+        json.dump({'phases': phases,
+                   'modules': modules,
+                   'loaded_modules': loaded,
+                   'errors': errors.count},
+                  file)
+
+    # do not wait for (or tear down) the threads and timers of the booted modules
+    manager.tm.quitAllThreads()
+    app.processEvents()
+    sys.stdout.flush()
+    os._exit(0)
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+
+def merge_runs(runs):
+    """ Combine the reports of several runs into one report with the median timings. """
+    report = {'phases': dict(),
+              'modules': dict(),
+              'loaded_modules': min(run['loaded_modules'] for run in runs),
+              'errors': max(run['errors'] for run in runs)}
+    for phase in runs[0]['phases']:
+        report['phases'][phase] = median([run['phases'].get(phase, 0.) for run in runs])
+    for name, entry in runs[0]['modules'].items():
+        merged = {'base': entry['base'], 'state': entry['state']}
+        for key in MODULE_TIMINGS:
+            merged[key] = median([run['modules'].get(name, entry)[key] for run in runs])
+        merged['total'] = sum(merged[key] for key in MODULE_TIMINGS)
+        report['modules'][name] = merged
+    return report
+
+
+def run_repetitions(config_file, repetitions):
+    """ Run the benchmark in fresh processes on a temporary copy of the configuration.
+
+    @param str config_file: path of the configuration file
+    @param int repetitions: number of runs
+
+    @return dict: report with the median timings of all runs
+    """
+    runs = list()
+    with tempfile.TemporaryDirectory(prefix='qudi_startup_') as directory:
+        config_copy = os.path.join(directory, os.path.basename(config_file))
+        shutil.copy(config_file, config_copy)
+        for repetition in range(repetitions):
+            output = os.path.join(directory, 'run_{0:d}.json'.format(repetition))
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--single-run',
+                            '--config', config_copy, '--output', output],
+                           cwd=directory, check=True)
+            with open(output) as file:
+                runs.append(json.load(file))
+            # the status variables saved by a run must not influence the next one
+            shutil.rmtree(os.path.join(directory, 'app_status'), ignore_errors=True)
+    report = merge_runs(runs)
+    report['config'] = os.path.relpath(os.path.abspath(config_file), MAIN_DIR)
+    report['repetitions'] = repetitions
+    report['date'] = datetime.datetime.now().isoformat(timespec='seconds')
+    report['python'] = platform.python_version()
+    report['platform'] = platform.platform()
+    return report
+
+
+def print_report(report, slowest=15):
+    print('Startup of {0} (median of {1:d} runs, {2:d} modules loaded, {3:d} errors logged):'
+          ''.format(report['config'], report['repetitions'], report['loaded_modules'],
+                    report['errors']))
+    for phase, duration in report['phases'].items():
+        print('{0:>36}: {1:8.3f} s'.format(phase, duration))
+    print('\n{0:>36}  {1}'.format('module', ''.join('{0:>18}'.format(key)
+                                                    for key in MODULE_TIMINGS + ('total',))))
+    modules = sorted(report['modules'].items(), key=lambda item: item[1]['total'], reverse=True)
+    for name, entry in modules[:slowest]:
+        print('{0:>36}  {1}  {2}'.format(
+            '{0}.{1}'.format(entry['base'], name),
+            ''.join('{0:16.3f} s'.format(entry[key]) for key in MODULE_TIMINGS + ('total',)),
+            entry['state']))
+
+
+def check_startup(report):
+    """ Check that the benchmarked startup was complete.
+
+    @param dict report: the current report
+
+    @return list: descriptions of the problems, empty for a complete startup
+    """
+    problems = list()
+    if report['loaded_modules'] == 0:
+        problems.append('no modules were loaded')
+    if report['errors'] > 0:
+        problems.append('{0:d} errors were logged'.format(report['errors']))
+    return problems
+
+
+def compare(report, baseline, tolerance, min_delta):
+    """ Compare a report with a baseline report.
+
+    @param dict report: the current report
+    @param dict baseline: the baseline report
+    @param float tolerance: allowed relative increase of a timing
+    @param float min_delta: increase in s below which a timing is never a regression
+
+    @return list: descriptions of the regressions
+    """
+    def is_regression(value, reference):
+        return value - reference > max(tolerance * reference, min_delta)
+
+    regressions = list()
+    for phase, reference in baseline['phases'].items():
+        value = report['phases'].get(phase)
+        if value is not None and is_regression(value, reference):
+            regressions.append('phase {0}: {1:.3f} s (baseline {2:.3f} s)'.format(
+                phase, value, reference))
+    for name, reference in baseline['modules'].items():
+        entry = report['modules'].get(name)
+        if entry is None:
+            continue
+        for key in MODULE_TIMINGS + ('total',):
+            if key in reference and is_regression(entry[key], reference[key]):
+                regressions.append('module {0} {1}: {2:.3f} s (baseline {3:.3f} s)'.format(
+                    name, key, entry[key], reference[key]))
+        if reference.get('state', entry['state']) != entry['state']:
+            regressions.append('module {0} is {1} (baseline {2})'.format(
+                name, entry['state'], reference['state']))
+    if report['errors'] > baseline.get('errors', report['errors']):
+        regressions.append('{0:d} errors logged (baseline {1:d})'.format(
+            report['errors'], baseline['errors']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the qudi startup.')
+    parser.add_argument('--config', default=os.path.join(MAIN_DIR, 'config', 'example',
+                                                         'default.cfg'),
+                        help='Configuration file to start')
+    parser.add_argument('--repetitions', type=int, default=3,
+                        help='Number of startups, the median is reported')
+    parser.add_argument('--output', default=None, help='Write the JSON report to this file')
+    parser.add_argument('--baseline', default=None, help='JSON report to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative increase of a timing compared to the baseline')
+    parser.add_argument('--min-delta', type=float, default=0.05,
+                        help='Increase in s which is never reported as regression')
+    parser.add_argument('--single-run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_run:
+        run_single(args.config, args.output)
+
+    report = run_repetitions(args.config, max(args.repetitions, 1))
+    print_report(report)
+    problems = check_startup(report)
+    if problems:
+        # timings of a failed startup are meaningless, neither save nor compare them
+        print('\nStartup of {0} failed: {1}.'.format(report['config'], ', '.join(problems)))
+        sys.exit(1)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=4, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print('\nRegressions compared to {0}:'.format(args.baseline))
+            for regression in regressions:
+                print('  ' + regression)
+            sys.exit(1)
+        print('\nNo regressions compared to {0}.'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
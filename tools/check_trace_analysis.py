@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Equivalence check of the vectorized trace analysis of the TraceAnalysisLogic against the former
+sample by sample implementation.
+
+The former implementations of the dwell time extraction (analog_digitial_converter and
+time_in_high_low of analyze_lifetime), of analyze_flip_prob2 and of the flip counting of
+analyze_flip_prob3/4 are kept here and compared with
+
+  - TraceAnalysisLogic.calculate_dwell_times (based on core.util.math.run_length_encode),
+  - TraceAnalysisLogic.analyze_flip_prob2,
+  - TraceAnalysisLogic._count_flips
+
+on random Poissonian traces and on edge cases (empty, single sample, constant, starting high
+or low, values equal to the thresholds).
+
+Run from the qudi main directory:
+
+    python tools/check_trace_analysis.py [--traces 200] [--length 2000]
+
+The script exits with code 1 if any result differs.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from core.util.math import run_length_encode
+from logic.trace_analysis_logic import TraceAnalysisLogic
+
+MODES = ('full', 'dark', 'bright')
+
+
+# ---------------------------------------------------------------------------------------------
+# former implementations
+# ---------------------------------------------------------------------------------------------
+
+def analog_digitial_converter(cut_off, data):
+    new_digital_trace = []
+    for data_point in data:
+        if data_point >= cut_off:
+            new_digital_trace.append(1)
+        else:
+            new_digital_trace.append(0)
+    return new_digital_trace
+
+
+def time_in_high_low(raw_digital_trace, local_dt):
+    occurances = []
+    index = 0
+    index2 = 0
+
+    while index < len(raw_digital_trace):
+        occurances.append(0)
+        # start following the consecutive 1s
+        while raw_digital_trace[index] == 1:
+            occurances[index2] += 1
+            if index == (len(raw_digital_trace) - 1):
+                occurances = np.array(occurances)
+                return occurances * local_dt
+            else:
+                index += 1
+        if raw_digital_trace[index - 1] == 1:
+            index2 += 1
+            occurances.append(0)
+        # start following the consecutive 0s
+        while raw_digital_trace[index] == 0:
+            occurances[index2] -= 1
+            if index == (len(raw_digital_trace) - 1):
+                occurances = np.array(occurances)
+                return occurances * local_dt
+            else:
+                index += 1
+        index2 += 1
+
+
+def legacy_flip_prob2(trace, threshold=1, analyze_mode='full'):
+    no_flip = 0.0
+
+    if analyze_mode == 'full':
+        for ii in range(len(trace) - 1):
+            if trace[ii] > threshold and trace[ii + 1] > threshold:
+                no_flip = no_flip + 1
+
+            elif trace[ii] < threshold and trace[ii + 1] < threshold:
+                no_flip = no_flip + 1
+
+        probability = 1.0 - (no_flip / len(trace))
+        lost_events = 0.0
+
+    if analyze_mode == 'dark':
+        dark_counter = 0.0
+        for ii in range(len(trace) - 1):
+            if trace[ii] < threshold:
+                dark_counter = dark_counter + 1
+                if trace[ii + 1] < threshold:
+                    no_flip = no_flip + 1
+        probability = 1.0 - (no_flip / dark_counter)
+        lost_events = (1.0 - (dark_counter / len(trace))) * 100
+
+    if analyze_mode == 'bright':
+        bright_counter = 0.0
+        for ii in range(len(trace) - 1):
+            if trace[ii] > threshold:
+                bright_counter = bright_counter + 1
+                if trace[ii + 1] > threshold:
+                    no_flip = no_flip + 1
+        probability = 1.0 - (no_flip / bright_counter)
+        lost_events = (1.0 - (bright_counter / len(trace))) * 100
+
+    return probability, lost_events
+
+
+def legacy_count_flips(trace, init_threshold, ana_threshold, analyze_mode='full'):
+    no_flip = 0.0
+    flip = 0.0
+
+    init_high = np.where(trace[:-1] > init_threshold[1])[0]
+    init_low = np.where(trace[:-1] < init_threshold[0])[0]
+    ana_high = np.where(trace > ana_threshold[1])[0]
+    ana_low = np.where(trace < ana_threshold[0])[0]
+
+    if analyze_mode == 'bright' or analyze_mode == 'full':
+        for index in init_high:
+            if index + 1 in ana_high:
+                no_flip = no_flip + 1
+            elif index + 1 in ana_low:
+                flip = flip + 1
+
+    if analyze_mode == 'dark' or analyze_mode == 'full':
+        for index in init_low:
+            if index + 1 in ana_high:
+                flip = flip + 1
+            elif index + 1 in ana_low:
+                no_flip = no_flip + 1
+    return flip, no_flip
+
+
+# ---------------------------------------------------------------------------------------------
+# comparison
+# ---------------------------------------------------------------------------------------------
+
+def outcome(function, *args):
+    """ Result of a function call or the type of the raised exception. """
+    try:
+        return function(*args)
+    except Exception as exception:
+        return type(exception)
+
+
+def same(first, second):
+    if isinstance(first, type) or isinstance(second, type):
+        return first is second
+    return np.allclose(first, second, rtol=1e-12, atol=0, equal_nan=True)
+
+
+def legacy_dwell_times(trace, threshold, dt):
+    time_array = time_in_high_low(analog_digitial_converter(threshold, trace), dt)
+    # the former implementation returns None for an empty trace and inserts a zero entry for
+    # traces starting low and ending high. analyze_lifetime only uses the non-zero entries.
+    if time_array is None:
+        return np.zeros(0)
+    return time_array[time_array != 0]
+
+
+def compare_trace(trace, threshold, init_threshold, ana_threshold, dt=1e-3):
+    """ Compare all implementations on a single trace.
+
+    @return list: descriptions of the differences
+    """
+    differences = list()
+
+    new = TraceAnalysisLogic.calculate_dwell_times(None, trace, threshold, dt)
+    old = legacy_dwell_times(trace, threshold, dt)
+    if new.shape != old.shape or not same(new, old):
+        differences.append('dwell times: {0} != {1}'.format(new, old))
+
+    # run_length_encode has to reproduce the trace
+    values, lengths, starts = run_length_encode(trace)
+    if not np.array_equal(np.repeat(values, lengths), trace) or (
+            lengths.size and not np.array_equal(starts, np.cumsum(lengths) - lengths)):
+        differences.append('run_length_encode does not reproduce the trace')
+
+    for mode in MODES:
+        new = outcome(TraceAnalysisLogic.analyze_flip_prob2, None, trace, threshold, mode)
+        old = outcome(legacy_flip_prob2, trace, threshold, mode)
+        if not same(new, old):
+            differences.append('analyze_flip_prob2 {0}: {1} != {2}'.format(mode, new, old))
+
+        new = TraceAnalysisLogic._count_flips(None, trace, init_threshold, ana_threshold, mode)
+        old = legacy_count_flips(trace, init_threshold, ana_threshold, mode)
+        if not same(new, old):
+            differences.append('_count_flips {0}: {1} != {2}'.format(mode, new, old))
+    return differences
+
+
+def edge_cases():
+    """ (name, trace, threshold, init_threshold, ana_threshold) of the edge cases. """
+    return [
+        ('empty', np.zeros(0), 5, [4, 6], [4, 6]),
+        ('single sample high', np.array([10.]), 5, [4, 6], [4, 6]),
+        ('single sample low', np.array([1.]), 5, [4, 6], [4, 6]),
+        ('constant high', np.full(50, 10.), 5, [4, 6], [4, 6]),
+        ('constant low', np.full(50, 1.), 5, [4, 6], [4, 6]),
+        ('starting high, ending low', np.array([9., 9, 1, 1, 9, 1]), 5, [4, 6], [4, 6]),
+        ('starting low, ending high', np.array([1., 9, 9, 1, 1, 9]), 5, [4, 6], [4, 6]),
+        ('starting low, ending low', np.array([1., 9, 1, 1]), 5, [4, 6], [4, 6]),
+        ('alternating', np.tile([1., 9.], 25), 5, [4, 6], [4, 6]),
+        ('values on the thresholds', np.array([5., 5, 4, 6, 5, 4, 4, 6, 6, 5]), 5, [4, 6], [4, 6]),
+        ('overlapping thresholds', np.array([1., 5, 9, 5, 1, 7, 3, 5]), 5, [6, 4], [6, 4]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Equivalence check of the trace analysis.')
+    parser.add_argument('--traces', type=int, default=200, help='Number of random traces')
+    parser.add_argument('--length', type=int, default=2000, help='Samples per random trace')
+    args = parser.parse_args()
+
+    cases = edge_cases()
+    rng = np.random.RandomState(0)
+    for index in range(args.traces):
+        # telegraph signal switching between a dark and a bright Poissonian level
+        flips = rng.random_sample(args.length) < rng.uniform(0.001, 0.2)
+        bright = np.cumsum(flips) % 2 == rng.randint(2)
+        trace = rng.poisson(np.where(bright, 20., 5.)).astype(float)
+        threshold = float(rng.randint(8, 16))
+        cases.append(('random {0:d}'.format(index), trace, threshold,
+                      [threshold - 2, threshold + 2], [threshold - 1, threshold + 1]))
+
+    failed = 0
+    for name, trace, threshold, init_threshold, ana_threshold in cases:
+        differences = compare_trace(trace, threshold, init_threshold, ana_threshold)
+        if differences:
+            failed += 1
+            print('{0}:\n  {1}'.format(name, '\n  '.join(differences)))
+    print('{0:d} of {1:d} traces differ from the former implementation.'.format(
+        failed, len(cases)))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()